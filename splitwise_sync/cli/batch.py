@@ -1,20 +1,34 @@
 """Main application for Splitwise transaction sync."""
 
 import argparse
+import json
 import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Optional, cast
 
 from splitwise.expense import Expense  # type: ignore
 
 from splitwise_sync import config
-from splitwise_sync.core.email_client import ImapEmailClient
+from splitwise_sync.core.email_client import (
+    EmailSource,
+    ImapEmailClient,
+    parse_email_sources,
+)
+from splitwise_sync.core.email_store import EmailStore
 from splitwise_sync.core.logging_utils import create_logger
-from splitwise_sync.core.models import EmailMessage, Transaction
-from splitwise_sync.core.receipt_parser import ReceiptParser
+from splitwise_sync.core.models import EmailMessage, Transaction, TransactionBatch
+from splitwise_sync.core.parse_cache import ParseCache
+from splitwise_sync.core.parser_registry import AUTO, ParserRegistry
+from splitwise_sync.core.rules import Rule, RuleSet, load_stats
 from splitwise_sync.core.splitwise_client import SplitwiseClient
-from splitwise_sync.ml.expense_model import ExpenseModel
+from splitwise_sync.core.sync_state import SyncState
+from splitwise_sync.ml.expense_model import Classifier, ExpenseModel
+from splitwise_sync.ml.model_server import ModelClient, ModelServer, model_file_sha256
+from splitwise_sync.ml.prediction_cache import CachedModel
 
 logging.basicConfig(
     level=logging.DEBUG if config.DEBUG else logging.INFO,
@@ -41,61 +55,315 @@ class SplitwiseSync:
     """Main application class for Splitwise transaction sync."""
 
     def __init__(
-        self, dry_run: bool = False, model_path: Path = config.DEFAULT_MODEL_PATH
+        self,
+        dry_run: bool = False,
+        model_path: Path = config.DEFAULT_MODEL_PATH,
+        incremental: bool = False,
+        text_only: bool = False,
+        store_emails: bool = False,
+        parse_cache: bool = False,
+        threshold: Optional[float] = config.SHARED_THRESHOLD,
+        prediction_cache: bool = False,
+        rules_path: Optional[Path] = config.RULES_PATH,
+        online: bool = False,
     ) -> None:
-        """Initialize the Splitwise sync application."""
-        self.email_client = ImapEmailClient()
-        self.receipt_parser = ReceiptParser()
+        """Initialize the Splitwise sync application.
+
+        Args:
+            prediction_cache: Reuse the predictions of previously seen
+                              merchants, loading the model only on misses
+            rules_path: JSON file of user rules applied before the model,
+                        ignored when it does not exist
+            online: Use the model learning online from the kept and deleted
+                    expenses, updating it at the start of every run
+            threshold: Probability from which a transaction is shared; when
+                       None the model's ``predict`` decides
+        """
+        self.email_store = EmailStore(config.EMAIL_STORE_DIR) if store_emails else None
+        self.email_client = ImapEmailClient(text_only=text_only, store=self.email_store)
+        self.sources = parse_email_sources()
+        self.parse_cache = ParseCache(config.PARSE_CACHE_PATH) if parse_cache else None
+        self.parsers = self._load_parsers(self.sources, self.parse_cache)
         self.splitwise_client = SplitwiseClient()
         self.dry_run = dry_run
-        self.model = ExpenseModel(model_path)
+        self.online = online
+        self.model: Classifier
+        if online:
+            # imports sklearn, which runs without --online do not need
+            from splitwise_sync.ml.online_model import OnlineExpenseModel
+
+            self.model = OnlineExpenseModel.load(config.ONLINE_MODEL_PATH)
+        else:
+            self.model = self._load_model(model_path, prediction_cache)
+        self.threshold = threshold
+        self.rules = self._load_rules(rules_path)
+        self.sync_state = SyncState(config.SYNC_STATE_PATH) if incremental else None
+
+    @staticmethod
+    def _load_parsers(
+        sources: list[EmailSource], cache: Optional[ParseCache] = None
+    ) -> ParserRegistry:
+        """Build the parser registry, checking the parsers named by the sources."""
+        parsers = ParserRegistry(cache=cache)
+        for source in sources:
+            if source.parser != AUTO:
+                parsers.get(source.parser)  # raises ValueError if unknown
+        return parsers
+
+    @staticmethod
+    def _load_model(
+        model_path: Path, prediction_cache: bool = False
+    ) -> ExpenseModel | ModelClient | CachedModel:
+        """Connect to the model server if it serves this model, else load the model."""
+        if config.MODEL_SOCKET_PATH.exists():
+            try:
+                client = ModelClient(config.MODEL_SOCKET_PATH)
+            except OSError as exc:
+                logger.warning(f"Model server unavailable, loading the model: {exc}")
+            else:
+                if _serves(client, model_path):
+                    logger.info(f"Using the model server on {config.MODEL_SOCKET_PATH}")
+                    if prediction_cache:
+                        logger.info("The prediction cache is not used with the server")
+                    return client
+                client.close()
+        if prediction_cache:
+            return CachedModel.open(
+                config.PREDICTION_CACHE_PATH, model_path, load_model=ExpenseModel
+            )
+        return ExpenseModel(model_path)
 
-    def _fetch_unprocessed_emails(self) -> list[EmailMessage]:
+    @staticmethod
+    def _load_rules(rules_path: Optional[Path]) -> Optional[RuleSet]:
+        """Compile the user rules, if there is a rules file."""
+        if rules_path is None or not rules_path.exists():
+            return None
+        rules = RuleSet.load(rules_path)
+        logger.info(f"Loaded {len(rules)} rules from {rules_path}")
+        return rules
+
+    def _fetch_unprocessed_emails(self) -> Iterator[tuple[EmailSource, EmailMessage]]:
         logger.info("Fetching unprocessed emails...")
-        emails = self.email_client.fetch_unread_from_sender(
-            "enviodigital@bancoedwards.cl", mark_as_read=not self.dry_run
+        return self.email_client.iter_from_sources(
+            self.sources,
+            state=self.sync_state,
+            mark_as_read=not self.dry_run,
+            text_parts={
+                source: self.parsers.mime_parts(source.parser, source.sender)
+                for source in self.sources
+            },
         )
-        return emails
 
     def process_emails(self) -> list[Expense]:
-        """Process all unprocessed emails and return created expenses."""
+        """Process all unprocessed emails and return created expenses.
+
+        Emails are streamed from the server and parsed one at a time; the
+        parsed transactions of the run are then matched against the user
+        rules, and those no rule decides are scored with a single model call
+        before their expenses are created.
+        """
+        if self.online and not self.dry_run:
+            self._learn_feedback()
         emails = self._fetch_unprocessed_emails()
-        logger.info(f"Found {len(emails)} unprocessed emails.")
 
         created_expenses: list[Expense] = []
+        failed_uids: dict[str, list[str]] = defaultdict(list)
+
+        def fail(
+            source: EmailSource, uid: str, record: dict[str, Any], exc: Exception
+        ) -> None:
+            failed_uids[source.folder].append(uid)
+            if self.sync_state is not None:
+                # fetched again on the next run, whatever the checkpoint
+                self.sync_state.add_failed(source.folder, source.sender, int(uid))
+            logger.exception(f"Failed to create expense for email: {uid}")
+            errored_logger.error({**record, "error": str(exc)})
+
+        def done(item: _ParsedEmail) -> None:
+            if self.sync_state is not None:
+                source = item.source
+                self.sync_state.mark_processed(
+                    source.folder, source.sender, int(item.uid)
+                )
 
-        for email in emails:
+        processed = 0
+        # the bodies are dropped once parsed, only the transactions wait for
+        # the model call
+        parsed: list[_ParsedEmail] = []
+        for source, email in emails:
+            processed += 1
             logger.info(f"Processing email: {email.subject}")
             try:
-                transaction = self.receipt_parser.parse_email(email)
-                is_shared = bool(self.model.predict(transaction.to_dataframe())[0])
-                logger.debug(f"Prediction for transaction: {is_shared=}")
-                if self.dry_run:
-                    logger.info(f"Dry run: {transaction}")
-                    continue
-
-                expense_created = self.splitwise_client.create_expense(transaction)
+                transaction = self.parsers.parse_email(email, source.parser)
+            except Exception as exc:
+                fail(source, email.uid, {"email": email.to_dict()}, exc)
+                continue
+            parsed.append(_ParsedEmail(source, email.uid, email.sender, transaction))
+
+        try:
+            decisions = self._decide([item.transaction for item in parsed])
+        except Exception as exc:
+            for item in parsed:
+                fail(item.source, item.uid, item.to_dict(), exc)
+            parsed, decisions = [], []
+
+        for item, (rule, is_shared) in zip(parsed, decisions):
+            transaction = item.transaction
+            split = None
+            if rule is not None:
+                logger.debug(f"Transaction matched rule {rule.name!r}")
+                transaction = rule.apply(transaction)
+                split = rule.split
+            logger.debug(f"Prediction for transaction: {is_shared=}")
+            if self.dry_run:
+                logger.info(f"Dry run: {transaction}")
+                done(item)
+                continue
+            try:
+                expense_created = self.splitwise_client.create_expense(
+                    transaction, split=split
+                )
                 logger.debug(f"Created expense: id={expense_created.id}")
-                self._log_processed(email, transaction, expense_created, is_shared)
+                self._log_processed(
+                    item.sender, transaction, expense_created, is_shared, rule
+                )
                 created_expenses.append(expense_created)
                 if not is_shared:
                     # the deleted transaction will be used as training data
                     self.splitwise_client.delete_expense(expense_created.id)
 
             except Exception as exc:
-                self.email_client.mark_unread(email.uid)
-                logger.exception(f"Failed to create expense for email: {email.uid}")
-                errored_logger.error({"email": email.to_dict(), "error": str(exc)})
+                fail(item.source, item.uid, item.to_dict(), exc)
                 continue
+            done(item)
+
+        failed = sum(len(uids) for uids in failed_uids.values())
+        logger.info(f"Processed {processed} emails, {failed} failed.")
+
+        if self.sync_state is None:
+            # flag all failures at once so they are picked up in the next run
+            for folder, uids in failed_uids.items():
+                self.email_client.mark_unread_many(uids, folder)
+        elif not self.dry_run:
+            self.sync_state.save()
+
+        if self.rules is not None and not self.dry_run:
+            self.rules.save_stats(config.RULE_STATS_PATH)
 
         return created_expenses
 
+    def _learn_feedback(self) -> None:
+        """Update the online model with the expenses the user had time to review."""
+        from splitwise_sync.ml.online_model import (
+            OnlineExpenseModel,
+            learn_from_feedback,
+        )
+
+        try:
+            learned = learn_from_feedback(
+                cast(OnlineExpenseModel, self.model),
+                self.splitwise_client,
+                config.ONLINE_MODEL_PATH,
+                config.FEEDBACK_STATE_PATH,
+            )
+        except Exception:
+            # the sync goes on with the model as it was
+            logger.exception("Failed to learn from the expenses feedback")
+            return
+        logger.info(f"Online model updated with {learned} expenses")
+
+    def _decide(
+        self, transactions: list[Transaction]
+    ) -> list[tuple[Optional[Rule], bool]]:
+        """Match each transaction to a rule, asking the model when none decides.
+
+        Returns:
+            The matching rule (if any) and whether the expense is shared
+        """
+        if self.rules is None:
+            rules: list[Optional[Rule]] = [None] * len(transactions)
+        else:
+            rules = self.rules.match_many(transactions)
+            decided = sum(
+                rule is not None and rule.is_shared is not None for rule in rules
+            )
+            logger.info(f"Rules decided {decided} of {len(transactions)} transactions")
+
+        predictions = iter(
+            self._predict_shared(
+                [
+                    t
+                    for t, rule in zip(transactions, rules)
+                    if rule is None or rule.is_shared is None
+                ]
+            )
+        )
+        return [
+            (
+                rule,
+                next(predictions)
+                if rule is None or rule.is_shared is None
+                else rule.is_shared,
+            )
+            for rule in rules
+        ]
+
+    def _predict_shared(self, transactions: list[Transaction]) -> list[bool]:
+        """Predict whether each transaction is shared, with one model call."""
+        if not transactions:
+            return []
+        batch = TransactionBatch.from_transactions(transactions)
+        if self.threshold is None:
+            return [bool(p) for p in self.model.predict(batch)]
+        probabilities = self.model.predict_proba(batch)[:, 1]
+        return [bool(p >= self.threshold) for p in probabilities]
+
+    def watch(
+        self,
+        idle_timeout: float = config.IMAP_IDLE_TIMEOUT,
+        stop: Optional[threading.Event] = None,
+    ) -> None:
+        """Process new emails as soon as the IMAP server announces them.
+
+        Pending emails are processed first; then the IMAP session is kept in
+        IDLE and every EXISTS notification triggers a new ``process_emails``
+        run, reusing the same session, parser and in-memory model. Emails are
+        also checked whenever IDLE times out, to catch any that arrived while
+        the previous batch was being processed. IDLE is issued on the folder
+        of the first source; other folders are checked on every wake-up.
+
+        Args:
+            idle_timeout: Seconds to wait in IDLE before re-issuing it
+            stop: Optional event to end the loop (checked after each IDLE)
+        """
+        stop = stop or threading.Event()
+        logger.info("Watching for new emails...")
+        self.process_emails()
+        while not stop.is_set():
+            folder = self.sources[0].folder
+            if self.email_client.wait_for_new_messages(idle_timeout, folder):
+                logger.debug("New emails announced by the server")
+            else:
+                logger.debug("IDLE timed out, checking for missed emails")
+            self.process_emails()
+
+    def close(self) -> None:
+        """Release the resources held during the run (e.g. the IMAP session)."""
+        self.email_client.close()
+        if isinstance(self.model, (ModelClient, CachedModel)):
+            self.model.close()
+        if self.email_store is not None:
+            self.email_store.close()
+        if self.parse_cache is not None:
+            self.parse_cache.close()
+
     def _log_processed(
         self,
-        email: EmailMessage,
+        sender: str,
         transaction: Transaction,
         expense: Expense,
         is_shared: bool,
+        rule: Optional[Rule] = None,
     ) -> None:
         """Log the processed email, transaction and expense info"""
 
@@ -105,13 +373,116 @@ class SplitwiseSync:
             "expense_created_by_id": str(expense.created_by.id),
             "expense_created_by_email": expense.created_by.email,
             "transaction": transaction.to_dict(),
-            "email_sender": email.sender,
+            "email_sender": sender,
             "is_shared": is_shared,
+            "rule": None if rule is None else rule.name,
         }
 
         processed_logger.info(info)
 
 
+@dataclass(frozen=True)
+class _ParsedEmail:
+    """What is kept of a parsed email until its expense is created."""
+
+    source: EmailSource
+    uid: str
+    sender: str
+    transaction: Transaction
+
+    def to_dict(self) -> dict[str, Any]:
+        """Record of the errored log, in place of the whole email."""
+        return {
+            "email": {"uid": self.uid, "sender": self.sender},
+            "transaction": self.transaction.to_dict(),
+        }
+
+
+def _serves(client: ModelClient, model_path: Path) -> bool:
+    """Whether the model server serves the current contents of ``model_path``.
+
+    A server started before the model was retrained or re-exported keeps the
+    old model in memory; its clients then load the new one themselves.
+    """
+    try:
+        served = client.model_sha256()
+        expected = model_file_sha256(model_path)
+    except (OSError, RuntimeError, ValueError) as exc:
+        logger.warning(f"Cannot check the model of the server, loading it: {exc}")
+        return False
+    if served != expected:
+        logger.warning(
+            f"The model server does not serve the current {model_path} "
+            "(restart serve-model), loading the model"
+        )
+        return False
+    return True
+
+
+def show_rules(rules_path: Path, stats_path: Path = config.RULE_STATS_PATH) -> None:
+    """Print the rules with the number of times each fired over the runs."""
+    rules = RuleSet.load(rules_path)
+    stats = load_stats(stats_path)
+    fired = stats.get("fired", {})
+    print(f"{len(rules)} rules, {stats.get('evaluated', 0)} transactions evaluated")
+    for rule in rules.rules:
+        print(f"{fired.get(rule.name, 0):>8}  {rule.name}")
+
+
+def learn(dataset: Optional[Path] = None, epochs: int = 5) -> None:
+    """Update the online model from feedback, starting from a dataset if given."""
+    from splitwise_sync.ml.online_model import (
+        OnlineExpenseModel,
+        learn_dataset,
+        learn_from_feedback,
+    )
+
+    if dataset is not None:
+        model = learn_dataset(OnlineExpenseModel(), dataset, epochs)
+        model.save(config.ONLINE_MODEL_PATH)
+    elif config.ONLINE_MODEL_PATH.exists():
+        model = OnlineExpenseModel.load(config.ONLINE_MODEL_PATH)
+    else:
+        raise SystemExit(
+            f"No online model at {config.ONLINE_MODEL_PATH}: start it with "
+            "`splitwise-sync learn --dataset <training set>`"
+        )
+    learned = learn_from_feedback(
+        model,
+        SplitwiseClient(),
+        config.ONLINE_MODEL_PATH,
+        config.FEEDBACK_STATE_PATH,
+    )
+    logger.info(f"Online model learned {learned} expenses, {model.n_samples} in total")
+
+
+def serve_model(
+    socket_path: Path,
+    model_path: Path,
+    max_batch: int = config.MODEL_BATCH_SIZE,
+    max_wait: float = config.MODEL_BATCH_WAIT,
+    stats: bool = False,
+) -> None:
+    """Serve the model on a Unix socket, or print the stats of the running server."""
+    if stats:
+        with ModelClient(socket_path) as client:
+            print(json.dumps(client.stats(), indent=4))
+        return
+
+    # hashed before loading, so a file replaced meanwhile is not taken for it
+    model_sha256 = model_file_sha256(model_path)
+    server = ModelServer(
+        ExpenseModel(model_path), socket_path, max_batch, max_wait, model_sha256
+    )
+    logger.info(f"Serving {model_path} on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Interrupted, shutting down.")
+    finally:
+        server.server_close()
+
+
 def main() -> None:
     """Main entry point for the application."""
     # Create argument parser
@@ -128,14 +499,175 @@ def main() -> None:
         "-m",
         "--model",
         type=str,
-        help="Path to the model file",
+        help="Path to the model file; its .npz export is used when present",
         default=config.DEFAULT_MODEL_PATH,
     )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Fetch only emails newer than the last processed UID "
+        "instead of relying on the unread flag",
+    )
+    parser.add_argument(
+        "-t",
+        "--text-only",
+        action="store_true",
+        help="Download only the text part of each email, skipping images "
+        "and attachments",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--store-emails",
+        action="store_true",
+        help="Save the raw fetched emails in the local store "
+        "(see dump.py --from-cache)",
+    )
+
+    parser.add_argument(
+        "-c",
+        "--parse-cache",
+        action="store_true",
+        help="Reuse the parsing results of previously seen email bodies",
+    )
+
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=config.SHARED_THRESHOLD,
+        help="Probability from which an expense is kept as shared "
+        "(default: the model's own decision)",
+    )
+
+    parser.add_argument(
+        "-p",
+        "--prediction-cache",
+        action="store_true",
+        help="Reuse the predictions of previously seen merchants "
+        "(reset when the model file changes)",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--online",
+        action="store_true",
+        help="Use the model learning from the kept and deleted expenses "
+        f"({config.ONLINE_MODEL_PATH}), updated at the start of every run",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--rules",
+        type=Path,
+        default=config.RULES_PATH,
+        help="JSON file of rules deciding expenses before the model "
+        f"(default: {config.RULES_PATH}, ignored when missing)",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Keep running and process new emails as soon as they arrive (IMAP IDLE)",
+    )
+    watch_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=config.IMAP_IDLE_TIMEOUT,
+        help="Seconds to wait in IDLE before re-issuing it "
+        f"(default: {config.IMAP_IDLE_TIMEOUT})",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve-model",
+        help="Keep the model in memory and answer predictions on a Unix socket",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        type=Path,
+        default=config.MODEL_SOCKET_PATH,
+        help=f"Socket to listen on (default: {config.MODEL_SOCKET_PATH})",
+    )
+    serve_parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=config.MODEL_BATCH_SIZE,
+        help="Transactions from which a micro-batch is scored right away "
+        f"(default: {config.MODEL_BATCH_SIZE})",
+    )
+    serve_parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=config.MODEL_BATCH_WAIT,
+        help="Seconds a request waits for others to join its micro-batch "
+        f"(default: {config.MODEL_BATCH_WAIT})",
+    )
+    serve_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the latency and batch-size stats of the running server",
+    )
+
+    subparsers.add_parser(
+        "rules", help="Show the rules and how many times each one fired"
+    )
+
+    learn_parser = subparsers.add_parser(
+        "learn",
+        help="Update the online model with the expenses kept and deleted "
+        f"more than {config.FEEDBACK_DELAY_DAYS:g} days ago",
+    )
+    learn_parser.add_argument(
+        "--dataset",
+        type=Path,
+        help="Start a new online model from a pickled training set "
+        "with an is_shared column",
+    )
+    learn_parser.add_argument(
+        "--epochs",
+        type=int,
+        default=5,
+        help="Passes over the dataset (default: 5)",
+    )
 
     args = parser.parse_args()
 
-    app = SplitwiseSync(dry_run=args.dry_run)
-    expenses = app.process_emails()
+    if args.command == "rules":
+        show_rules(args.rules)
+        return
+
+    if args.command == "learn":
+        learn(args.dataset, args.epochs)
+        return
+
+    if args.command == "serve-model":
+        serve_model(
+            args.socket, Path(args.model), args.max_batch, args.max_wait, args.stats
+        )
+        return
+
+    app = SplitwiseSync(
+        dry_run=args.dry_run,
+        model_path=Path(args.model),
+        incremental=args.incremental,
+        text_only=args.text_only,
+        store_emails=args.store_emails,
+        parse_cache=args.parse_cache,
+        threshold=args.threshold,
+        prediction_cache=args.prediction_cache,
+        rules_path=args.rules,
+        online=args.online,
+    )
+    try:
+        if args.command == "watch":
+            app.watch(idle_timeout=args.idle_timeout)
+            return
+        expenses = app.process_emails()
+    except KeyboardInterrupt:
+        logger.info("Interrupted, shutting down.")
+        return
+    finally:
+        app.close()
 
     if expenses:
         total_amount = sum(float(expense.cost) for expense in expenses)  # type: ignore
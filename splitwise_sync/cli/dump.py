@@ -3,14 +3,20 @@
 import argparse
 import json
 import logging
+from itertools import batched, tee
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator, Optional, TextIO
 
 from splitwise_sync import config
-from splitwise_sync.core.email_client import ImapEmailClient
+from splitwise_sync.core.bulk_parse import ParseResult, parse_many
+from splitwise_sync.core.email_client import (
+    EmailSource,
+    ImapEmailClient,
+    parse_email_sources,
+)
+from splitwise_sync.core.email_store import EmailStore
 from splitwise_sync.core.logging_utils import create_logger
-from splitwise_sync.core.models import EmailMessage
-from splitwise_sync.core.receipt_parser import ReceiptParser
+from splitwise_sync.core.models import EmailMessage, TransactionBatch
 from splitwise_sync.core.splitwise_client import SplitwiseClient
 
 logging.basicConfig(
@@ -34,25 +40,96 @@ errored_logger = create_logger(
 )
 
 
-def email_to_json(filename: Path) -> None:
-    """Convert email to JSON format."""
-    email_client = ImapEmailClient()
-    receipt_parser = ReceiptParser()
-    emails = email_client.fetch_unread_from_sender("enviodigital@bancoedwards.cl")
-
-    def inner(email: EmailMessage) -> dict[str, Any]:
-        ans = {"email": email.to_dict()}
-        try:
-            transaction = receipt_parser.parse_email(email)
-            ans["transaction"] = transaction.to_dict()
-        except Exception as exc:
-            ans["error"] = str(exc)
-        return ans
-
-    transactions = [inner(email) for email in emails]
-
-    with open(filename, "w") as f:
-        json.dump(transactions, f, indent=4)
+def email_to_json(
+    filename: Path,
+    from_cache: bool = False,
+    workers: Optional[int] = None,
+    parse_cache: bool = False,
+) -> None:
+    """Convert email to JSON format.
+
+    Emails are streamed from the server, parsed in chunks over a process pool
+    and written in order as they are parsed, so the dump never holds the
+    whole mailbox in memory. Fetched emails are also saved to the local
+    email store.
+
+    Args:
+        filename: Output JSON file
+        from_cache: Parse the emails in the local store instead of fetching
+                    them, so the whole history can be re-parsed offline
+        workers: Number of parser processes (default: one per CPU)
+        parse_cache: Reuse the parsing results of previously seen bodies
+    """
+    sources = parse_email_sources()
+
+    def dump(emails: Iterable[tuple[EmailSource, EmailMessage]]) -> None:
+        # split the stream into the parser names and the messages, lazily
+        names, messages = tee(emails)
+        results = parse_many(
+            (email for _, email in messages),
+            workers=workers,
+            parsers=(source.parser for source, _ in names),
+            cache_path=config.PARSE_CACHE_PATH if parse_cache else None,
+        )
+        write_json_array(f, iter_records(results))
+
+    with EmailStore(config.EMAIL_STORE_DIR) as store, open(filename, "w") as f:
+        if from_cache:
+            logger.info(f"Reading {len(store)} emails from {store.root}")
+            dump(iter_cached(store, sources))
+            return
+
+        with ImapEmailClient(store=store) as email_client:
+            dump(email_client.iter_from_sources(sources))
+
+
+def iter_records(
+    results: Iterable[ParseResult], batch_size: int = 256
+) -> Iterator[dict[str, Any]]:
+    """Convert parse results to JSON records, one batch of transactions at a time."""
+    for chunk in batched(results, batch_size):
+        batch = TransactionBatch.from_transactions(
+            result.transaction for result in chunk if result.transaction is not None
+        )
+        transactions = iter(batch.to_dicts())
+        for result in chunk:
+            record: dict[str, Any] = {"email": result.message.to_dict()}
+            if result.transaction is not None:
+                record["transaction"] = next(transactions)
+            else:
+                record["error"] = result.error
+            yield record
+
+
+def iter_cached(
+    store: EmailStore, sources: list[EmailSource]
+) -> Iterator[tuple[EmailSource, EmailMessage]]:
+    """Yield the stored emails matching a source, with that source."""
+    for entry, email in store.iter_emails():
+        source = match_source(sources, entry.folder, email.sender)
+        if source is None:
+            logger.debug(f"Skipping stored email {entry.key}: no matching source")
+            continue
+        yield source, email
+
+
+def match_source(
+    sources: list[EmailSource], folder: str, sender: str
+) -> Optional[EmailSource]:
+    """Find the source an email was fetched for (IMAP FROM is a substring match)."""
+    for source in sources:
+        if source.folder == folder and source.sender.lower() in sender.lower():
+            return source
+    return None
+
+
+def write_json_array(f: TextIO, items: Iterable[Any]) -> None:
+    """Write items to a file as a JSON array without materialising them."""
+    f.write("[")
+    for i, item in enumerate(items):
+        f.write(",\n" if i else "\n")
+        f.write(json.dumps(item, indent=4))
+    f.write("\n]")
 
 
 def main() -> None:
@@ -67,6 +144,21 @@ def main() -> None:
         type=Path,
         help="Output file for transactions parsed from emails in JSON format",
     )
+    parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="Parse the emails saved in the local store instead of fetching them",
+    )
+    parser.add_argument(
+        "--parse-cache",
+        action="store_true",
+        help="Reuse the parsing results of previously seen email bodies",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of processes parsing the emails (default: one per CPU)",
+    )
     parser.add_argument(
         "--limit", type=int, default=1000, help="Limit the expenses to fetch"
     )
@@ -80,7 +172,12 @@ def main() -> None:
     args = parser.parse_args()
 
     if args.transactions:
-        email_to_json(args.transactions)
+        email_to_json(
+            args.transactions,
+            from_cache=args.from_cache,
+            workers=args.workers,
+            parse_cache=args.parse_cache,
+        )
         logger.info(f"Transactions saved to {args.transactions}")
         return
 
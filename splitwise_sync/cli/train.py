@@ -0,0 +1,129 @@
+"""Train the expense model on the matched transactions, reproducibly.
+
+Each run writes a new version of the model to ``models/`` with a JSON file of
+its cross-validation metrics, the parameters searched and the SHA-256 of the
+training data. The fitted features of each fold are cached in
+``TRAIN_CACHE_DIR``, so searching other tree parameters on the same data only
+fits trees.
+"""
+
+import argparse
+import logging
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from splitwise_sync import config
+from splitwise_sync.ml.fast_predictor import EXPORT_SUFFIX, export_model, file_sha256
+from splitwise_sync.ml.training import (
+    DEFAULT_PARAM_GRID,
+    INPUT_FEATURES,
+    SCORING,
+    save_model,
+    train,
+)
+
+logging.basicConfig(
+    level=logging.DEBUG if config.DEBUG else logging.INFO,
+    format="%(asctime)s [%(name)s] %(levelname)-8s %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+DATA_PATH = config.PROCESSED_DIR / "matched_transactions_locs.pkl"
+
+
+def main() -> None:
+    """Main entry point for the training."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data", type=Path, default=DATA_PATH, help="Pickled matched transactions"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=config.MODELS_DIR,
+        help="Directory of the versioned models",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        nargs="+",
+        default=DEFAULT_PARAM_GRID["max_depth"],
+        help="Tree depths to try",
+    )
+    parser.add_argument(
+        "--min-samples-leaf",
+        type=int,
+        nargs="+",
+        default=DEFAULT_PARAM_GRID["min_samples_leaf"],
+        help="Minimum samples per leaf to try",
+    )
+    parser.add_argument(
+        "--min-samples-split",
+        type=int,
+        nargs="+",
+        default=DEFAULT_PARAM_GRID["min_samples_split"],
+        help="Minimum samples to split a node to try",
+    )
+    parser.add_argument("--cv", type=int, default=5, help="Number of folds")
+    parser.add_argument(
+        "--scoring", choices=SCORING, default="f1", help="Metric picking the model"
+    )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=-1,
+        help="Processes fitting the folds (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42, help="Seed of the folds and of the trees"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=config.TRAIN_CACHE_DIR,
+        help="Directory caching the fitted features",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Fit the features of every candidate"
+    )
+    parser.add_argument(
+        "--install",
+        action="store_true",
+        help=f"Copy the model to {config.DEFAULT_MODEL_PATH.name} and export it",
+    )
+    args = parser.parse_args()
+
+    frame = pd.read_pickle(args.data)
+    logger.info(f"Training on {len(frame)} transactions from {args.data}")
+    pipeline, metrics = train(
+        frame,
+        param_grid={
+            "max_depth": args.max_depth,
+            "min_samples_leaf": args.min_samples_leaf,
+            "min_samples_split": args.min_samples_split,
+        },
+        cv=args.cv,
+        scoring=args.scoring,
+        n_jobs=args.n_jobs,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        random_state=args.seed,
+    )
+    metrics["data"] = {"path": str(args.data), "sha256": file_sha256(args.data)}
+    model_path, metrics_path = save_model(pipeline, metrics, args.output_dir)
+    logger.info(f"Model saved to {model_path}, metrics to {metrics_path}")
+
+    if args.install:
+        # checked on the training set before anything is installed
+        export_path = export_model(model_path, frame=frame[INPUT_FEATURES])
+        shutil.copyfile(model_path, config.DEFAULT_MODEL_PATH)
+        shutil.copyfile(
+            export_path, config.DEFAULT_MODEL_PATH.with_suffix(EXPORT_SUFFIX)
+        )
+        logger.info(f"Installed {model_path.name} as {config.DEFAULT_MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,15 @@ logger = logging.getLogger(__name__)
 
 GMAIL_USERNAME = os.getenv("GMAIL_USERNAME", "")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD", "")
+# Number of messages downloaded per IMAP FETCH command
+IMAP_FETCH_BULK = int(os.getenv("IMAP_FETCH_BULK", "50"))
+# Receipt sources as "folder,sender[,parser]" entries separated by ";"; without a
+# parser, each email is dispatched to a parser by its sender and subject
+EMAIL_SOURCES = os.getenv(
+    "EMAIL_SOURCES", "INBOX,enviodigital@bancoedwards.cl,bancochile"
+)
+# Seconds to stay in IMAP IDLE before re-issuing it (RFC 2177 advises < 29 min)
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", "600"))
 
 SPLITWISE_CONSUMER_KEY = os.getenv("SPLITWISE_CONSUMER_KEY", "")
 SPLITWISE_CONSUMER_SECRET = os.getenv("SPLITWISE_CONSUMER_SECRET", "")
@@ -19,6 +28,11 @@ SPLITWISE_API_KEY = os.getenv("SPLITWISE_API_KEY", "")
 
 DEFAULT_FRIEND_ID = int(os.getenv("DEFAULT_FRIEND_ID", "0"))
 DEFAULT_SPLIT = float(os.getenv("DEFAULT_SPLIT", "0.5"))
+# Probability from which a transaction is predicted as shared; when unset the
+# model's own decision (predict) is used
+SHARED_THRESHOLD = (
+    float(os.environ["SHARED_THRESHOLD"]) if os.getenv("SHARED_THRESHOLD") else None
+)
 
 DEFAULT_TIMEZONE = "America/Santiago"
 
@@ -29,6 +43,31 @@ if not LOGS_DIR.exists():
     logger.info(f"Creating directory for processed logs: {LOGS_DIR}")
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Persistent state between runs (e.g. IMAP UID checkpoints)
+STATE_DIR = Path(os.getenv("STATE_DIR", "./state"))
+SYNC_STATE_PATH = STATE_DIR / "sync_state.json"
+# Local copy of the raw fetched emails, for offline re-parsing
+EMAIL_STORE_DIR = Path(os.getenv("EMAIL_STORE_DIR", STATE_DIR / "emails"))
+# Cache of receipt parsing results, bounded to PARSE_CACHE_SIZE entries
+PARSE_CACHE_PATH = Path(
+    os.getenv("PARSE_CACHE_PATH", STATE_DIR / "parse_cache.sqlite3")
+)
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "100000"))
+# Cache of the model predictions by merchant, bounded to PREDICTION_CACHE_SIZE
+PREDICTION_CACHE_PATH = Path(
+    os.getenv("PREDICTION_CACHE_PATH", STATE_DIR / "prediction_cache.sqlite3")
+)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "50000"))
+# Unix socket of the model server (splitwise-sync serve-model), used when present
+MODEL_SOCKET_PATH = Path(os.getenv("MODEL_SOCKET_PATH", STATE_DIR / "model.sock"))
+# Micro-batches of the model server: maximum transactions and seconds to wait
+MODEL_BATCH_SIZE = int(os.getenv("MODEL_BATCH_SIZE", "256"))
+MODEL_BATCH_WAIT = float(os.getenv("MODEL_BATCH_WAIT", "0.005"))
+# User rules deciding expenses before the model (see core/rules.py), when present
+RULES_PATH = Path(os.getenv("RULES_PATH", "./rules.json"))
+# Number of times each rule fired, accumulated over the runs
+RULE_STATS_PATH = Path(os.getenv("RULE_STATS_PATH", STATE_DIR / "rule_stats.json"))
+
 
 # Directories for data and models
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -43,3 +82,13 @@ MODELS_DIR = PROJECT_ROOT / "models"
 
 
 DEFAULT_MODEL_PATH = MODELS_DIR / "decision_tree_model.pkl"
+# Model learning online from the kept and deleted expenses (splitwise-sync learn)
+ONLINE_MODEL_PATH = Path(
+    os.getenv("ONLINE_MODEL_PATH", MODELS_DIR / "online_model.joblib")
+)
+# Days an expense is left to the user to correct before it is learned from
+FEEDBACK_DELAY_DAYS = float(os.getenv("FEEDBACK_DELAY_DAYS", "3"))
+# Expenses are learned up to the time saved here
+FEEDBACK_STATE_PATH = STATE_DIR / "feedback_state.json"
+# Fitted features of each cross-validation fold, reused by splitwise-train
+TRAIN_CACHE_DIR = Path(os.getenv("TRAIN_CACHE_DIR", STATE_DIR / "train_cache"))
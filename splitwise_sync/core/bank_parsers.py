@@ -0,0 +1,80 @@
+"""Receipt parsers for the purchase notifications of other Chilean banks.
+
+Each parser reuses the extraction logic of ``ReceiptParser`` and only
+declares the senders and subjects it handles and the patterns matching its
+bank's wording.
+"""
+
+import re
+
+from .receipt_parser import ReceiptParser
+
+_AMOUNT = r"(?P<currency>[A-Z]{2,3})?\$\s*(?P<amount>[.\d]+)(?P<decimals>,\d{2})?"
+_DATE = r"(?P<day>\d{2})/(?P<month>\d{2})/(?P<year>\d{4})"
+_TIME = r"(?P<hour>\d{2}):(?P<minute>\d{2})"
+
+
+class BciParser(ReceiptParser):
+    """Parser for BCI credit card purchase emails.
+
+    "Se ha realizado una compra por $12.345 en COMERCIO con tu Tarjeta de
+    Crédito terminada en 1234 el día 01/02/2025 a las 12:34 hrs."
+    """
+
+    name = "bci"
+    senders = ("bci.cl",)
+    subjects = ("compra",)
+
+    receipt_re = re.compile(
+        rf"(?P<text>compra por {_AMOUNT} en (?P<merchant>.+?) con tu Tarjeta"
+        rf".*? terminada en (?P<card>\d{{4}}) el día {_DATE} a las {_TIME})"
+    )
+    text_re = re.compile(r"(compra por .+? a las \d{2}:\d{2})")
+    amount_re = re.compile(_AMOUNT)
+    card_re = re.compile(r"terminada en (\d{4})")
+    merchant_res = (re.compile(r"\$\s*[.\d]+(?:,\d{2})? en (.+?) con tu"),)
+    date_re = re.compile(rf"{_DATE}(?: a las {_TIME})?")
+
+
+class SantanderParser(ReceiptParser):
+    """Parser for Santander card purchase emails, laid out as labelled fields.
+
+    "Monto $12.345 Comercio COMERCIO Fecha 01/02/2025 Hora 12:34 Tarjeta
+    terminada en ****1234"
+    """
+
+    name = "santander"
+    senders = ("santander.cl",)
+    subjects = ("compra",)
+    mime_parts = ("html",)
+
+    receipt_re = re.compile(
+        rf"(?P<text>Monto {_AMOUNT} Comercio (?P<merchant>.+?) "
+        rf"Fecha {_DATE} Hora {_TIME}) .*?\*{{4}}(?P<card>\d{{4}})"
+    )
+    text_re = re.compile(r"(Monto .+? Hora \d{2}:\d{2})")
+    amount_re = re.compile(rf"Monto {_AMOUNT}")
+    merchant_res = (re.compile(r"Comercio (.+?) Fecha"),)
+    date_re = re.compile(rf"Fecha {_DATE}(?: Hora {_TIME})?")
+
+
+class BancoEstadoParser(ReceiptParser):
+    """Parser for BancoEstado card purchase emails.
+
+    "Se realizó una compra por $12.345 con tu tarjeta terminada en 1234 en
+    COMERCIO el 01/02/2025 12:34."
+    """
+
+    name = "bancoestado"
+    senders = ("bancoestado.cl",)
+    subjects = ("compra",)
+
+    receipt_re = re.compile(
+        rf"(?P<text>compra por {_AMOUNT} con tu tarjeta .*?terminada en "
+        rf"(?P<card>\d{{4}}) en (?P<merchant>.+?) el {_DATE} {_TIME})"
+    )
+    text_re = re.compile(r"(compra por .+? el \d{2}/\d{2}/\d{4} \d{2}:\d{2})")
+    amount_re = re.compile(_AMOUNT)
+    card_re = re.compile(r"terminada en (\d{4})")
+    merchant_res = (re.compile(r"terminada en \d{4} en (.+?) el \d{2}/"),)
+    date_re = re.compile(rf"el {_DATE} {_TIME}")
@@ -0,0 +1,159 @@
+"""Parallel parsing of large batches of receipt emails (e.g. backfills)."""
+
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+from .models import EmailMessage, Transaction
+from .parse_cache import ParseCache
+from .parser_registry import AUTO, ParserRegistry
+
+logger = logging.getLogger(__name__)
+
+# Messages sent to a worker process at a time
+DEFAULT_CHUNKSIZE = 64
+
+# Workers are not forked from the caller, which may be running threads
+# (e.g. the IMAP prefetch of ImapEmailClient.iter_from_sources)
+_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_Job = Tuple[str, EmailMessage]
+_Outcome = Tuple[Optional[Transaction], Optional[str]]
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    """Outcome of parsing one email: a transaction or an error message."""
+
+    message: EmailMessage
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.transaction is not None
+
+
+# Parser registry of a worker process, built by _init_worker
+_worker_registry: Optional[ParserRegistry] = None
+
+
+def _create_registry(cache_path: Optional[Path]) -> ParserRegistry:
+    cache = ParseCache(cache_path) if cache_path is not None else None
+    return ParserRegistry(cache=cache)
+
+
+def _init_worker(cache_path: Optional[Path]) -> None:
+    """Build the parser registry (and cache connection) of a worker, once."""
+    global _worker_registry
+    _worker_registry = _create_registry(cache_path)
+
+
+def _parse_worker_chunk(jobs: List[_Job]) -> List[_Outcome]:
+    assert _worker_registry is not None, "worker not initialized"
+    return _parse_chunk(jobs, _worker_registry)
+
+
+def _parse_chunk(jobs: List[_Job], registry: ParserRegistry) -> List[_Outcome]:
+    """Parse a chunk of emails, turning exceptions into error messages."""
+    outcomes: List[_Outcome] = []
+    for parser_name, message in jobs:
+        try:
+            outcomes.append((registry.parse_email(message, parser_name), None))
+        except Exception as exc:
+            outcomes.append((None, str(exc) or type(exc).__name__))
+    return outcomes
+
+
+def _chunks(jobs: Iterator[_Job], size: int) -> Iterator[List[_Job]]:
+    while chunk := list(islice(jobs, size)):
+        yield chunk
+
+
+def parse_many(
+    messages: Iterable[EmailMessage],
+    workers: Optional[int] = None,
+    parsers: Optional[Iterable[str]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    cache_path: Optional[Path] = None,
+) -> Iterator[ParseResult]:
+    """Parse many emails over a pool of worker processes.
+
+    Messages are sent to the workers in chunks, with at most two chunks per
+    worker in flight, so the input can be a lazy stream of any length.
+    Results come back in input order and parsing errors are reported per
+    item instead of raised. The throughput is logged once all messages have
+    been parsed.
+
+    Args:
+        messages: The emails to parse
+        workers: Number of worker processes (default: one per CPU); with 1
+                 or less the emails are parsed in the current process
+        parsers: Parser name of each message, in the same order (default:
+                 dispatch every message by its sender, see ``ParserRegistry``)
+        chunksize: Number of messages sent to a worker at a time
+        cache_path: Optional ``ParseCache`` database shared by the workers
+
+    Yields:
+        The result of each email, in input order
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    jobs = zip(parsers if parsers is not None else repeat(AUTO), messages)
+    chunks = _chunks(jobs, max(chunksize, 1))
+
+    start = time.perf_counter()
+    parsed = failed = 0
+    for jobs_chunk, outcomes in _run(chunks, workers, cache_path):
+        for (_, message), (transaction, error) in zip(jobs_chunk, outcomes):
+            parsed += 1
+            failed += error is not None
+            yield ParseResult(message, transaction, error)
+
+    elapsed = time.perf_counter() - start
+    rate = parsed / elapsed if elapsed else 0.0
+    logger.info(
+        f"Parsed {parsed} emails ({failed} failed) in {elapsed:.2f}s "
+        f"with {max(workers, 1)} workers: {rate:.1f} emails/s"
+    )
+
+
+def _run(
+    chunks: Iterator[List[_Job]], workers: int, cache_path: Optional[Path]
+) -> Iterator[Tuple[List[_Job], List[_Outcome]]]:
+    """Parse chunks in order, in the current process or over a pool."""
+    if workers <= 1:
+        registry = _create_registry(cache_path)
+        try:
+            for chunk in chunks:
+                yield chunk, _parse_chunk(chunk, registry)
+        finally:
+            if registry.cache is not None:
+                registry.cache.close()
+        return
+
+    pending: Deque[Tuple[List[_Job], "Future[List[_Outcome]]"]] = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(_START_METHOD),
+        initializer=_init_worker,
+        initargs=(cache_path,),
+    ) as executor:
+        for chunk in chunks:
+            future = executor.submit(_parse_worker_chunk, chunk)
+            pending.append((chunk, future))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
@@ -1,18 +1,38 @@
 """IMAP email client for fetching messages from Gmail."""
 
+import heapq
+import imaplib
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
-from imap_tools.mailbox import MailBox
+from imap_tools.errors import MailboxFetchError
+from imap_tools.mailbox import BaseMailBox, MailBox, MailBoxUnencrypted
 from imap_tools.message import MailMessage
 from imap_tools.query import AND
-
-from ..config import GMAIL_APP_PASSWORD, GMAIL_USERNAME
+from imap_tools.utils import check_command_status, chunked_crop
+
+from ..config import EMAIL_SOURCES, GMAIL_APP_PASSWORD, GMAIL_USERNAME, IMAP_FETCH_BULK
+from .email_store import EmailStore
+from .imap_parts import (
+    TextPart,
+    Value,
+    build_text_message,
+    decode_part,
+    find_text_part,
+    parse_fetch_response,
+)
 from .models import EmailMessage
+from .sync_state import SyncState, UidCheckpoint
 
 logger = logging.getLogger(__name__)
 
+# Text parts downloaded in text-only mode, by preference
+DEFAULT_TEXT_PARTS = ("plain", "html")
+
 
 @dataclass
 class EmailCredentials:
@@ -22,18 +42,83 @@ class EmailCredentials:
     password: str
 
 
+@dataclass(frozen=True)
+class EmailSource:
+    """A folder/sender pair to fetch receipts from, and the parser to use.
+
+    With the "auto" parser, each email is dispatched to a parser by its sender
+    and subject (see ``ParserRegistry``).
+    """
+
+    folder: str
+    sender: str
+    parser: str = "auto"
+
+
+def parse_email_sources(value: str = EMAIL_SOURCES) -> List[EmailSource]:
+    """Parse sources written as ``folder,sender[,parser]`` separated by ``;``.
+
+    Args:
+        value: The sources specification, e.g.
+               ``"INBOX,enviodigital@bancoedwards.cl,bancochile;Recibos,bci.cl"``
+
+    Returns:
+        The list of configured email sources
+    """
+    sources = []
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        fields = [field.strip() for field in entry.split(",")]
+        if len(fields) not in (2, 3):
+            raise ValueError(
+                f"Invalid email source {entry!r}, expected folder,sender[,parser]"
+            )
+        sources.append(EmailSource(*fields))
+    return sources
+
+
 class ImapEmailClient:
     """Client for fetching messages from Gmail using IMAP protocol."""
 
-    def __init__(self, credentials: Optional[EmailCredentials] = None) -> None:
+    def __init__(
+        self,
+        credentials: Optional[EmailCredentials] = None,
+        text_only: bool = False,
+        imap_server: str = "imap.gmail.com",
+        port: int = 993,
+        use_ssl: bool = True,
+        store: Optional[EmailStore] = None,
+    ) -> None:
         """Initialize the IMAP Gmail client.
 
         Args:
             credentials: Optional email credentials. If not provided,
                          credentials will be loaded from environment variables.
+            text_only: Download only the headers and the text part of each
+                       message (text/plain, or text/html as a fallback)
+                       instead of the full MIME message.
+            imap_server: Host name of the IMAP server.
+            port: Port of the IMAP server.
+            use_ssl: Whether to connect over SSL (disable only for local
+                     test servers).
+            store: Optional local store where the raw bytes of every
+                   fetched message are saved for offline re-parsing.
         """
         self.credentials = credentials or self._load_credentials_from_env()
-        self.imap_server = "imap.gmail.com"
+        self.imap_server = imap_server
+        self.port = port
+        self.use_ssl = use_ssl
+        self.text_only = text_only
+        self.store = store
+        self._mailboxes: Dict[str, BaseMailBox] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ImapEmailClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
 
     def _load_credentials_from_env(self) -> EmailCredentials:
         """Load email credentials from environment variables."""
@@ -49,16 +134,64 @@ class ImapEmailClient:
 
         return EmailCredentials(username=username, password=password)
 
-    def _connect(self) -> MailBox:
-        """Connect to the IMAP server and login.
+    def _connect(self, folder: str = "INBOX") -> BaseMailBox:
+        """Return the IMAP session of a folder, connecting and logging in if needed.
+
+        Each folder gets its own session with the folder selected, so folders
+        can be fetched concurrently. Sessions are reused across calls for the
+        lifetime of the client. A NOOP is sent to check that a cached session
+        is still alive; if the server dropped it, it is closed and a new
+        connection is opened transparently.
+
+        Args:
+            folder: The mailbox folder the session works on
 
         Returns:
             An authenticated MailBox connection
         """
-        mailbox = MailBox(self.imap_server)
-        mailbox.login(self.credentials.username, self.credentials.password, "INBOX")
+        with self._lock:
+            mailbox = self._mailboxes.get(folder)
+        if mailbox is not None:
+            if self._is_alive(mailbox):
+                return mailbox
+            # release the socket of the dropped session before replacing it
+            self._logout(mailbox)
+
+        logger.debug(f"Opening IMAP session to {self.imap_server} for {folder}")
+        if self.use_ssl:
+            mailbox = MailBox(self.imap_server, self.port)
+        else:
+            mailbox = MailBoxUnencrypted(self.imap_server, self.port)
+        mailbox.login(self.credentials.username, self.credentials.password, folder)
+        with self._lock:
+            self._mailboxes[folder] = mailbox
         return mailbox
 
+    def _is_alive(self, mailbox: BaseMailBox) -> bool:
+        """Check whether an IMAP session still responds to a NOOP."""
+        try:
+            status, _ = mailbox.client.noop()
+        except (imaplib.IMAP4.error, OSError):
+            logger.debug("IMAP session is no longer alive, reconnecting")
+            return False
+        alive: bool = status == "OK"
+        return alive
+
+    def close(self) -> None:
+        """Log out and drop all open IMAP sessions."""
+        with self._lock:
+            mailboxes = list(self._mailboxes.values())
+            self._mailboxes.clear()
+        for mailbox in mailboxes:
+            self._logout(mailbox)
+
+    def _logout(self, mailbox: BaseMailBox) -> None:
+        """Log out of an IMAP session, ignoring the errors of a dead one."""
+        try:
+            mailbox.logout()
+        except (imaplib.IMAP4.error, OSError) as exc:
+            logger.debug(f"Ignoring error while closing IMAP session: {exc}")
+
     def _convert_message(self, msg: MailMessage) -> EmailMessage:
         """Convert imap_tools MailMessage to our EmailMessage format.
 
@@ -93,19 +226,340 @@ class ImapEmailClient:
         Returns:
             A list of unread email messages from the specified sender
         """
-        messages: List[EmailMessage] = []
+        return list(self.iter_unread_from_sender(sender_email, mark_as_read))
+
+    def iter_unread_from_sender(
+        self,
+        sender_email: str,
+        mark_as_read: bool = True,
+        bulk: int = IMAP_FETCH_BULK,
+        limit: Optional[int] = None,
+        folder: str = "INBOX",
+        text_parts: Tuple[str, ...] = DEFAULT_TEXT_PARTS,
+    ) -> Iterator[EmailMessage]:
+        """Lazily yield unread emails from a specific sender.
+
+        Messages are downloaded in chunks of ``bulk`` and converted one at a
+        time, so memory use stays flat regardless of the mailbox size.
+
+        Args:
+            sender_email: The email address of the sender to filter by
+            mark_as_read: Whether to mark emails as read after fetching (default: True)
+            bulk: Number of messages to download per FETCH command
+            limit: Maximum number of messages to fetch (default: all)
+            folder: The mailbox folder to search in
+            text_parts: Text subtypes to download in text-only mode, by
+                        preference
+
+        Yields:
+            Unread email messages from the specified sender
+        """
+        mailbox = self._connect(folder)
+        criteria = AND(seen=False, from_=sender_email)
+
+        count = 0
+        emails = self._fetch(
+            mailbox, folder, criteria, mark_as_read, bulk, limit, text_parts
+        )
+        for email_msg in emails:
+            count += 1
+            yield email_msg
+
+        logger.info(f"Found {count} unread messages from {sender_email}")
+
+    def fetch_new_from_sender(
+        self, sender_email: str, state: SyncState, folder: str = "INBOX"
+    ) -> List[EmailMessage]:
+        """Fetch emails from a sender that arrived after the last checkpoint.
+
+        See ``iter_new_from_sender`` for details.
+
+        Args:
+            sender_email: The email address of the sender to filter by
+            state: Sync state holding the UID checkpoints
+            folder: The mailbox folder to search in
+
+        Returns:
+            A list of the new email messages from the specified sender
+        """
+        return list(self.iter_new_from_sender(sender_email, state, folder))
+
+    def iter_new_from_sender(
+        self,
+        sender_email: str,
+        state: SyncState,
+        folder: str = "INBOX",
+        bulk: int = IMAP_FETCH_BULK,
+        text_parts: Tuple[str, ...] = DEFAULT_TEXT_PARTS,
+    ) -> Iterator[EmailMessage]:
+        """Lazily yield emails from a sender that arrived after the last checkpoint.
+
+        Only ``UID last+1:*`` is searched, so each run costs O(new messages) and
+        the \\Seen flag is left untouched. When there is no checkpoint yet, or
+        the folder's UIDVALIDITY changed, the unread messages from the sender
+        are fetched instead and the checkpoint is rebuilt.
+
+        The messages recorded as failed in the checkpoint are searched again
+        along with the new ones. The checkpoint is not moved here: record each
+        message with ``state.mark_processed`` or ``state.add_failed`` once it
+        has been processed, then call ``state.save()``. Messages yielded but
+        never recorded (e.g. buffered when a fetch fails) are fetched again.
 
-        with self._connect() as mailbox:
+        Args:
+            sender_email: The email address of the sender to filter by
+            state: Sync state holding the UID checkpoints
+            folder: The mailbox folder to search in
+            bulk: Number of messages to download per FETCH command
+            text_parts: Text subtypes to download in text-only mode, by
+                        preference
+
+        Yields:
+            The new email messages from the specified sender
+        """
+        mailbox = self._connect(folder)
+        status = mailbox.folder.status(folder, ["UIDVALIDITY", "UIDNEXT"])
+        uidvalidity = status["UIDVALIDITY"]
+
+        checkpoint = state.get(folder, sender_email)
+        if checkpoint is not None and checkpoint.uidvalidity == uidvalidity:
+            uids = [str(uid) for uid in checkpoint.failed_uids]
+            uids.append(f"{checkpoint.last_uid + 1}:*")
+            criteria = AND(uid=uids, from_=sender_email)
+            if checkpoint.failed_uids:
+                logger.info(
+                    f"Retrying {len(checkpoint.failed_uids)} failed messages "
+                    f"from {sender_email} in {folder}"
+                )
+        else:
+            logger.info(
+                f"No valid UID checkpoint for {sender_email} in {folder}, "
+                "falling back to a full resync of unread messages"
+            )
             criteria = AND(seen=False, from_=sender_email)
+            # the unread messages stay pending until processed, even if the
+            # fetch below fails
+            unread = tuple(int(uid) for uid in mailbox.uids(criteria))
+            checkpoint = UidCheckpoint(uidvalidity, status["UIDNEXT"] - 1, unread)
+            state.set(folder, sender_email, checkpoint)
+
+        pending = set(checkpoint.failed_uids)
+        count = 0
+        emails = self._fetch(mailbox, folder, criteria, False, bulk, None, text_parts)
+        for email_msg in emails:
+            uid = int(email_msg.uid)
+            # "n:*" always matches the newest message, even when its UID < n
+            if uid <= checkpoint.last_uid and uid not in pending:
+                continue
+            count += 1
+            yield email_msg
+
+        logger.info(f"Found {count} new messages from {sender_email}")
+
+    def _fetch(
+        self,
+        mailbox: BaseMailBox,
+        folder: str,
+        criteria: AND,
+        mark_seen: bool,
+        bulk: int,
+        limit: Optional[int] = None,
+        text_parts: Tuple[str, ...] = DEFAULT_TEXT_PARTS,
+    ) -> Iterator[EmailMessage]:
+        """Fetch the messages matching ``criteria`` in the configured mode."""
+        if self.text_only:
+            yield from self._fetch_text_only(
+                mailbox, folder, criteria, mark_seen, bulk, limit, text_parts
+            )
+            return
+
+        for msg in mailbox.fetch(
+            criteria, mark_seen=mark_seen, bulk=self._bulk(bulk), limit=limit
+        ):
+            if self.store is not None:
+                self.store.put(msg.obj.as_bytes(), folder, str(msg.uid))
+            yield self._convert_message(msg)
+
+    def _fetch_text_only(
+        self,
+        mailbox: BaseMailBox,
+        folder: str,
+        criteria: AND,
+        mark_seen: bool,
+        bulk: int,
+        limit: Optional[int] = None,
+        text_parts: Tuple[str, ...] = DEFAULT_TEXT_PARTS,
+    ) -> Iterator[EmailMessage]:
+        """Fetch headers and only the text part of the matching messages.
+
+        For each chunk of UIDs, one FETCH retrieves the headers and the
+        BODYSTRUCTURE, then one FETCH per distinct section number downloads
+        the first available part of ``text_parts`` with BODY.PEEK. Images and
+        attachments are never transferred and the \\Seen flag is only set when
+        ``mark_seen`` is True. When a store is configured, the headers and
+        text part are saved as a single-part message.
+        """
+        uids = mailbox.uids(criteria)[:limit]
+        for chunk in chunked_crop(uids, max(bulk, 1)):
+            structures = self._uid_fetch(
+                mailbox, chunk, "BODYSTRUCTURE BODY.PEEK[HEADER]"
+            )
 
-            # Set mark_seen=False to keep emails unread
-            for msg in mailbox.fetch(criteria, mark_seen=mark_as_read):
-                email_msg = self._convert_message(msg)
-                messages.append(email_msg)
+            parts: Dict[str, TextPart] = {}
+            for uid, item in structures.items():
+                part = find_text_part(item.get("BODYSTRUCTURE"), text_parts)
+                if part is None:
+                    logger.warning(f"Email {uid} has no text part to download")
+                    continue
+                parts[uid] = part
+
+            payloads: Dict[str, bytes] = {}
+            for section in sorted({part.section for part in parts.values()}):
+                section_uids = [
+                    uid
+                    for uid in chunk
+                    if uid in parts and parts[uid].section == section
+                ]
+                key = f"BODY[{section}]"
+                for uid, item in self._uid_fetch(
+                    mailbox, section_uids, f"BODY.PEEK[{section}]"
+                ).items():
+                    payload = item.get(key)
+                    if isinstance(payload, bytes):
+                        payloads[uid] = payload
+
+            for uid in chunk:
+                if uid not in structures:
+                    continue
+                header = structures[uid].get("BODY[HEADER]")
+                header = header if isinstance(header, bytes) else b""
+                msg = MailMessage.from_bytes(header)
+                payload = payloads.get(uid)
+                if self.store is not None and payload is not None:
+                    raw = build_text_message(header, payload, parts[uid])
+                    self.store.put(raw, folder, uid)
+                yield EmailMessage(
+                    uid=uid,
+                    subject=msg.subject,
+                    sender=msg.from_,
+                    to=msg.to,
+                    date=msg.date,
+                    body=decode_part(payload, parts[uid]) if payload else "",
+                )
+
+            if mark_seen:
+                mailbox.flag(chunk, "\\Seen", True)
+
+    @staticmethod
+    def _uid_fetch(
+        mailbox: BaseMailBox, uids: List[str], message_parts: str
+    ) -> Dict[str, Dict[str, Value]]:
+        """Run a raw ``UID FETCH`` and return the parsed items keyed by UID."""
+        if not uids:
+            return {}
+        result = mailbox.client.uid("FETCH", ",".join(uids), f"(UID {message_parts})")
+        check_command_status(result, MailboxFetchError)
+        return {str(item["UID"]): item for item in parse_fetch_response(result[1])}
+
+    def wait_for_new_messages(self, timeout: float, folder: str = "INBOX") -> bool:
+        """Block in IMAP IDLE until the server announces new messages.
 
-        logger.info(f"Found {len(messages)} unread messages from {sender_email}")
+        Args:
+            timeout: Maximum number of seconds to wait
+            folder: The mailbox folder to watch
 
-        return messages
+        Returns:
+            True if the server sent an EXISTS notification, False on timeout
+        """
+        mailbox = self._connect(folder)
+        responses = mailbox.idle.wait(timeout=timeout)
+        return any(response.rstrip().endswith(b"EXISTS") for response in responses)
+
+    def iter_from_sources(
+        self,
+        sources: Iterable[EmailSource],
+        state: Optional[SyncState] = None,
+        mark_as_read: bool = True,
+        prefetch: int = IMAP_FETCH_BULK,
+        text_parts: Optional[Mapping[EmailSource, Tuple[str, ...]]] = None,
+    ) -> Iterator[Tuple[EmailSource, EmailMessage]]:
+        """Fetch several sources concurrently and merge them into one stream.
+
+        Sources are grouped by folder and each folder is fetched by its own
+        thread over its own IMAP session, so a slow folder does not hold back
+        the others. Within a folder, the streams of its senders are merged by
+        their ``Date:`` header by the folder's thread, taking turns on the
+        session (each FETCH completes before its messages are yielded). Every
+        thread buffers at most ``prefetch`` messages, and the per-folder
+        streams are merged by date too.
+
+        The order is best-effort: each sender's messages come in UID (arrival)
+        order, which incremental checkpoints rely on, and are not re-sorted, so
+        a message whose ``Date:`` header is older than an earlier arrival's is
+        yielded after it.
+
+        Args:
+            sources: The folder/sender pairs to fetch
+            state: Sync state for incremental fetching; when None the unread
+                   messages of each source are fetched
+            mark_as_read: Whether to mark emails as read (unread mode only)
+            prefetch: Messages buffered per folder ahead of the consumer
+            text_parts: Text subtypes to download for each source in
+                        text-only mode, as declared by its receipt parser
+
+        Yields:
+            Tuples of the source and one of its email messages, oldest first
+            as far as the senders' dates follow their arrival order
+        """
+        by_folder: Dict[str, List[EmailSource]] = {}
+        for source in sources:
+            by_folder.setdefault(source.folder, []).append(source)
+        if not by_folder:
+            return
+
+        def by_date(item: Tuple[EmailSource, EmailMessage]) -> float:
+            # heapq.merge assumes each stream is sorted by this key; streams
+            # in UID order mostly are, see the docstring
+            return item[1].date.timestamp()
+
+        def fetch_source(
+            source: EmailSource,
+        ) -> Iterator[Tuple[EmailSource, EmailMessage]]:
+            parts = (text_parts or {}).get(source, DEFAULT_TEXT_PARTS)
+            if state is not None:
+                emails = self.iter_new_from_sender(
+                    source.sender, state, source.folder, text_parts=parts
+                )
+            else:
+                emails = self.iter_unread_from_sender(
+                    source.sender,
+                    mark_as_read,
+                    folder=source.folder,
+                    text_parts=parts,
+                )
+            for email_msg in emails:
+                yield source, email_msg
+
+        def fetch_folder(
+            folder_sources: List[EmailSource],
+        ) -> Iterator[Tuple[EmailSource, EmailMessage]]:
+            return heapq.merge(*map(fetch_source, folder_sources), key=by_date)
+
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(by_folder)) as executor:
+            streams = [
+                _prefetched(fetch_folder(folder_sources), executor, prefetch, stop)
+                for folder_sources in by_folder.values()
+            ]
+            try:
+                yield from heapq.merge(*streams, key=by_date)
+            finally:
+                stop.set()
+
+    @staticmethod
+    def _bulk(bulk: int) -> Union[int, bool]:
+        """Translate a chunk size into imap_tools' ``bulk`` argument."""
+        # imap_tools only accepts chunk sizes >= 2; False fetches one by one
+        return bulk if bulk >= 2 else False
 
     def mark_unread(self, email_id: str) -> None:
         """Mark an email as unread.
@@ -113,9 +567,63 @@ class ImapEmailClient:
         Args:
             email_id: The ID of the email to mark as unread
         """
-        with self._connect() as mailbox:
-            mailbox.flag(email_id, "\\Seen", False)
-            logger.info(f"Marked email {email_id} as unread")
+        self.mark_unread_many([email_id])
+
+    def mark_unread_many(self, email_ids: Iterable[str], folder: str = "INBOX") -> None:
+        """Mark several emails as unread with a single STORE command.
+
+        Args:
+            email_ids: The IDs of the emails to mark as unread
+            folder: The mailbox folder the emails belong to
+        """
+        uids = list(email_ids)
+        if not uids:
+            return
+
+        mailbox = self._connect(folder)
+        mailbox.flag(uids, "\\Seen", False)
+        logger.info(f"Marked {len(uids)} emails as unread: {','.join(uids)}")
+
+
+_DONE = object()
+
+
+def _prefetched(
+    items: Iterator[Any],
+    executor: ThreadPoolExecutor,
+    maxsize: int,
+    stop: threading.Event,
+) -> Iterator[Any]:
+    """Consume ``items`` in a worker thread, buffering at most ``maxsize``."""
+    buffer: "queue.Queue[Any]" = queue.Queue(maxsize=max(maxsize, 1))
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as exc:  # re-raised in the consumer thread
+            put(exc)
+        finally:
+            put(_DONE)
+
+    executor.submit(worker)
+    while True:
+        item = buffer.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
 
 if __name__ == "__main__":
@@ -124,8 +632,8 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
     # Example usage: Search for unread emails from Banco Edwards
-    client = ImapEmailClient()
-    emails = client.fetch_unread_from_sender("enviodigital@bancoedwards.cl")
+    with ImapEmailClient() as client:
+        emails = client.fetch_unread_from_sender("enviodigital@bancoedwards.cl")
     for email in emails:
         logger.info(f"Subject: {email.subject}")
         logger.info(f"From: {email.sender}")
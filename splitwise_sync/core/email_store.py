@@ -0,0 +1,196 @@
+"""Local store of the raw emails fetched over IMAP.
+
+Every fetched message is kept as its raw RFC 822 bytes so receipts can be
+parsed again offline (e.g. after changing the parser) without touching the
+mail server. Messages are deduplicated by a SHA-256 key of their Message-ID
+(or folder and UID when the header is missing), zlib-compressed and appended
+to a single pack file, which is memory-mapped for reading. An append-only
+JSON Lines index maps each key to its position in the pack.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import threading
+import zlib
+from dataclasses import asdict, dataclass
+from email.parser import BytesHeaderParser
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from imap_tools.message import MailMessage
+
+from .models import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredEmail:
+    """Index entry of a message in the store."""
+
+    key: str
+    offset: int  # position of the compressed message in the pack file
+    length: int  # size of the compressed message
+    folder: str
+    uid: str
+
+
+class EmailStore:
+    """Append-only, content-addressed store of raw email messages."""
+
+    PACK_NAME = "emails.pack"
+    INDEX_NAME = "index.jsonl"
+
+    def __init__(self, root: Path) -> None:
+        """Open the store, creating its directory if needed.
+
+        Args:
+            root: Directory holding the pack and index files
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.pack_path = self.root / self.PACK_NAME
+        self.index_path = self.root / self.INDEX_NAME
+        self._entries: Dict[str, StoredEmail] = self._load_index()
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> "EmailStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def _load_index(self) -> Dict[str, StoredEmail]:
+        entries: Dict[str, StoredEmail] = {}
+        if not self.index_path.exists():
+            return entries
+        pack_size = self.pack_path.stat().st_size if self.pack_path.exists() else 0
+        with open(self.index_path) as f:
+            for line in f:
+                try:
+                    entry = StoredEmail(**json.loads(line))
+                except (ValueError, TypeError):
+                    logger.warning(f"Skipping corrupt line in {self.index_path}")
+                    continue
+                if entry.offset + entry.length > pack_size:
+                    # interrupted write: the message never fully reached the pack
+                    logger.warning(f"Skipping truncated email {entry.key} in store")
+                    continue
+                entries[entry.key] = entry
+        return entries
+
+    @staticmethod
+    def make_key(raw: bytes, folder: str, uid: str) -> str:
+        """Compute the store key of a message.
+
+        Args:
+            raw: The raw RFC 822 message
+            folder: The mailbox folder the message was fetched from
+            uid: The IMAP UID of the message
+
+        Returns:
+            The hex SHA-256 of the Message-ID header, or of ``folder/uid``
+            when the message has none
+        """
+        message_id = BytesHeaderParser().parsebytes(raw).get("Message-ID")
+        identity = str(message_id).strip() if message_id else f"{folder}/{uid}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def put(self, raw: bytes, folder: str, uid: str) -> str:
+        """Add a raw message to the store unless it is already there.
+
+        Args:
+            raw: The raw RFC 822 message
+            folder: The mailbox folder the message was fetched from
+            uid: The IMAP UID of the message
+
+        Returns:
+            The key of the message
+        """
+        key = self.make_key(raw, folder, uid)
+        if key in self._entries:
+            return key
+
+        data = zlib.compress(raw)
+        with self._lock:
+            if key in self._entries:
+                return key
+            with open(self.pack_path, "ab") as pack:
+                offset = pack.tell()
+                pack.write(data)
+            entry = StoredEmail(key, offset, len(data), folder, str(uid))
+            with open(self.index_path, "a") as index:
+                index.write(json.dumps(asdict(entry)) + "\n")
+            self._entries[key] = entry
+        return key
+
+    def get(self, key: str) -> bytes:
+        """Return the raw bytes of a stored message.
+
+        Raises:
+            KeyError: If there is no message with that key
+        """
+        entry = self._entries[key]
+        end = entry.offset + entry.length
+        with self._lock:
+            if self._map is None or len(self._map) < end:
+                self._remap()
+            assert self._map is not None
+            data = self._map[entry.offset : end]
+        return zlib.decompress(data)
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        with open(self.pack_path, "rb") as pack:
+            self._map = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entries(self, folder: Optional[str] = None) -> List[StoredEmail]:
+        """List the stored messages in the order they were added.
+
+        Args:
+            folder: Only list messages fetched from this folder
+        """
+        return [
+            entry
+            for entry in self._entries.values()
+            if folder is None or entry.folder == folder
+        ]
+
+    def iter_emails(
+        self, folder: Optional[str] = None
+    ) -> Iterator[Tuple[StoredEmail, EmailMessage]]:
+        """Lazily parse the stored messages, in the order they were added.
+
+        Args:
+            folder: Only yield messages fetched from this folder
+
+        Yields:
+            Tuples of the index entry and the parsed email message
+        """
+        for entry in self.entries(folder):
+            msg = MailMessage.from_bytes(self.get(entry.key))
+            yield entry, EmailMessage(
+                uid=entry.uid,
+                subject=msg.subject,
+                sender=msg.from_,
+                to=msg.to,
+                date=msg.date,
+                body=msg.text or msg.html,
+            )
+
+    def close(self) -> None:
+        """Release the memory map of the pack file."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
@@ -0,0 +1,94 @@
+"""Extraction of the visible text of HTML email bodies."""
+
+from html.parser import HTMLParser
+from typing import Callable, Dict, List
+
+# Elements whose content is not text (BeautifulSoup's get_text skips them too)
+SKIPPED_TAGS = frozenset({"script", "style", "template"})
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the stripped text nodes of a document, without building a tree."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.strings: List[str] = []
+        self._pending: List[str] = []
+        self._skip_depth = 0
+
+    def _flush(self) -> None:
+        # a text node ends at the next tag, comment or declaration
+        if self._pending:
+            text = "".join(self._pending).strip()
+            self._pending.clear()
+            if text and not self._skip_depth:
+                self.strings.append(text)
+
+    def handle_starttag(self, tag: str, attrs: object) -> None:
+        self._flush()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_startendtag(self, tag: str, attrs: object) -> None:
+        self._flush()
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush()
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        self._pending.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush()
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush()
+
+    def handle_pi(self, data: str) -> None:
+        self._flush()
+
+    def unknown_decl(self, data: str) -> None:
+        self._flush()
+        if data.startswith("CDATA["):
+            self._pending.append(data[len("CDATA[") :])
+            self._flush()
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def html_to_text(html: str) -> str:
+    """Extract the text of an HTML document with the stdlib streaming parser.
+
+    Produces the same output as BeautifulSoup's
+    ``get_text(separator=" ", strip=True)``: every text node is stripped,
+    empty ones are dropped and the rest joined by a single space.
+
+    Args:
+        html: The HTML document
+
+    Returns:
+        The whitespace-normalised text
+    """
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return " ".join(extractor.strings)
+
+
+def soup_to_text(html: str) -> str:
+    """Extract the text of an HTML document with BeautifulSoup."""
+    from bs4 import BeautifulSoup  # only imported when this extractor is used
+
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text(separator=" ", strip=True)
+
+
+# HTML text extractors by name, selectable per receipt parser
+HTML_EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    "stream": html_to_text,
+    "bs4": soup_to_text,
+}
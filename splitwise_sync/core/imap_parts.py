@@ -0,0 +1,197 @@
+"""Helpers to fetch single MIME parts of a message over IMAP.
+
+``imap_tools`` always downloads whole messages (``BODY[]``). Bank receipts only
+need their text, so these helpers parse the raw ``FETCH`` responses returned by
+``imaplib`` and the message ``BODYSTRUCTURE`` to locate and decode just the
+text section.
+"""
+
+import base64
+import quopri
+import re
+from dataclasses import dataclass
+from email.parser import BytesParser
+from typing import Any, Iterator, Optional, Union
+
+# Tokens of an IMAP response: parentheses, quoted strings and atoms
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+
+_OPEN = object()
+_CLOSE = object()
+
+Value = Union[None, str, bytes, list[Any]]
+
+
+@dataclass(frozen=True)
+class TextPart:
+    """Location and encoding of a text part inside a message."""
+
+    section: str  # IMAP section specifier, e.g. "1" or "1.2"
+    subtype: str  # "plain" or "html"
+    charset: str
+    encoding: str  # Content-Transfer-Encoding, upper case
+
+
+def _tokenize(data: list[Any]) -> Iterator[Any]:
+    """Split raw ``imaplib`` FETCH data into tokens.
+
+    Literals (``{n}`` followed by n bytes) are yielded as ``bytes``, atoms and
+    quoted strings as ``str`` and ``NIL`` as ``None``.
+    """
+    for item in data:
+        if item is None:
+            continue
+        literal = None
+        if isinstance(item, tuple):
+            item, literal = item
+            item = _LITERAL_RE.sub(b"", item)
+
+        text = item.decode("latin-1")
+        pos = 0
+        while True:
+            match = _TOKEN_RE.match(text, pos)
+            if not match:
+                break
+            pos = match.end()
+            opening, closing, quoted, atom = match.groups()
+            if opening:
+                yield _OPEN
+            elif closing:
+                yield _CLOSE
+            elif quoted is not None:
+                unescaped = re.sub(r"\\(.)", r"\1", quoted)
+                yield unescaped.encode("latin-1").decode("utf-8", "replace")
+            else:
+                yield None if atom.upper() == "NIL" else atom
+
+        if literal is not None:
+            yield literal
+
+
+def _parse_list(tokens: Iterator[Any]) -> list[Value]:
+    """Build a nested list from tokens, up to the matching close paren."""
+    items: list[Value] = []
+    for token in tokens:
+        if token is _CLOSE:
+            return items
+        items.append(_parse_list(tokens) if token is _OPEN else token)
+    return items
+
+
+def parse_fetch_response(data: list[Any]) -> list[dict[str, Value]]:
+    """Parse the data of a ``UID FETCH`` command into one dict per message.
+
+    Args:
+        data: The data list returned by ``imaplib.IMAP4.uid("FETCH", ...)``
+
+    Returns:
+        A list of dicts mapping upper-cased item names (``UID``,
+        ``BODYSTRUCTURE``, ``BODY[HEADER]``, ``BODY[1]``...) to their values
+    """
+    messages: list[dict[str, Value]] = []
+    tokens = _tokenize(data)
+    for token in tokens:
+        if token is not _OPEN:
+            continue  # message sequence number
+        items = _parse_list(tokens)
+        messages.append(
+            {str(key).upper(): value for key, value in zip(items[::2], items[1::2])}
+        )
+    return messages
+
+
+def _as_str(value: Value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value if isinstance(value, str) else ""
+
+
+def _params(value: Value) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {
+        _as_str(key).lower(): _as_str(val) for key, val in zip(value[::2], value[1::2])
+    }
+
+
+def _is_attachment(part: list[Value]) -> bool:
+    # body-ext-1part for text: md5, disposition, ...; disposition is index 9
+    disposition = part[9] if len(part) > 9 else None
+    return isinstance(disposition, list) and (
+        _as_str(disposition[0]).lower() == "attachment"
+    )
+
+
+def _text_parts(structure: list[Value], prefix: str = "") -> Iterator[TextPart]:
+    """Walk a BODYSTRUCTURE yielding its inline text parts in order."""
+    if structure and isinstance(structure[0], list):
+        # multipart: child bodies followed by the subtype and extension data
+        for index, child in enumerate(structure, start=1):
+            if not isinstance(child, list):
+                break
+            yield from _text_parts(child, f"{prefix}{index}.")
+        return
+
+    if len(structure) < 7 or _as_str(structure[0]).lower() != "text":
+        return
+    if _is_attachment(structure):
+        return
+
+    yield TextPart(
+        section=prefix.rstrip(".") or "1",
+        subtype=_as_str(structure[1]).lower(),
+        charset=_params(structure[2]).get("charset", "us-ascii"),
+        encoding=_as_str(structure[5]).upper(),
+    )
+
+
+def find_text_part(
+    structure: Value, preferred: tuple[str, ...] = ("plain", "html")
+) -> Optional[TextPart]:
+    """Pick the text part to download from a message BODYSTRUCTURE.
+
+    Args:
+        structure: The parsed BODYSTRUCTURE of the message
+        preferred: Text subtypes in order of preference
+
+    Returns:
+        The first part matching the most preferred subtype, or None when the
+        message has no inline text part
+    """
+    if not isinstance(structure, list):
+        return None
+    parts = list(_text_parts(structure))
+    for subtype in preferred:
+        for part in parts:
+            if part.subtype == subtype:
+                return part
+    return None
+
+
+def decode_part(payload: bytes, part: TextPart) -> str:
+    """Decode the raw bytes of a text part into a string."""
+    if part.encoding == "BASE64":
+        payload = base64.b64decode(payload)
+    elif part.encoding == "QUOTED-PRINTABLE":
+        payload = quopri.decodestring(payload)
+
+    try:
+        return payload.decode(part.charset, "replace")
+    except LookupError:
+        return payload.decode("utf-8", "replace")
+
+
+def build_text_message(header: bytes, payload: bytes, part: TextPart) -> bytes:
+    """Rebuild a single-part RFC 822 message from its header and text part.
+
+    Used to keep a raw copy of messages fetched in text-only mode: the
+    original headers are kept, except the content headers which are replaced
+    by those of the downloaded part, so the result parses to the same text.
+    """
+    msg = BytesParser().parsebytes(header, headersonly=True)
+    del msg["Content-Type"]
+    del msg["Content-Transfer-Encoding"]
+    msg["Content-Type"] = f'text/{part.subtype}; charset="{part.charset}"'
+    msg["Content-Transfer-Encoding"] = part.encoding or "7BIT"
+    return msg.as_bytes() + payload
@@ -1,15 +1,21 @@
 import json
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, fields
 from datetime import datetime
 from hashlib import sha256
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
 
-import pandas as pd
+import numpy as np
 
 from splitwise_sync.config import DEFAULT_TIMEZONE
 
+if TYPE_CHECKING:
+    # pandas takes a third of the startup time of a run, it is imported by the
+    # DataFrame paths only
+    import pandas as pd
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Transaction:
     """Model representing a bank transaction extracted from an email."""
 
@@ -20,7 +26,6 @@ class Transaction:
     card_number: str
     details: str  # the note in the app
     category_id: Optional[str] = None
-    hash: str = ""  # populated in __post_init__
 
     __HASH_FIELDS = [
         "cost",
@@ -29,10 +34,6 @@ class Transaction:
         "card_number",
     ]
 
-    def __post_init__(self):
-        """Post-initialization to set the hash and date."""
-        object.__setattr__(self, "hash", self._hash)
-
     @property
     def date_str(self) -> str:
         """Return the date as a string in YYYY-MM-DD format."""
@@ -45,14 +46,39 @@ class Transaction:
         ans["hash"] = self.hash
         return ans
 
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, Any], timezone: str = DEFAULT_TIMEZONE
+    ) -> "Transaction":
+        """Rebuild a transaction from the output of ``to_dict``."""
+        date = datetime.fromisoformat(data["date"])
+        if timezone and date.tzinfo is not None:
+            date = date.astimezone(ZoneInfo(timezone))
+        return cls(
+            cost=data["cost"],
+            currency_code=data["currency_code"],
+            date=date,
+            description=data["description"],
+            card_number=data["card_number"],
+            details=data["details"],
+            category_id=data.get("category_id"),
+        )
+
     @property
     def _hash_str(self) -> str:
-        """Return a hash of the transaction for uniqueness."""
-        return "_".join(str(getattr(self, field)) for field in self.__HASH_FIELDS)
+        """Return the fields identifying the transaction, joined.
+
+        Aware dates are written in ``DEFAULT_TIMEZONE``, so converting the
+        date to another zone (as ``TransactionBatch`` does) keeps the hash.
+        """
+        values = {field: getattr(self, field) for field in self.__HASH_FIELDS}
+        if DEFAULT_TIMEZONE and self.date.tzinfo is not None:
+            values["date"] = self.date.astimezone(ZoneInfo(DEFAULT_TIMEZONE))
+        return "_".join(str(value) for value in values.values())
 
     @property
-    def _hash(self) -> str:
-        """Return a hash of the transaction for uniqueness."""
+    def hash(self) -> str:
+        """Return a hash of the transaction for uniqueness, computed on access."""
         return sha256(self._hash_str.encode()).hexdigest()
 
     @property
@@ -63,10 +89,11 @@ class Transaction:
 
     def to_dataframe(
         self, timezone: str = DEFAULT_TIMEZONE, prefix: str = "transaction_"
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         """Convert a list of transactions to a dictionary for DataFrame."""
+        import pandas as pd
 
-        df = pd.DataFrame([asdict(self)])
+        df = pd.DataFrame([{**asdict(self), "hash": self.hash}])
         df["date"] = pd.to_datetime(df["date"])
         if timezone:
             df["date"] = df["date"].dt.tz_convert(timezone)
@@ -77,11 +104,200 @@ class Transaction:
 
     def to_series(
         self, timezone: str = DEFAULT_TIMEZONE, prefix: str = "transaction_"
-    ) -> pd.Series:
+    ) -> "pd.Series":
         """Convert a transaction to a Series for DataFrame."""
         return self.to_dataframe(timezone=timezone, prefix=prefix).iloc[0]
 
 
+# keys of Transaction.to_dict, in order
+_DICT_KEYS = [field.name for field in fields(Transaction)] + ["hash"]
+
+
+class TransactionBatch:
+    """Column-wise container of many transactions.
+
+    Costs are a float array, currencies and cards are categorical and dates
+    a tz-aware ``DatetimeIndex``, so building a DataFrame of N transactions
+    is one allocation instead of N one-row frames. Hashes are computed on
+    first use, all at once, unless they come with the transactions.
+    """
+
+    def __init__(
+        self,
+        cost: Iterable[float],
+        currency_code: Iterable[str],
+        date: Iterable[Any],
+        description: Iterable[str],
+        card_number: Iterable[str],
+        details: Iterable[str],
+        category_id: Optional[Iterable[Optional[str]]] = None,
+        hashes: Optional[Iterable[str]] = None,
+        timezone: str = DEFAULT_TIMEZONE,
+    ):
+        """Build a batch from its columns.
+
+        Args:
+            cost: Amount of each transaction
+            currency_code: Currency of each transaction
+            date: Tz-aware date of each transaction
+            description: Merchant of each transaction
+            card_number: Card of each transaction
+            details: Note of each transaction
+            category_id: Optional category of each transaction
+            hashes: Precomputed hashes, computed on demand when missing
+            timezone: Time zone the dates are converted to
+        """
+        import pandas as pd
+
+        self.cost = np.asarray(cost, dtype="float64")
+        self.currency_code = pd.Categorical(currency_code)
+        self.date = pd.DatetimeIndex(pd.to_datetime(date, utc=True))
+        if timezone:
+            self.date = self.date.tz_convert(timezone)
+        self.description = np.asarray(description, dtype=object)
+        self.card_number = pd.Categorical(card_number)
+        self.details = np.asarray(details, dtype=object)
+        self.category_id = (
+            np.full(len(self.cost), None, dtype=object)
+            if category_id is None
+            else np.asarray(category_id, dtype=object)
+        )
+        self._hashes = None if hashes is None else np.asarray(hashes, dtype=object)
+
+        columns = [self.currency_code, self.date, self.description]
+        columns += [self.card_number, self.details, self.category_id]
+        if any(len(column) != len(self.cost) for column in columns):
+            raise ValueError("All columns of a TransactionBatch must have one length")
+
+    @classmethod
+    def from_transactions(
+        cls, transactions: Iterable[Transaction], timezone: str = DEFAULT_TIMEZONE
+    ) -> "TransactionBatch":
+        """Build a batch from transactions, hashing them on first use."""
+        transactions = list(transactions)
+        return cls(
+            cost=[t.cost for t in transactions],
+            currency_code=[t.currency_code for t in transactions],
+            date=[t.date for t in transactions],
+            description=[t.description for t in transactions],
+            card_number=[t.card_number for t in transactions],
+            details=[t.details for t in transactions],
+            category_id=[t.category_id for t in transactions],
+            timezone=timezone,
+        )
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        frame: "pd.DataFrame",
+        timezone: str = DEFAULT_TIMEZONE,
+        prefix: str = "transaction_",
+    ) -> "TransactionBatch":
+        """Build a batch from prefixed columns, as made by ``to_dataframe``.
+
+        Also accepts the successful rows of ``extract_transactions``.
+        """
+        hashes = frame.get(f"{prefix}hash")
+        category_id = frame.get(f"{prefix}category_id")
+        return cls(
+            cost=frame[f"{prefix}cost"],
+            currency_code=frame[f"{prefix}currency_code"],
+            date=frame[f"{prefix}date"],
+            description=frame[f"{prefix}description"],
+            card_number=frame[f"{prefix}card_number"],
+            details=frame[f"{prefix}details"],
+            category_id=None if category_id is None else category_id.to_numpy(object),
+            hashes=None if hashes is None else hashes.to_numpy(object),
+            timezone=timezone,
+        )
+
+    def __len__(self) -> int:
+        return len(self.cost)
+
+    def __getitem__(self, index: int) -> Transaction:
+        return Transaction(
+            cost=float(self.cost[index]),
+            currency_code=self.currency_code[index],
+            date=self.date[index].to_pydatetime(),
+            description=self.description[index],
+            card_number=self.card_number[index],
+            details=self.details[index],
+            category_id=self.category_id[index],
+        )
+
+    def __iter__(self) -> Iterator[Transaction]:
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def hashes(self) -> np.ndarray:
+        """Hash of each transaction, as ``Transaction.hash`` computes it."""
+        if self._hashes is None:
+            # same string as Transaction._hash_str: cost, description, date, card
+            dates = (
+                self.date.tz_convert(DEFAULT_TIMEZONE)
+                if DEFAULT_TIMEZONE
+                else self.date
+            )
+            self._hashes = np.array(
+                [
+                    sha256(f"{cost}_{description}_{date}_{card}".encode()).hexdigest()
+                    for cost, description, date, card in zip(
+                        self.cost.tolist(),
+                        self.description,
+                        dates.to_pydatetime(),
+                        np.asarray(self.card_number),
+                    )
+                ],
+                dtype=object,
+            )
+        return self._hashes
+
+    def to_dataframe(
+        self,
+        timezone: str = DEFAULT_TIMEZONE,
+        prefix: str = "transaction_",
+        with_hash: bool = True,
+    ) -> "pd.DataFrame":
+        """Convert the batch to a DataFrame with the columns of ``to_dataframe``.
+
+        Args:
+            timezone: Time zone of the date column
+            prefix: Prefix of the column names
+            with_hash: Include the hash column, computing the hashes if needed
+        """
+        import pandas as pd
+
+        columns = {
+            "cost": self.cost,
+            "currency_code": self.currency_code,
+            "date": self.date.tz_convert(timezone) if timezone else self.date,
+            "description": self.description,
+            "card_number": self.card_number,
+            "details": self.details,
+            "category_id": self.category_id,
+        }
+        if with_hash:
+            columns["hash"] = self.hashes
+        return pd.DataFrame(
+            {f"{prefix}{name}": column for name, column in columns.items()},
+            copy=False,
+        )
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        """Convert every transaction to the format of ``Transaction.to_dict``."""
+        columns = [
+            self.cost.tolist(),
+            np.asarray(self.currency_code).tolist(),
+            [date.isoformat() for date in self.date.to_pydatetime()],
+            self.description.tolist(),
+            np.asarray(self.card_number).tolist(),
+            self.details.tolist(),
+            self.category_id.tolist(),
+            self.hashes.tolist(),
+        ]
+        return [dict(zip(_DICT_KEYS, row)) for row in zip(*columns)]
+
+
 @dataclass(frozen=True)
 class EmailMessage:
     """Model for an email message."""
@@ -0,0 +1,142 @@
+"""Persistent cache of receipt parsing results.
+
+The same receipt is often parsed many times (dry runs, retries of failed
+emails, dumps and notebook reruns). Results are stored in a SQLite database
+keyed by a hash of the parser name and version and the email body, as
+``Transaction.to_dict()`` or the parsing error. The least recently used
+entries are evicted beyond ``max_entries``. Since the parser version changes
+with its code, results of an older parser are never returned.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..config import PARSE_CACHE_SIZE
+from .models import EmailMessage, Transaction
+from .receipt_parser import ReceiptParser
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """Size-bounded LRU cache in front of ``ReceiptParser.parse_email``."""
+
+    def __init__(self, path: Path, max_entries: int = PARSE_CACHE_SIZE) -> None:
+        """Open the cache database, creating it if needed.
+
+        Args:
+            path: Path of the SQLite database file
+            max_entries: Number of results kept before evicting the least
+                         recently used ones
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)"
+        )
+        self._conn.commit()
+        self._size = len(self)
+
+    def __enter__(self) -> "ParseCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        count: int = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return count
+
+    @staticmethod
+    def make_key(parser: ReceiptParser, body: str) -> str:
+        """Cache key of a body parsed by a given parser name and version."""
+        digest = hashlib.sha256(f"{parser.name}:{parser.version}:".encode())
+        digest.update(body.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def parse_email(self, parser: ReceiptParser, message: EmailMessage) -> Transaction:
+        """Parse an email, reusing the stored result of the same body.
+
+        Raises:
+            ValueError: If the email (now or when cached) could not be parsed
+        """
+        key = self.make_key(parser, message.body)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            if "error" in cached:
+                raise ValueError(cached["error"])
+            return Transaction.from_dict(cached["transaction"])
+
+        self.misses += 1
+        try:
+            transaction = parser.parse_email(message)
+        except ValueError as exc:  # parsing errors are deterministic too
+            self.put(key, {"error": str(exc)})
+            raise
+        self.put(key, {"transaction": transaction.to_dict()})
+        return transaction
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a stored result, marking it as recently used."""
+        row = self._conn.execute(
+            "SELECT value FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute(
+                "UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+        value: dict = json.loads(row[0])
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        """Store a result, evicting the least recently used beyond the limit."""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, used_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+        self._size += 1
+        if self._size > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        # other processes may share the file, so count again before deleting;
+        # evict down to 90% of the limit so this does not run on every put
+        excess = len(self) - int(self.max_entries * 0.9)
+        if excess > 0:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+            logger.debug(f"Evicted {excess} parse results from {self.path}")
+        self._size = len(self)
+
+    def close(self) -> None:
+        """Log the hit rate and close the database."""
+        total = self.hits + self.misses
+        if total:
+            logger.info(
+                f"Parse cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hits / total:.0%} hit rate)"
+            )
+        self._conn.close()
@@ -0,0 +1,124 @@
+"""Dispatch of receipt emails to the parser of the bank that sent them."""
+
+import logging
+from email.utils import parseaddr
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .bank_parsers import BancoEstadoParser, BciParser, SantanderParser
+from .models import EmailMessage, Transaction
+from .parse_cache import ParseCache
+from .receipt_parser import ReceiptParser
+
+logger = logging.getLogger(__name__)
+
+# Parser name of sources whose parser is picked from each email's sender
+AUTO = "auto"
+
+# Receipt parsers by name, as referenced by the configured email sources
+PARSERS: Dict[str, type[ReceiptParser]] = {
+    parser.name: parser
+    for parser in (ReceiptParser, BciParser, SantanderParser, BancoEstadoParser)
+}
+
+
+class ParserRegistry:
+    """Registry of receipt parsers keyed by sender address and domain."""
+
+    def __init__(
+        self,
+        parsers: Iterable[type[ReceiptParser]] = PARSERS.values(),
+        cache: Optional[ParseCache] = None,
+    ):
+        """Instantiate and register the given parser classes.
+
+        Args:
+            parsers: The receipt parser classes to register
+            cache: Optional cache of parsing results, used by ``parse_email``
+        """
+        self.cache = cache
+        self._by_name: Dict[str, ReceiptParser] = {}
+        self._by_sender: Dict[str, List[ReceiptParser]] = {}
+        for parser_class in parsers:
+            self.register(parser_class())
+
+    def register(self, parser: ReceiptParser) -> None:
+        """Register a parser under its name and each of its senders."""
+        self._by_name[parser.name] = parser
+        for sender in parser.senders:
+            self._by_sender.setdefault(sender.lower(), []).append(parser)
+
+    def get(self, name: str) -> ReceiptParser:
+        """Return the parser registered under a name.
+
+        Raises:
+            ValueError: If there is no parser with that name
+        """
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"Unknown receipt parser: {name}") from None
+
+    def candidates(self, sender: str) -> List[ReceiptParser]:
+        """Return the parsers registered for a sender.
+
+        The full address is looked up first, then its domain and parent
+        domains, so each lookup is a few dict accesses.
+
+        Args:
+            sender: The sender, either a bare address or ``Name <address>``
+        """
+        address = parseaddr(sender)[1].lower() or sender.lower()
+        for key in _sender_keys(address):
+            parsers = self._by_sender.get(key)
+            if parsers:
+                return parsers
+        return []
+
+    def dispatch(self, message: EmailMessage) -> ReceiptParser:
+        """Pick the parser for an email from its sender and subject.
+
+        Raises:
+            ValueError: If no registered parser handles the email
+        """
+        subject = message.subject.lower()
+        for parser in self.candidates(message.sender):
+            if not parser.subjects or any(s in subject for s in parser.subjects):
+                return parser
+        raise ValueError(
+            f"No receipt parser for email from {message.sender}: {message.subject}"
+        )
+
+    def resolve(self, name: str, message: EmailMessage) -> ReceiptParser:
+        """Return the named parser, or dispatch the email when name is AUTO."""
+        return self.dispatch(message) if name == AUTO else self.get(name)
+
+    def parse_email(self, message: EmailMessage, name: str = AUTO) -> Transaction:
+        """Parse an email with the named parser, or the one for its sender."""
+        parser = self.resolve(name, message)
+        if self.cache is not None:
+            return self.cache.parse_email(parser, message)
+        return parser.parse_email(message)
+
+    def mime_parts(self, name: str, sender: str) -> Tuple[str, ...]:
+        """Text parts to download for a source, by preference.
+
+        Args:
+            name: The parser name of the source, or AUTO
+            sender: The sender address the source is filtered by
+
+        Returns:
+            The parts declared by the source's parser(s), or plain text
+            with an HTML fallback when no parser is known for the sender
+        """
+        parsers = self.candidates(sender) if name == AUTO else [self.get(name)]
+        parts = dict.fromkeys(part for parser in parsers for part in parser.mime_parts)
+        return tuple(parts) or ("plain", "html")
+
+
+def _sender_keys(address: str) -> Iterator[str]:
+    """Yield an address, its domain and the domain's parents."""
+    yield address
+    domain = address.rpartition("@")[2]
+    while "." in domain:
+        yield domain
+        domain = domain.partition(".")[2]
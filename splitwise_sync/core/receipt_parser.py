@@ -1,29 +1,102 @@
 """Receipt parser for extracting transaction data from bank emails."""
 
+import hashlib
+import inspect
 import logging
 import re
 from datetime import datetime
+from functools import lru_cache
+from typing import ClassVar, Optional
 from zoneinfo import ZoneInfo
 
-from bs4 import BeautifulSoup
-
+from .html_text import HTML_EXTRACTORS
 from .models import EmailMessage, Transaction
 
 logger = logging.getLogger(__name__)
 
+# Per-field patterns of Banco de Chile receipts, compiled once
+TEXT_RE = re.compile(r"(una compra por .+)\. Revisa")
+AMOUNT_RE = re.compile(
+    r"(?P<currency>[A-Z]{2,3})?\$\s*(?P<amount>[.\d]+)(?P<decimals>,\d{2})?"
+)
+CARD_RE = re.compile(r"\*{4}(\d{4})")
+MERCHANT_RE = re.compile(r"en ([^e]+?) el")
+MERCHANT_FALLBACK_RE = re.compile(r"en (.+?) el")
+DATE_RE = re.compile(
+    r"el (?P<day>\d{2})/(?P<month>\d{2})/(?P<year>\d{4}) "
+    r"(?P<hour>\d{2}):(?P<minute>\d{2})"
+)
+
+# The whole purchase sentence, matching all the fields in a single pass
+RECEIPT_RE = re.compile(
+    r"(?P<text>una compra por "
+    r"(?P<currency>[A-Z]{2,3})?\$\s*(?P<amount>[.\d]+)(?P<decimals>,\d{2})?"
+    r".*?\*{4}(?P<card>\d{4})"
+    r".*?en (?P<merchant>[^e]+?) el "
+    r"(?P<day>\d{2})/(?P<month>\d{2})/(?P<year>\d{4}) (?P<hour>\d{2}):(?P<minute>\d{2})"
+    r")\. Revisa"
+)
 
-class ReceiptParser:
-    """Parser for extracting transaction data from Banco de Chile emails."""
 
-    def __init__(self):
+class ReceiptParser:
+    """Parser for extracting transaction data from Banco de Chile emails.
+
+    Parsers for other banks subclass it, declaring the senders and subjects
+    they handle and overriding the patterns. Every pattern uses the group
+    names of ``RECEIPT_RE``, ``AMOUNT_RE`` and ``DATE_RE``; the text, card
+    and merchant patterns capture their value in the first group.
+    """
+
+    name: ClassVar[str] = "bancochile"
+    # Sender addresses or domains whose emails this parser handles
+    senders: ClassVar[tuple[str, ...]] = ("bancochile.cl", "bancoedwards.cl")
+    # Lower-case subject fragments, one of which must appear (empty: any)
+    subjects: ClassVar[tuple[str, ...]] = ()
+    # Text parts the parser can read, by preference (see ImapEmailClient)
+    mime_parts: ClassVar[tuple[str, ...]] = ("plain", "html")
+
+    receipt_re: ClassVar[Optional[re.Pattern[str]]] = RECEIPT_RE
+    text_re: ClassVar[re.Pattern[str]] = TEXT_RE
+    amount_re: ClassVar[re.Pattern[str]] = AMOUNT_RE
+    card_re: ClassVar[re.Pattern[str]] = CARD_RE
+    merchant_res: ClassVar[tuple[re.Pattern[str], ...]] = (
+        MERCHANT_RE,
+        MERCHANT_FALLBACK_RE,
+    )
+    date_re: ClassVar[re.Pattern[str]] = DATE_RE
+
+    def __init__(self, html_extractor: str = "stream"):
+        """Initialize the parser.
+
+        Args:
+            html_extractor: Name of the HTML text extractor used on HTML
+                            bodies, "stream" (stdlib parser) or "bs4"
+        """
         self.default_timezone = ZoneInfo("America/Santiago")
+        self.html_to_text = HTML_EXTRACTORS[html_extractor]
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the code that determines this parser's output.
+
+        Computed from the source files of the parser class, its base classes
+        and the HTML extractor, so any code change yields a new version
+        (used to invalidate cached results, see ``ParseCache``).
+        """
+        classes = [cls for cls in type(self).__mro__ if issubclass(cls, ReceiptParser)]
+        files = [inspect.getfile(cls) for cls in classes]
+        return _source_fingerprint(tuple([*files, inspect.getfile(self.html_to_text)]))
 
     def parse_email(self, message: EmailMessage) -> Transaction:
-        """Parse a Banco de Chile email to extract transaction data."""
+        """Parse a receipt email to extract transaction data."""
         # Clean and prepare the email body
         body = self._clean_body(message.body)
 
-        # Extract all required transaction components
+        transaction = self._extract_fast(body)
+        if transaction is not None:
+            return transaction
+
+        # Extract all required transaction components one by one
         text = self._extract_transaction_text(body)
         amount, currency = self._extract_amount_and_currency(body)
         card_number = self._extract_card_number(body)
@@ -40,32 +113,53 @@ class ReceiptParser:
             details=text,
         )
 
+    def _extract_fast(self, body: str) -> Optional[Transaction]:
+        """Extract all fields with a single search for the purchase sentence.
+
+        Returns:
+            The transaction, or None when the body does not follow the usual
+            layout and the per-field extraction must be used instead
+        """
+        match = self.receipt_re.search(body) if self.receipt_re else None
+        if match is None:
+            return None
+
+        amount, decimals = match.group("amount", "decimals")
+        amount = amount.replace(".", "") + (decimals or "").replace(",", ".")
+        return Transaction(
+            cost=float(amount),
+            currency_code=match.group("currency") or "CLP",
+            date=self._build_date(match),
+            description=match.group("merchant").strip(),
+            card_number=match.group("card"),
+            details=match.group("text").strip(),
+        )
+
     def _clean_body(self, body: str) -> str:
         """Clean HTML content if present."""
         if "<html" in body:
-            soup = BeautifulSoup(body, "html.parser")
-            return soup.get_text(separator=" ", strip=True)
+            return self.html_to_text(body)
         return body
 
     def _extract_transaction_text(self, body: str) -> str:
         """Extract transaction description text."""
-        text_match = re.search(r"(una compra por .+)\. Revisa", body)
+        text_match = self.text_re.search(body)
         return text_match.group(1).strip() if text_match else ""
 
     def _extract_amount_and_currency(self, body: str) -> tuple[float, str]:
         """Extract amount and currency from the email body."""
-        amount_match = re.search(r"([A-Z]{2,3})?\$\s*([.\d]+)(,\d{2})?", body)
+        amount_match = self.amount_re.search(body)
         currency = "CLP"  # Default currency
 
         if not amount_match:
             logger.error("No amount found in the email")
             raise ValueError("No amount found in the email")
 
-        amount = amount_match.group(2)
-        if amount_match.group(3):  # If decimal part exists
-            amount += amount_match.group(3)  # Append the decimal part
-        if amount_match.group(1):
-            currency = amount_match.group(1)
+        amount = amount_match.group("amount")
+        if amount_match.group("decimals"):  # If decimal part exists
+            amount += amount_match.group("decimals")  # Append the decimal part
+        if amount_match.group("currency"):
+            currency = amount_match.group("currency")
 
         # Process amount to standard format
         amount = amount.replace(".", "")  # Remove thousands separators
@@ -77,7 +171,7 @@ class ReceiptParser:
 
     def _extract_card_number(self, body: str) -> str:
         """Extract card number to use as bank reference."""
-        card_number_match = re.search(r"\*{4}(\d{4})", body)
+        card_number_match = self.card_re.search(body)
         if not card_number_match:
             logger.error("No card number found in the email")
             raise ValueError("No card number found in the email")
@@ -86,9 +180,11 @@ class ReceiptParser:
 
     def _extract_merchant(self, body: str) -> str:
         """Extract merchant name from the email body."""
-        merchant_match = re.search(r"en ([^e]+?) el", body)
-        if not merchant_match:
-            merchant_match = re.search(r"en (.+?) el", body)
+        merchant_match = None
+        for pattern in self.merchant_res:
+            merchant_match = pattern.search(body)
+            if merchant_match:
+                break
 
         if not merchant_match:
             logger.error("No merchant found in the email")
@@ -98,13 +194,36 @@ class ReceiptParser:
 
     def _extract_transaction_date(self, body: str) -> datetime:
         """Extract transaction date from the email body."""
-        transaction_date_match = re.search(r"el (\d{2}/\d{2}/\d{4} \d{2}:\d{2})", body)
+        transaction_date_match = self.date_re.search(body)
 
         if not transaction_date_match:
             logger.error("No transaction date found in the email")
             raise ValueError("No transaction date found in the email")
 
-        transaction_date_str = transaction_date_match.group(1)
-        return datetime.strptime(transaction_date_str, "%d/%m/%Y %H:%M").replace(
-            tzinfo=self.default_timezone
+        return self._build_date(transaction_date_match)
+
+    def _build_date(self, match: re.Match[str]) -> datetime:
+        """Build the local date from the named groups of a match.
+
+        The date is built from the integer fields directly instead of using
+        strptime; a missing hour or minute group counts as zero.
+        """
+        groups = match.groupdict()
+        return datetime(
+            int(groups["year"]),
+            int(groups["month"]),
+            int(groups["day"]),
+            int(groups.get("hour") or 0),
+            int(groups.get("minute") or 0),
+            tzinfo=self.default_timezone,
         )
+
+
+@lru_cache(maxsize=None)
+def _source_fingerprint(paths: tuple[str, ...]) -> str:
+    """Short SHA-256 of the contents of some source files."""
+    digest = hashlib.sha256()
+    for path in sorted(set(paths)):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,381 @@
+"""User rules deciding expenses ahead of the model.
+
+Some merchants are always shared (the supermarket) and some never are (the
+gym). Instead of retraining the model, these are written as rules in a JSON
+file (``RULES_PATH``) holding a list of objects such as::
+
+    [
+        {"name": "supermarket", "merchant_prefix": "LIDER", "shared": true},
+        {"name": "gym", "merchant": "SMARTFIT", "shared": false},
+        {"name": "rent", "card_number": "7766", "min_cost": 500000,
+         "weekdays": ["monday"], "split": 0.3, "category_id": "3"}
+    ]
+
+The conditions of a rule are all optional and must all hold:
+
+- ``merchant``: text found anywhere in the description (case-insensitive)
+- ``merchant_prefix``: text the description starts with (case-insensitive)
+- ``card_number``: card of the transaction, as parsed from the receipt
+- ``min_cost`` / ``max_cost``: costs from ``min_cost`` up to, but not
+  including, ``max_cost``
+- ``weekdays``: local days of the transaction, e.g. ``["saturday", "sunday"]``
+
+Its actions are ``shared`` (keep or delete the expense), ``split`` (the
+user's share of a shared expense, instead of ``DEFAULT_SPLIT``) and
+``category_id``. A rule with a split is shared unless it says otherwise, and
+a rule that only sets a category leaves the sharing decision to the model.
+The first matching rule of the file applies.
+
+Each rule is a bit of a Python integer. The merchant patterns are compiled
+into an Aho-Corasick automaton, the cost ranges into an interval index and
+the card numbers and weekdays into tables, each giving the mask of the rules
+a transaction satisfies. Matching a receipt is one pass over its description
+and a few integer ANDs, however many rules there are.
+"""
+
+import json
+import logging
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from splitwise_sync.config import DEFAULT_TIMEZONE
+
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Conditions on a transaction and the decision they lead to."""
+
+    name: str
+    merchant: Optional[str] = None
+    merchant_prefix: Optional[str] = None
+    card_number: Optional[str] = None
+    min_cost: Optional[float] = None
+    max_cost: Optional[float] = None
+    weekdays: Optional[frozenset[int]] = None
+    shared: Optional[bool] = None
+    split: Optional[float] = None
+    category_id: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.merchant is not None and self.merchant_prefix is not None:
+            raise ValueError("set either merchant or merchant_prefix, not both")
+        if self.merchant == "" or self.merchant_prefix == "":
+            raise ValueError("empty merchant pattern")
+        if (
+            self.min_cost is not None
+            and self.max_cost is not None
+            and self.min_cost >= self.max_cost
+        ):
+            raise ValueError("min_cost must be lower than max_cost")
+        if self.weekdays is not None and not self.weekdays <= set(range(7)):
+            raise ValueError(f"invalid weekdays {sorted(self.weekdays)}")
+        if self.split is not None and not 0 <= self.split <= 1:
+            raise ValueError("split must be between 0 and 1")
+        if self.shared is None and self.split is None and self.category_id is None:
+            raise ValueError("the rule sets none of shared, split or category_id")
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], default_name: str = "") -> "Rule":
+        """Build a rule from an entry of the rules file.
+
+        Raises:
+            ValueError: If the entry has unknown keys or invalid values
+        """
+        unknown = set(data) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"unknown keys {sorted(unknown)}")
+        weekdays = data.get("weekdays")
+        if weekdays is not None:
+            if isinstance(weekdays, str):
+                weekdays = [weekdays]
+            try:
+                weekdays = frozenset(WEEKDAYS.index(day.lower()) for day in weekdays)
+            except (ValueError, AttributeError):
+                raise ValueError(
+                    f"invalid weekdays {data['weekdays']!r}, expected names "
+                    f"among {', '.join(WEEKDAYS)}"
+                ) from None
+
+        def optional(name: str, kind: type) -> Any:
+            value = data.get(name)
+            return None if value is None else kind(value)
+
+        return cls(
+            name=str(data.get("name") or default_name),
+            merchant=optional("merchant", str),
+            merchant_prefix=optional("merchant_prefix", str),
+            card_number=optional("card_number", str),
+            min_cost=optional("min_cost", float),
+            max_cost=optional("max_cost", float),
+            weekdays=weekdays,
+            shared=optional("shared", bool),
+            split=optional("split", float),
+            category_id=optional("category_id", str),
+        )
+
+    @property
+    def is_shared(self) -> Optional[bool]:
+        """Whether matching expenses are shared, None to ask the model."""
+        if self.shared is None and self.split is not None:
+            return True
+        return self.shared
+
+    def matches(self, transaction: Transaction, weekday: int) -> bool:
+        """Whether a transaction meets the conditions, checked one by one.
+
+        Args:
+            transaction: The transaction to check
+            weekday: Local weekday of the transaction, 0 being Monday
+        """
+        description = transaction.description.upper()
+        return (
+            (self.merchant is None or self.merchant.upper() in description)
+            and (
+                self.merchant_prefix is None
+                or description.startswith(self.merchant_prefix.upper())
+            )
+            and (
+                self.card_number is None or self.card_number == transaction.card_number
+            )
+            and (self.min_cost is None or transaction.cost >= self.min_cost)
+            and (self.max_cost is None or transaction.cost < self.max_cost)
+            and (self.weekdays is None or weekday in self.weekdays)
+        )
+
+    def apply(self, transaction: Transaction) -> Transaction:
+        """The transaction with the category of the rule, if it sets one."""
+        if self.category_id is None:
+            return transaction
+        return replace(transaction, category_id=self.category_id)
+
+
+class _Automaton:
+    """Aho-Corasick automaton giving the rules whose merchant is in a text."""
+
+    def __init__(self) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        # rules whose merchant ends at each state, through the failure links
+        self._found = [0]
+        # rules whose prefix is spelled by each state from the start
+        self._prefix = [0]
+
+    def add(self, pattern: str, bit: int, prefix: bool = False) -> None:
+        state = 0
+        for char in pattern.upper():
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._found.append(0)
+                self._prefix.append(0)
+            state = next_state
+        if prefix:
+            self._prefix[state] |= bit
+        else:
+            self._found[state] |= bit
+
+    def build(self) -> None:
+        """Compute the failure links, once all the patterns are added."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._found[child] |= self._found[self._fail[child]]
+                queue.append(child)
+
+    def search(self, text: str) -> int:
+        """Mask of the rules whose pattern matches the text."""
+        goto, fail, found, prefix = self._goto, self._fail, self._found, self._prefix
+        mask = 0
+        state = 0
+        at_start = True  # the state spells the text read so far
+        for char in text.upper():
+            while state and char not in goto[state]:
+                state = fail[state]
+                at_start = False
+            state = goto[state].get(char, 0)
+            if not state:
+                at_start = False
+            mask |= found[state]
+            if at_start:
+                mask |= prefix[state]
+        return mask
+
+
+class _IntervalIndex:
+    """Rules whose cost range holds a cost, precomputed between range bounds."""
+
+    def __init__(self, ranges: Sequence[tuple[Optional[float], Optional[float]]]):
+        self._edges = sorted({x for bounds in ranges for x in bounds if x is not None})
+        # interval k holds the costs from edges[k - 1] up to edges[k]
+        starts = [0] * (len(self._edges) + 1)
+        ends = [0] * (len(self._edges) + 1)
+        for i, (low, high) in enumerate(ranges):
+            starts[0 if low is None else bisect_right(self._edges, low)] |= 1 << i
+            if high is not None:
+                ends[bisect_right(self._edges, high)] |= 1 << i
+
+        self._masks = []
+        mask = 0
+        for start, end in zip(starts, ends):
+            mask = (mask | start) & ~end
+            self._masks.append(mask)
+
+    def search(self, cost: float) -> int:
+        return self._masks[bisect_right(self._edges, cost)]
+
+
+class RuleSet:
+    """Rules compiled for matching, with the number of times each one fired."""
+
+    def __init__(self, rules: Sequence[Rule], timezone: str = DEFAULT_TIMEZONE):
+        """Compile the rules.
+
+        Args:
+            rules: Rules in priority order, the first match applies
+            timezone: Time zone of the weekday of the transactions
+        """
+        self.rules = list(rules)
+        self.fired = [0] * len(self.rules)
+        self.evaluated = 0
+        self._saved = (0, [0] * len(self.rules))
+        self._tz = ZoneInfo(timezone)
+
+        self._automaton = _Automaton()
+        self._any_merchant = 0
+        self._cards: dict[str, int] = {}
+        self._any_card = 0
+        self._weekdays = [0] * 7
+        for i, rule in enumerate(self.rules):
+            bit = 1 << i
+            if rule.merchant is not None:
+                self._automaton.add(rule.merchant, bit)
+            elif rule.merchant_prefix is not None:
+                self._automaton.add(rule.merchant_prefix, bit, prefix=True)
+            else:
+                self._any_merchant |= bit
+            if rule.card_number is None:
+                self._any_card |= bit
+            else:
+                self._cards[rule.card_number] = (
+                    self._cards.get(rule.card_number, 0) | bit
+                )
+            for day in range(7):
+                if rule.weekdays is None or day in rule.weekdays:
+                    self._weekdays[day] |= bit
+        for card in self._cards:
+            self._cards[card] |= self._any_card
+        self._automaton.build()
+        self._costs = _IntervalIndex([(r.min_cost, r.max_cost) for r in self.rules])
+
+    @classmethod
+    def load(cls, path: Path, timezone: str = DEFAULT_TIMEZONE) -> "RuleSet":
+        """Load the rules of a JSON file.
+
+        Raises:
+            ValueError: If the file is not a list of valid rules
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"{path} must hold a list of rules")
+        rules = []
+        for i, entry in enumerate(data, start=1):
+            try:
+                rules.append(Rule.from_dict(entry, default_name=f"rule {i}"))
+            except (ValueError, TypeError, AttributeError) as exc:
+                raise ValueError(f"Invalid rule {i} in {path}: {exc}") from exc
+        logger.debug(f"Loaded {len(rules)} rules from {path}")
+        return cls(rules, timezone)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, transaction: Transaction) -> Optional[Rule]:
+        """The first rule a transaction matches, if any."""
+        date = transaction.date
+        if date.tzinfo is not None:
+            date = date.astimezone(self._tz)
+        candidates = (
+            self._weekdays[date.weekday()]
+            & self._cards.get(transaction.card_number, self._any_card)
+            & self._costs.search(transaction.cost)
+        )
+        if candidates:
+            candidates &= self._any_merchant | self._automaton.search(
+                transaction.description
+            )
+        self.evaluated += 1
+        if not candidates:
+            return None
+        i = (candidates & -candidates).bit_length() - 1  # lowest bit set
+        self.fired[i] += 1
+        return self.rules[i]
+
+    def match_many(self, transactions: Iterable[Transaction]) -> list[Optional[Rule]]:
+        """The first rule each transaction matches, None for misses."""
+        return [self.match(t) for t in transactions]
+
+    def stats(self) -> dict[str, Any]:
+        """Transactions evaluated, rule hits and fires of each rule."""
+        hits = sum(self.fired)
+        return {
+            "evaluated": self.evaluated,
+            "hits": hits,
+            "misses": self.evaluated - hits,
+            "fired": {rule.name: n for rule, n in zip(self.rules, self.fired)},
+        }
+
+    def save_stats(self, path: Path) -> None:
+        """Add the fires since the last save to the totals kept in a JSON file.
+
+        The totals are keyed by rule name, so they survive editing the rules.
+        """
+        totals = load_stats(path)
+        evaluated, fired = self._saved
+        totals["evaluated"] = totals.get("evaluated", 0) + self.evaluated - evaluated
+        counts = totals.setdefault("fired", {})
+        for rule, n, saved in zip(self.rules, self.fired, fired):
+            if n > saved:
+                counts[rule.name] = counts.get(rule.name, 0) + n - saved
+        self._saved = (self.evaluated, list(self.fired))
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(totals, f, indent=4)
+        tmp_path.replace(path)
+
+
+def load_stats(path: Path) -> dict[str, Any]:
+    """Totals saved by ``RuleSet.save_stats``, empty if there are none."""
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        stats: dict[str, Any] = json.load(f)
+    return stats
@@ -1,7 +1,7 @@
 """Splitwise API client for managing expenses."""
 
 import logging
-from typing import Any
+from typing import Any, Optional
 
 from splitwise import Splitwise  # type: ignore
 from splitwise.expense import Expense  # type: ignore
@@ -39,8 +39,16 @@ class SplitwiseClient:
             api_key=SPLITWISE_API_KEY,
         )
 
-    def create_expense(self, transaction: Transaction) -> Expense:
-        """Create a new expense in Splitwise from a Transaction."""
+    def create_expense(
+        self, transaction: Transaction, split: Optional[float] = None
+    ) -> Expense:
+        """Create a new expense in Splitwise from a Transaction.
+
+        Args:
+            transaction: The transaction to create the expense from
+            split: Share of the cost owed by the current user, instead of the
+                   client's default split
+        """
         logger.debug(
             "Creating expense with cost=%s, description=%s",
             transaction.cost,
@@ -64,7 +72,8 @@ class SplitwiseClient:
 
         users = []
 
-        user1_split = round(transaction.cost * self.split, 2)
+        split = self.split if split is None else split
+        user1_split = round(transaction.cost * split, 2)
         user2_split = transaction.cost - user1_split
 
         user1 = ExpenseUser()
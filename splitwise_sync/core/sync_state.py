@@ -0,0 +1,103 @@
+"""Persistent UID checkpoints for incremental IMAP sync."""
+
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UidCheckpoint:
+    """Last processed UID of a folder/sender pair, valid for one UIDVALIDITY.
+
+    ``failed_uids`` are messages up to ``last_uid`` still to be processed:
+    those that failed, and those found unread when the checkpoint was
+    rebuilt. They are fetched again until they are processed.
+    """
+
+    uidvalidity: int
+    last_uid: int
+    failed_uids: tuple[int, ...] = ()
+
+
+class SyncState:
+    """JSON-backed store of UID checkpoints keyed by folder and sender."""
+
+    def __init__(self, path: Path) -> None:
+        """Load the sync state from disk.
+
+        Args:
+            path: JSON file holding the checkpoints. It is created on first save.
+        """
+        self.path = path
+        self._checkpoints: dict[str, UidCheckpoint] = {}
+        # checkpoints are set by the fetching threads and updated by the consumer
+        self._lock = threading.Lock()
+        if path.exists():
+            with open(path, "r") as f:
+                data = json.load(f)
+            self._checkpoints = {
+                key: UidCheckpoint(
+                    value["uidvalidity"],
+                    value["last_uid"],
+                    tuple(value.get("failed_uids", ())),
+                )
+                for key, value in data.items()
+            }
+
+    @staticmethod
+    def _key(folder: str, sender: str) -> str:
+        return f"{folder}|{sender}"
+
+    def get(self, folder: str, sender: str) -> Optional[UidCheckpoint]:
+        """Return the checkpoint for a folder/sender pair, if any."""
+        return self._checkpoints.get(self._key(folder, sender))
+
+    def set(self, folder: str, sender: str, checkpoint: UidCheckpoint) -> None:
+        """Replace the checkpoint for a folder/sender pair (in memory)."""
+        with self._lock:
+            self._checkpoints[self._key(folder, sender)] = checkpoint
+
+    def mark_processed(self, folder: str, sender: str, uid: int) -> None:
+        """Record a processed message, moving the checkpoint up to ``uid``.
+
+        Raises:
+            KeyError: If the pair has no checkpoint yet
+        """
+        self._update(folder, sender, uid, failed=False)
+
+    def add_failed(self, folder: str, sender: str, uid: int) -> None:
+        """Record a message that failed, to fetch it again on the next run.
+
+        Raises:
+            KeyError: If the pair has no checkpoint yet
+        """
+        self._update(folder, sender, uid, failed=True)
+
+    def _update(self, folder: str, sender: str, uid: int, failed: bool) -> None:
+        key = self._key(folder, sender)
+        with self._lock:
+            checkpoint = self._checkpoints[key]
+            failed_uids = set(checkpoint.failed_uids) - {uid}
+            if failed:
+                failed_uids.add(uid)
+            self._checkpoints[key] = UidCheckpoint(
+                checkpoint.uidvalidity,
+                max(checkpoint.last_uid, uid),
+                tuple(sorted(failed_uids)),
+            )
+
+    def save(self) -> None:
+        """Write all checkpoints to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with self._lock:
+            data = {key: asdict(value) for key, value in self._checkpoints.items()}
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        tmp_path.replace(self.path)
+        logger.debug(f"Saved sync state to {self.path}")
@@ -1,25 +1,158 @@
+import logging
 import os
 from pathlib import Path
+from typing import Any, Optional, Protocol
 
-import joblib
-import pandas as pd
+import numpy as np
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+
+from .fast_predictor import EXPORT_SUFFIX, FastPredictor, file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class Classifier(Protocol):
+    """What the sync scores transactions with.
+
+    ``ExpenseModel``, ``ModelClient``, ``CachedModel`` and
+    ``OnlineExpenseModel`` all provide it.
+    """
+
+    def predict(self, X: TransactionBatch) -> np.ndarray: ...
+
+    def predict_proba(self, X: TransactionBatch) -> np.ndarray: ...
 
 
 class ExpenseModel:
 
-    def __init__(self, model_path: Path):
-        assert model_path.exists(), f"Model path {model_path} does not exist."
-        self.model = joblib.load(model_path)
+    def __init__(self, model_path: Path, use_export: bool = True) -> None:
+        """Load the model, preferring its NumPy export when there is one.
+
+        The export (``model_path`` with a ``.npz`` suffix, see
+        ``fast_predictor.export_model``) is evaluated without sklearn; it is
+        skipped when it was made from another version of the pickled model.
+        The pickle is then only loaded if a DataFrame is scored or the model
+        dumped.
+        """
+        self.model_path = Path(model_path)
+        self.model: Any = None  # the sklearn pipeline
+        self.fast_predictor = _load_export(self.model_path) if use_export else None
+        if self.fast_predictor is not None:
+            return
+        assert self.model_path.exists(), f"Model path {model_path} does not exist."
+        self.model = self._pipeline()
+        self.fast_predictor = _compile(self.model)
+
+    @property
+    def classes(self) -> np.ndarray:
+        """Labels of the columns of ``predict_proba``."""
+        if self.model is None and self.fast_predictor is not None:
+            return self.fast_predictor.classes
+        return np.asarray(self._pipeline().classes_)
 
-    def predict(self, X):
-        return self.model.predict(X)
+    def predict(self, X: Any) -> np.ndarray:
+        predictor = self.fast_predictor
+        transaction = _single(X)
+        if transaction is not None and predictor is not None:
+            return np.array([self.predict_one(transaction)])
+        if self.model is None and predictor is not None and _is_batch(X):
+            return predictor.predict_many(X)
+        return np.asarray(self._pipeline().predict(_to_frame(X)))
 
-    def predict_proba(self, X):
-        return self.model.predict_proba(X)
+    def predict_proba(self, X: Any) -> np.ndarray:
+        predictor = self.fast_predictor
+        transaction = _single(X)
+        if transaction is not None and predictor is not None:
+            return self.predict_proba_one(transaction)[np.newaxis, :]
+        if self.model is None and predictor is not None and _is_batch(X):
+            return predictor.predict_proba_many(X)
+        return np.asarray(self._pipeline().predict_proba(_to_frame(X)))
+
+    def predict_one(self, transaction: Transaction) -> Any:
+        """Predict a single transaction, without pandas when possible."""
+        if self.fast_predictor is None:
+            return self.model.predict(transaction.to_dataframe())[0]
+        return self.fast_predictor.predict(transaction)
+
+    def predict_proba_one(self, transaction: Transaction) -> np.ndarray:
+        """Class probabilities of a single transaction."""
+        if self.fast_predictor is None:
+            return np.asarray(self.model.predict_proba(transaction.to_dataframe())[0])
+        return self.fast_predictor.predict_proba(transaction)
 
     def dump(self, path: str) -> None:
+        import joblib
+
+        model = self._pipeline()
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        joblib.dump(self.model, path)
+        joblib.dump(model, path)
+
+    def _pipeline(self) -> Any:
+        """The pickled pipeline, loaded on first use when the export is used."""
+        if self.model is None:
+            if not self.model_path.exists():
+                raise FileNotFoundError(
+                    f"The pickled model {self.model_path} is needed to score "
+                    "DataFrames or dump the model"
+                )
+            import joblib
+
+            self.model = joblib.load(self.model_path)
+        return self.model
+
+
+def _load_export(model_path: Path) -> Optional[FastPredictor]:
+    """Load the NumPy export of a model, if present and up to date."""
+    export_path = model_path.with_suffix(EXPORT_SUFFIX)
+    if not export_path.exists():
+        return None
+    try:
+        predictor = FastPredictor.load(export_path)
+    except (OSError, KeyError, ValueError) as exc:
+        logger.warning(f"Ignoring the model export {export_path}: {exc}")
+        return None
+    if (
+        model_path != export_path
+        and model_path.exists()
+        and predictor.source_sha256 != file_sha256(model_path)
+    ):
+        logger.warning(f"Ignoring {export_path}: it was not exported from {model_path}")
+        return None
+    logger.debug(f"Loaded the model export {export_path}")
+    return predictor
+
+
+def _compile(model: Any) -> Optional[FastPredictor]:
+    """Compile the single-row path, or None when the pipeline is not supported."""
+    try:
+        return FastPredictor.from_pipeline(model)
+    except ValueError as exc:
+        logger.warning(f"Using the sklearn pipeline for single predictions: {exc}")
+        return None
+
+
+def _single(X: Any) -> Optional[Transaction]:
+    """The transaction of a single-row input, if it is one."""
+    if isinstance(X, Transaction):
+        return X
+    if isinstance(X, TransactionBatch) and len(X) == 1:
+        return X[0]
+    return None
+
+
+def _is_batch(X: Any) -> bool:
+    """Whether a model input holds transactions, as the NumPy export scores."""
+    return isinstance(X, (TransactionBatch, list))
+
+
+def _to_frame(X: Any) -> Any:
+    """Accept a DataFrame, a Transaction or a TransactionBatch as model input."""
+    if isinstance(X, TransactionBatch):
+        return X.to_dataframe(with_hash=False)
+    if isinstance(X, Transaction):
+        return X.to_dataframe()
+    return X
 
 
 if __name__ == "__main__":
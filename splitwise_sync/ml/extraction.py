@@ -0,0 +1,152 @@
+"""Vectorized extraction of transactions from many receipt bodies at once."""
+
+import numpy as np
+import pandas as pd
+
+from splitwise_sync.config import DEFAULT_TIMEZONE
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+
+def extract_transactions(
+    bodies: pd.Series,
+    parser: type[ReceiptParser] = ReceiptParser,
+    timezone: str = DEFAULT_TIMEZONE,
+    prefix: str = "transaction_",
+) -> pd.DataFrame:
+    """Extract the transaction fields of a Series of cleaned email bodies.
+
+    Applies the patterns of ``parser`` with ``Series.str.extract``, so the
+    work happens column-wise without a Python loop over the rows. As in
+    ``ReceiptParser.parse_email``, the single-pass ``receipt_re`` is tried
+    first and the per-field patterns only on the rows it does not match.
+    Values follow ``ReceiptParser``: amounts in Chilean format, "CLP" as the
+    default currency and dates in local time.
+
+    Args:
+        bodies: Email bodies, already converted to text
+        parser: Receipt parser class whose patterns are used
+        timezone: Time zone of the dates in the emails
+        prefix: Prefix of the output column names
+
+    Returns:
+        A DataFrame with the same index as ``bodies`` and the columns cost,
+        currency_code, date, description (the merchant), card_number,
+        details and error. Rows that fail keep the message that
+        ``ReceiptParser`` would raise in ``error`` and nulls elsewhere.
+    """
+    index = bodies.index
+    bodies = bodies.astype("string").reset_index(drop=True)
+
+    if parser.receipt_re is None:
+        fields = _extract_fields(bodies, parser, timezone)
+    else:
+        receipt = bodies.str.extract(parser.receipt_re)
+        matched = receipt["amount"].notna()
+        parts = [
+            _receipt_fields(receipt[matched], timezone),
+            _extract_fields(bodies[~matched], parser, timezone),
+        ]
+        fields = pd.concat([part for part in parts if len(part)] or parts[:1])
+        fields = fields.sort_index()
+
+    failed = fields["error"].notna()
+    frame = pd.DataFrame(
+        {
+            "cost": fields["cost"].mask(failed),
+            "currency_code": fields["currency_code"].mask(failed).astype("category"),
+            "date": fields["date"].mask(failed),
+            "description": fields["description"].mask(failed),
+            "card_number": fields["card_number"].mask(failed),
+            "details": fields["details"].fillna("").mask(failed),
+            "error": fields["error"],
+        }
+    )
+    frame.index = index
+    return frame.rename(columns=lambda col: f"{prefix}{col}")
+
+
+def _receipt_fields(receipt: pd.DataFrame, timezone: str) -> pd.DataFrame:
+    """Fields of the rows matched by the parser's ``receipt_re``."""
+    return _fields(
+        receipt,
+        date=_build_dates(receipt, timezone),
+        merchant=receipt["merchant"].str.strip(),
+        card_number=receipt["card"],
+        details=receipt["text"].str.strip(),
+        error=pd.Series(pd.NA, index=receipt.index, dtype="string"),
+    )
+
+
+def _extract_fields(
+    bodies: pd.Series, parser: type[ReceiptParser], timezone: str
+) -> pd.DataFrame:
+    """Fields found by the per-field patterns of the parser."""
+    details = bodies.str.extract(parser.text_re, expand=True)[0].str.strip()
+    amount = bodies.str.extract(parser.amount_re)
+    card_number = bodies.str.extract(parser.card_re, expand=True)[0]
+
+    merchant = pd.Series(pd.NA, index=bodies.index, dtype="string")
+    for pattern in parser.merchant_res:
+        missing = merchant.isna()
+        merchant[missing] = bodies[missing].str.extract(pattern, expand=True)[0]
+    merchant = merchant.str.strip()
+
+    date = _build_dates(bodies.str.extract(parser.date_re), timezone)
+
+    # first failing field, in the order ReceiptParser extracts them
+    error = pd.Series(pd.NA, index=bodies.index, dtype="string")
+    for value, message in [
+        (date, "No transaction date found in the email"),
+        (merchant, "No merchant found in the email"),
+        (card_number, "No card number found in the email"),
+        (amount["amount"], "No amount found in the email"),
+    ]:
+        error = error.mask(value.isna(), message)
+
+    return _fields(amount, date, merchant, card_number, details, error)
+
+
+def _fields(
+    amount: pd.DataFrame,
+    date: pd.Series,
+    merchant: pd.Series,
+    card_number: pd.Series,
+    details: pd.Series,
+    error: pd.Series,
+) -> pd.DataFrame:
+    """Fields of some rows, with the amount groups converted to a cost."""
+    cost = (
+        amount["amount"].str.replace(".", "", regex=False)
+        + amount["decimals"].fillna("").str.replace(",", ".", regex=False)
+    ).astype("float64")
+    currency = amount["currency"].fillna("CLP").where(amount["amount"].notna())
+    return pd.DataFrame(
+        {
+            "cost": cost,
+            "currency_code": currency.astype("string"),
+            "date": date,
+            "description": merchant.astype("string"),
+            "card_number": card_number.astype("string"),
+            "details": details.astype("string"),
+            "error": error,
+        },
+        index=amount.index,
+    )
+
+
+def _build_dates(parts: pd.DataFrame, timezone: str) -> pd.Series:
+    """Build the local dates from the named groups of the date patterns."""
+    fields = {name: parts[name].astype("float64") for name in ["year", "month", "day"]}
+    # a missing time counts as midnight, as in ReceiptParser._build_date
+    for name in ["hour", "minute"]:
+        fields[name] = (
+            parts[name].astype("float64").fillna(0.0) if name in parts else 0.0
+        )
+    naive = pd.to_datetime(pd.DataFrame(fields, index=parts.index), errors="coerce")
+    # like datetime(..., tzinfo=ZoneInfo(timezone)): the first of repeated
+    # times and the pre-transition offset for skipped ones (1h DST gaps)
+    return naive.dt.tz_localize(
+        timezone,
+        ambiguous=np.ones(len(naive), dtype=bool),
+        nonexistent=pd.Timedelta(hours=1),
+    )
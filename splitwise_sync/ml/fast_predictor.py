@@ -0,0 +1,418 @@
+"""Single-row predictor compiled from the fitted sklearn pipeline.
+
+Scoring one transaction with the pipeline builds a one-row DataFrame and runs
+every transformer of ``build_preprocess``, which costs milliseconds of
+overhead. ``FastPredictor`` keeps only what the fitted pipeline learned (the
+merchant vocabulary, the layout of the feature vector and the tree arrays)
+and computes the few features a transaction has directly from it, so it
+needs neither pandas nor sklearn at prediction time.
+
+The predictor can be exported to a versioned ``.npz`` file (the tree arrays
+plus a JSON header with the vocabulary and feature layout), so the sync runs
+can load the model without unpickling, and importing, sklearn and scipy:
+
+    python -m splitwise_sync.ml.fast_predictor models/decision_tree_model.pkl \
+        --data data/processed/matched_transactions_locs.pkl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from splitwise_sync.config import DEFAULT_TIMEZONE
+from splitwise_sync.core.models import Transaction, TransactionBatch
+
+logger = logging.getLogger(__name__)
+
+# version of the exported file layout, bumped on incompatible changes
+FORMAT_VERSION = 1
+EXPORT_SUFFIX = ".npz"
+
+# characters of the description holding the merchant, see feature_extractor
+MERCHANT_SLICE = slice(0, 23)
+
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+class FastPredictor:
+    """Decision tree and feature layout of a fitted expense pipeline."""
+
+    def __init__(
+        self,
+        vocabulary: dict[str, int],
+        token_pattern: str,
+        numeric_features: Sequence[str],
+        children_left: Sequence[int],
+        children_right: Sequence[int],
+        feature: Sequence[int],
+        threshold: Sequence[float],
+        value: np.ndarray,
+        classes: Sequence[Any],
+        timezone: str = DEFAULT_TIMEZONE,
+    ):
+        """Build a predictor from plain arrays.
+
+        Args:
+            vocabulary: Column of each merchant token, from ``CountVectorizer``
+            token_pattern: Regular expression of the vectorizer's tokens
+            numeric_features: Names of the features following the merchant
+                              tokens, e.g. "transaction_cost", "hour", "monday"
+            children_left: Left child of each tree node, -1 for leaves
+            children_right: Right child of each tree node, -1 for leaves
+            feature: Column compared at each node
+            threshold: Threshold of each node, ``x <= threshold`` goes left
+            value: Class weights of each node, shaped (nodes, classes)
+            classes: Label of each class
+            timezone: Time zone of the date features
+        """
+        self.vocabulary = {str(token): int(i) for token, i in vocabulary.items()}
+        self.token_pattern = token_pattern
+        self.numeric_features = list(numeric_features)
+        self.timezone = timezone
+        self._token_re = re.compile(token_pattern)
+        self._tz = ZoneInfo(timezone)
+
+        # lists index faster than arrays for a walk of a few nodes
+        self.children_left = [int(i) for i in children_left]
+        self.children_right = [int(i) for i in children_right]
+        self.feature = [int(i) for i in feature]
+        self.threshold = [float(t) for t in threshold]
+        self.classes = np.asarray(classes)
+        value = np.asarray(value, dtype="float64").reshape(len(self.feature), -1)
+        totals = value.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        self.proba = value / totals
+        self.value = value
+
+        for name in self.numeric_features:
+            if name not in _NUMERIC_FEATURES:
+                raise ValueError(f"Unsupported numeric feature: {name}")
+        self._offset = len(self.vocabulary)
+        self.source_sha256: Optional[str] = None
+
+    @classmethod
+    def from_pipeline(
+        cls, pipeline: Any, timezone: str = DEFAULT_TIMEZONE
+    ) -> "FastPredictor":
+        """Compile a fitted ``make_pipeline(build_preprocess(), tree)``.
+
+        Both layouts of ``build_preprocess`` are supported: the fused
+        ``TransactionFeatureExtractor`` and the per-column transformers.
+
+        Raises:
+            ValueError: If the pipeline is not laid out as ``build_preprocess``
+                        builds it, or the tree is not fitted
+        """
+        from .preprocessing import joined_words
+
+        try:
+            union, tree = pipeline[0], pipeline[-1]
+            transformers = dict(union.transformer_list)
+            if "transaction_features" in transformers:
+                extractor = transformers["transaction_features"]
+                vectorizer = extractor.vectorizer_
+                token_prefix = "transaction_features__merchant__"
+            else:
+                text_pipeline = transformers["text_features"]
+                extractor, columns = text_pipeline[0], text_pipeline[-1]
+                vectorizer = columns.named_transformers_["memorized_merchant"]
+                token_prefix = "text_features__"
+            names = list(union.get_feature_names_out())
+            nodes = tree.tree_
+        except (AttributeError, KeyError, IndexError, TypeError) as exc:
+            raise ValueError(f"Unsupported pipeline: {exc!r}") from exc
+
+        if (
+            vectorizer.preprocessor is not joined_words
+            or vectorizer.analyzer != "word"
+            or vectorizer.tokenizer is not None
+            or tuple(vectorizer.ngram_range) != (1, 1)
+            or not vectorizer.binary
+            or getattr(extractor, "description_column", None)
+            != "transaction_description"
+        ):
+            raise ValueError("Unsupported merchant vectorizer")
+        n_tokens = len(vectorizer.vocabulary_)
+        if any(not name.startswith(token_prefix) for name in names[:n_tokens]):
+            raise ValueError("The merchant tokens must come first in the features")
+        if nodes.n_outputs != 1:
+            raise ValueError("Only single-output trees are supported")
+
+        return cls(
+            vocabulary=vectorizer.vocabulary_,
+            token_pattern=vectorizer.token_pattern,
+            numeric_features=[name.split("__")[-1] for name in names[n_tokens:]],
+            children_left=nodes.children_left,
+            children_right=nodes.children_right,
+            feature=nodes.feature,
+            threshold=nodes.threshold,
+            value=nodes.value[:, 0, :],
+            classes=tree.classes_,
+            timezone=timezone,
+        )
+
+    def features(self, transaction: Transaction) -> dict[int, float]:
+        """Sparse feature vector of a transaction, as the pipeline builds it.
+
+        Returns:
+            The value of each non-zero column, rounded to float32 as the tree
+            compares them
+        """
+        merchant = transaction.description[MERCHANT_SLICE].strip()
+        words = "_".join(w for w in merchant.split(" ") if w).strip("_")
+        vector = {
+            self.vocabulary[token]: 1.0
+            for token in self._token_re.findall(words)
+            if token in self.vocabulary
+        }
+
+        date = transaction.date
+        if date.tzinfo is not None:
+            date = date.astimezone(self._tz)
+        for i, name in enumerate(self.numeric_features):
+            x = float(np.float32(_NUMERIC_FEATURES[name](transaction.cost, date)))
+            if x:
+                vector[self._offset + i] = x
+        return vector
+
+    def leaf(self, transaction: Transaction) -> int:
+        """Index of the tree leaf a transaction falls in."""
+        vector = self.features(transaction)
+        left, right = self.children_left, self.children_right
+        node = 0
+        while left[node] != -1:
+            if vector.get(self.feature[node], 0.0) <= self.threshold[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        return node
+
+    def predict_proba(self, transaction: Transaction) -> np.ndarray:
+        """Class probabilities of a transaction, as ``predict_proba``."""
+        proba: np.ndarray = self.proba[self.leaf(transaction)]
+        return proba
+
+    def predict(self, transaction: Transaction) -> Any:
+        """Predicted class of a transaction, as ``predict``."""
+        return self.classes[int(np.argmax(self.value[self.leaf(transaction)]))]
+
+    def predict_proba_many(self, transactions: Iterable[Transaction]) -> np.ndarray:
+        """Class probabilities of many transactions, one row each."""
+        leaves = np.fromiter((self.leaf(t) for t in transactions), dtype=np.intp)
+        proba: np.ndarray = self.proba[leaves]
+        return proba
+
+    def predict_many(self, transactions: Iterable[Transaction]) -> np.ndarray:
+        """Predicted class of many transactions."""
+        leaves = np.fromiter((self.leaf(t) for t in transactions), dtype=np.intp)
+        return self.classes[np.argmax(self.value[leaves], axis=1)]
+
+    def save(self, path: Path, source_sha256: Optional[str] = None) -> None:
+        """Export the predictor to a ``.npz`` file.
+
+        Args:
+            path: Output file
+            source_sha256: Hash of the model file it was compiled from, so
+                           loaders can tell when the export is stale
+        """
+        header = {
+            "format_version": FORMAT_VERSION,
+            "vocabulary": self.vocabulary,
+            "token_pattern": self.token_pattern,
+            "numeric_features": self.numeric_features,
+            "timezone": self.timezone,
+            "source_sha256": source_sha256,
+        }
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                header=np.array(json.dumps(header)),
+                children_left=np.asarray(self.children_left, dtype=np.int32),
+                children_right=np.asarray(self.children_right, dtype=np.int32),
+                feature=np.asarray(self.feature, dtype=np.int32),
+                threshold=np.asarray(self.threshold, dtype=np.float64),
+                value=self.value,
+                classes=self.classes,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FastPredictor":
+        """Load a predictor exported with ``save``.
+
+        Raises:
+            ValueError: If the file was written in another format version
+        """
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            if header.get("format_version") != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported model format {header.get('format_version')} "
+                    f"in {path}, expected {FORMAT_VERSION}"
+                )
+            predictor = cls(
+                vocabulary=header["vocabulary"],
+                token_pattern=header["token_pattern"],
+                numeric_features=header["numeric_features"],
+                children_left=data["children_left"],
+                children_right=data["children_right"],
+                feature=data["feature"],
+                threshold=data["threshold"],
+                value=data["value"],
+                classes=data["classes"],
+                timezone=header["timezone"],
+            )
+        predictor.source_sha256 = header.get("source_sha256")
+        return predictor
+
+    def check(
+        self,
+        pipeline: Any,
+        transactions: Sequence[Transaction],
+        frame: Optional[Any] = None,
+    ) -> None:
+        """Check that the predictions match those of the sklearn pipeline.
+
+        Args:
+            pipeline: The pipeline this predictor was compiled from
+            transactions: Transactions to compare the predictions on, e.g. the
+                          training set
+            frame: The transactions as a DataFrame, built when omitted
+
+        Raises:
+            ValueError: On the first transaction predicted differently
+        """
+        if frame is None:
+            frame = TransactionBatch.from_transactions(transactions).to_dataframe()
+        expected = pipeline.predict_proba(frame)
+        for transaction, proba in zip(transactions, expected):
+            if not np.array_equal(self.predict_proba(transaction), proba):
+                raise ValueError(
+                    f"Fast predictor differs from the pipeline on {transaction}"
+                )
+
+
+def _weekday_flag(day: int) -> Callable[[float, datetime], float]:
+    """Feature set to 1 on one weekday (0 for Monday)."""
+    return lambda cost, date: float(date.weekday() == day)
+
+
+# features following the merchant tokens, from the cost and local date
+_NUMERIC_FEATURES: dict[str, Callable[[float, datetime], float]] = {
+    "transaction_cost": lambda cost, date: cost,
+    "hour": lambda cost, date: date.hour,
+    "dayofweek": lambda cost, date: date.weekday(),
+    **{name: _weekday_flag(day) for day, name in enumerate(WEEKDAYS)},
+}
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_model(
+    model_path: Path, output: Optional[Path] = None, frame: Optional[Any] = None
+) -> Path:
+    """Compile a pickled pipeline and save it next to it (or to ``output``).
+
+    Args:
+        model_path: The pickled sklearn pipeline
+        output: The exported file, the model path with ``EXPORT_SUFFIX`` by
+                default
+        frame: Transactions the export must score like the pipeline, e.g. the
+               training set, with the cost, date and description columns
+
+    Returns:
+        The path of the exported file
+
+    Raises:
+        ValueError: If the predictor differs from the pipeline on ``frame``,
+                    in which case nothing is written
+    """
+    import joblib
+
+    output = output or Path(model_path).with_suffix(EXPORT_SUFFIX)
+    pipeline = joblib.load(model_path)
+    predictor = FastPredictor.from_pipeline(pipeline)
+    if frame is not None:
+        predictor.check(pipeline, _frame_transactions(frame), frame)
+        logger.info(f"Export matches the pipeline on {len(frame)} transactions")
+    predictor.save(output, source_sha256=file_sha256(model_path))
+    logger.info(
+        f"Exported {model_path} to {output} ({len(predictor.feature)} nodes, "
+        f"{len(predictor.vocabulary)} merchant tokens)"
+    )
+    return output
+
+
+def _frame_transactions(frame: Any) -> list[Transaction]:
+    """Transactions of a training frame, with the fields the model reads."""
+    return [
+        Transaction(
+            cost=cost,
+            currency_code="",
+            date=date,
+            description=description,
+            card_number="",
+            details="",
+        )
+        for cost, date, description in zip(
+            frame["transaction_cost"],
+            frame["transaction_date"],
+            frame["transaction_description"],
+        )
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export a fitted expense model to a NumPy (.npz) file"
+    )
+    parser.add_argument("model", type=Path, help="Pickled sklearn pipeline")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help=f"Output file (default: the model path with a {EXPORT_SUFFIX} suffix)",
+    )
+    parser.add_argument(
+        "--data",
+        type=Path,
+        help="Pickled training frame the export must score like the model",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    frame = None
+    if args.data is not None:
+        import pandas as pd
+
+        frame = pd.read_pickle(args.data)
+    export_model(args.model, args.output, frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,30 @@
+from typing import Any, Optional
+
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.utils.validation import check_is_fitted
+
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+# fixed-width fields of the bank descriptions
+MERCHANT_SLICE = slice(0, 23)
+MUNICIPALITY_SLICE = slice(23, 37)
+COUNTRY_SLICE = slice(37, 45)
+
+
+def joined_words(text: str) -> str:
+    return "_".join([word for word in text.split(" ") if len(word) > 0]).strip("_")
 
 
 class DateFeatureExtractor(BaseEstimator, TransformerMixin):
@@ -9,13 +34,7 @@ class DateFeatureExtractor(BaseEstimator, TransformerMixin):
             # "month",
             "hour",
             "dayofweek",
-            "monday",
-            "tuesday",
-            "wednesday",
-            "thursday",
-            "friday",
-            "saturday",
-            "sunday",
+            *WEEKDAYS,
             # "is_weekend",
         ]
 
@@ -26,19 +45,15 @@ class DateFeatureExtractor(BaseEstimator, TransformerMixin):
         assert self.date_column in X.columns, f"{self.date_column} not in input columns"
 
         date_col = pd.to_datetime(X[self.date_column])
+        dayofweek = date_col.dt.dayofweek
+        weekdays = (dayofweek.to_numpy()[:, np.newaxis] == np.arange(7)).astype(int)
         X_new = pd.DataFrame(
             {
                 # "month": date_col.dt.month,
                 "hour": date_col.dt.hour,
-                "dayofweek": date_col.dt.dayofweek,
-                "monday": (date_col.dt.dayofweek == 0).astype(int),
-                "tuesday": (date_col.dt.dayofweek == 1).astype(int),
-                "wednesday": (date_col.dt.dayofweek == 2).astype(int),
-                "thursday": (date_col.dt.dayofweek == 3).astype(int),
-                "friday": (date_col.dt.dayofweek == 4).astype(int),
-                "saturday": (date_col.dt.dayofweek == 5).astype(int),
-                "sunday": (date_col.dt.dayofweek == 6).astype(int),
-                # "is_weekend": (date_col.dt.dayofweek >= 5).astype(int),
+                "dayofweek": dayofweek,
+                **{name: weekdays[:, day] for day, name in enumerate(WEEKDAYS)},
+                # "is_weekend": (dayofweek >= 5).astype(int),
             },
             index=X.index,
         )
@@ -70,9 +85,9 @@ class DescriptionFeatureExtractor(BaseEstimator, TransformerMixin):
         description_col = X[self.description_column].fillna("")
         X_new = pd.DataFrame(
             {
-                "description_municipality": description_col.str[23:37].str.strip(),
-                "description_country": description_col.str[37:45].str.strip(),
-                "description_merchant": description_col.str[0:23].str.strip(),
+                "description_municipality": _field(description_col, MUNICIPALITY_SLICE),
+                "description_country": _field(description_col, COUNTRY_SLICE),
+                "description_merchant": _field(description_col, MERCHANT_SLICE),
                 "transaction_description": description_col.str.strip(),
             },
             index=X.index,
@@ -84,6 +99,198 @@ class DescriptionFeatureExtractor(BaseEstimator, TransformerMixin):
         return self._feature_names_out
 
 
+class TransactionFeatureExtractor(BaseEstimator, TransformerMixin):
+    """Merchant tokens, cost and date features as one sparse matrix.
+
+    Fused version of ``DescriptionFeatureExtractor``, the merchant
+    ``CountVectorizer`` and ``DateFeatureExtractor`` as ``build_preprocess``
+    combined them, giving the same columns and values: the merchant tokens,
+    the cost, then the hour, weekday and weekday flags. The merchant field is
+    sliced once and each distinct merchant tokenized once, the dates are
+    parsed once, and the date features are computed with NumPy straight into
+    a CSR matrix, without any DataFrame.
+    """
+
+    numeric_features = ["transaction_cost", "hour", "dayofweek", *WEEKDAYS]
+
+    def __init__(
+        self,
+        description_column: str = "transaction_description",
+        cost_column: str = "transaction_cost",
+        date_column: str = "transaction_date",
+        max_features: Optional[int] = 10000,
+    ) -> None:
+        self.description_column = description_column
+        self.cost_column = cost_column
+        self.date_column = date_column
+        self.max_features = max_features
+
+    def _vectorizer(self) -> CountVectorizer:
+        return CountVectorizer(
+            max_features=self.max_features,
+            ngram_range=(1, 1),
+            binary=True,
+            preprocessor=joined_words,
+        )
+
+    def fit(self, X: pd.DataFrame, y: Any = None) -> "TransactionFeatureExtractor":
+        self._fit_tokens(X)
+        return self
+
+    def fit_transform(self, X: pd.DataFrame, y: Any = None) -> sp.csr_matrix:
+        tokens = self._fit_tokens(X)
+        return sp.hstack([tokens, self._numeric(X)], format="csr", dtype="float64")
+
+    def transform(self, X: pd.DataFrame) -> sp.csr_matrix:
+        check_is_fitted(self, "vectorizer_")
+        codes, merchants = self._merchants(X)
+        tokens = self.vectorizer_.transform(merchants)[codes]
+        return sp.hstack([tokens, self._numeric(X)], format="csr", dtype="float64")
+
+    def _fit_tokens(self, X: pd.DataFrame) -> sp.csr_matrix:
+        """Fit the merchant vocabulary, returning the tokens of each row."""
+        codes, merchants = self._merchants(X)
+        self.vectorizer_ = self._vectorizer()
+        tokens = self.vectorizer_.fit_transform(merchants)
+        if (
+            self.max_features is not None
+            and len(self.vectorizer_.vocabulary_) >= self.max_features
+        ):
+            # the most frequent tokens are kept, counted over every row
+            self.vectorizer_ = self._vectorizer()
+            return self.vectorizer_.fit_transform(merchants[codes])
+        return tokens[codes]
+
+    def _merchants(self, X: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Merchant of each row, as codes into the distinct merchants.
+
+        Receipts come from a few hundred merchants, so only the distinct ones
+        are tokenized.
+        """
+        assert (
+            self.description_column in X.columns
+        ), f"{self.description_column} not in input columns {X.columns}"
+        merchants = _field(X[self.description_column].fillna(""), MERCHANT_SLICE)
+        codes, uniques = pd.factorize(merchants)
+        return codes, np.asarray(uniques, dtype=object)
+
+    def _numeric(self, X: pd.DataFrame) -> sp.csr_matrix:
+        """Cost and date features, four stored values per row."""
+        cost = X[self.cost_column].to_numpy(dtype="float64")
+        hour, weekday = _hour_and_weekday(X[self.date_column])
+        n = len(cost)
+        # cost, hour and weekday in columns 0-2, then the flag of the weekday
+        values = np.column_stack([cost, hour, weekday, np.ones(n)])
+        columns = np.column_stack(
+            [np.zeros(n), np.ones(n), np.full(n, 2), 3 + weekday]
+        ).astype(np.int32)
+        matrix = sp.csr_matrix(
+            (values.ravel(), columns.ravel(), np.arange(0, 4 * n + 1, 4)),
+            shape=(n, len(self.numeric_features)),
+        )
+        matrix.eliminate_zeros()
+        return matrix
+
+    def get_feature_names_out(self, input_features: Any = None) -> np.ndarray:
+        check_is_fitted(self, "vectorizer_")
+        tokens = self.vectorizer_.get_feature_names_out()
+        return np.array(
+            [f"merchant__{token}" for token in tokens] + self.numeric_features,
+            dtype=object,
+        )
+
+
+class HashingFeatureExtractor(BaseEstimator, TransformerMixin):
+    """Merchant, cost and date features in a fixed-size space, without fitting.
+
+    The merchant (whole, as ``joined_words`` joins it, and word by word) is
+    hashed into ``n_features`` columns, so new merchants need no vocabulary
+    refit. The cost is log-scaled and the hour and weekday are one-hot
+    encoded, as suits linear models trained with ``partial_fit``.
+    """
+
+    def __init__(
+        self,
+        n_features: int = 2**18,
+        description_column: str = "transaction_description",
+        cost_column: str = "transaction_cost",
+        date_column: str = "transaction_date",
+    ) -> None:
+        self.n_features = n_features
+        self.description_column = description_column
+        self.cost_column = cost_column
+        self.date_column = date_column
+
+    def fit(self, X: pd.DataFrame, y: Any = None) -> "HashingFeatureExtractor":
+        return self
+
+    def transform(self, X: pd.DataFrame) -> sp.csr_matrix:
+        assert (
+            self.description_column in X.columns
+        ), f"{self.description_column} not in input columns {X.columns}"
+        merchants = _field(X[self.description_column].fillna(""), MERCHANT_SLICE)
+        codes, uniques = pd.factorize(merchants)
+        hasher = HashingVectorizer(
+            n_features=self.n_features,
+            analyzer=merchant_tokens,
+            binary=True,
+            norm=None,
+            alternate_sign=False,
+        )
+        tokens = hasher.transform(np.asarray(uniques, dtype=object))[codes]
+
+        # log10 of the cost, then the flags of the hour and of the weekday
+        cost = X[self.cost_column].to_numpy(dtype="float64")
+        hour, weekday = _hour_and_weekday(X[self.date_column])
+        n = len(cost)
+        values = np.column_stack(
+            [np.log10(1 + np.clip(cost, 0, None)), np.ones((n, 2))]
+        )
+        columns = np.column_stack([np.zeros(n), 1 + hour, 25 + weekday]).astype(
+            np.int32
+        )
+        numeric = sp.csr_matrix(
+            (values.ravel(), columns.ravel(), np.arange(0, 3 * n + 1, 3)),
+            shape=(n, 1 + 24 + 7),
+        )
+        return sp.hstack([tokens, numeric], format="csr", dtype="float64")
+
+    def get_feature_names_out(self, input_features: Any = None) -> np.ndarray:
+        return np.array(
+            [f"merchant_hash_{i}" for i in range(self.n_features)]
+            + ["log_cost"]
+            + [f"hour_{hour}" for hour in range(24)]
+            + WEEKDAYS,
+            dtype=object,
+        )
+
+
+def merchant_tokens(merchant: str) -> list[str]:
+    """Tokens hashed for a merchant: the whole merchant and each of its words."""
+    merchant = merchant.lower()
+    return [f"merchant:{joined_words(merchant)}"] + [
+        f"word:{word}" for word in merchant.split()
+    ]
+
+
+def _field(descriptions: pd.Series, field: slice) -> pd.Series:
+    """A fixed-width field of the descriptions, without padding."""
+    return descriptions.str[field].str.strip()
+
+
+def _hour_and_weekday(dates: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Local hour and weekday (0 for Monday) of dates, parsed once."""
+    index = pd.DatetimeIndex(pd.to_datetime(dates))
+    if index.tz is not None:
+        index = index.tz_localize(None)  # wall time in the dates' time zone
+    local = index.to_numpy()
+    days = local.astype("datetime64[D]")
+    hour = (local - days) // np.timedelta64(1, "h")
+    # 1970-01-01 was a Thursday
+    weekday = (days.astype(np.int64) + 3) % 7
+    return hour.astype(np.int64), weekday
+
+
 if __name__ == "__main__":
     df = pd.read_pickle("processed/matched_transactions_locs.pkl")
     col = "transaction_date"
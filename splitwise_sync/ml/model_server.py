@@ -0,0 +1,330 @@
+"""Local model server answering predictions over a Unix socket.
+
+``splitwise-sync serve-model`` loads the ``ExpenseModel`` once and keeps it
+in memory, so sync runs (and several accounts or jobs) share one copy instead
+of each loading it from disk. Requests from concurrent clients are collected
+into micro-batches, up to ``max_batch`` transactions or ``max_wait`` seconds
+after the first one, and scored with a single ``predict_proba`` call.
+
+The protocol is one JSON object per line. A request is either
+``{"op": "predict_proba", "transactions": [...]}`` with the transactions as
+``Transaction.to_dict`` dicts, answered with ``{"proba": [...], "classes":
+[...]}``, or ``{"op": "stats"}``, answered with the latency and batch-size
+statistics of the server and the SHA-256 of the model file it serves, so
+clients can tell whether it serves the model they were asked to use.
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from splitwise_sync.config import MODEL_BATCH_SIZE, MODEL_BATCH_WAIT
+from splitwise_sync.core.models import Transaction, TransactionBatch
+
+from .fast_predictor import EXPORT_SUFFIX, file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    """Transactions of one client request, waiting to be scored."""
+
+    __slots__ = ("transactions", "received_at", "proba", "error", "done")
+
+    def __init__(self, transactions: list[Transaction]):
+        self.transactions = transactions
+        self.received_at = time.perf_counter()
+        self.proba: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server scoring transactions in micro-batches."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        model: Any,
+        socket_path: Path,
+        max_batch: int = MODEL_BATCH_SIZE,
+        max_wait: float = MODEL_BATCH_WAIT,
+        model_sha256: Optional[str] = None,
+    ):
+        """Bind the socket and start the batching thread.
+
+        Args:
+            model: An ``ExpenseModel`` (anything with ``predict_proba`` of a
+                   ``TransactionBatch`` and ``classes``)
+            socket_path: Path of the Unix socket to listen on
+            max_batch: Transactions from which a batch is scored right away
+            max_wait: Seconds a request waits for others to join its batch
+            model_sha256: ``model_file_sha256`` of the file ``model`` was
+                          loaded from, reported to the clients
+
+        Raises:
+            RuntimeError: If another server is listening on the socket
+        """
+        self.model = model
+        self.socket_path = Path(socket_path)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.model_sha256 = model_sha256
+        self.stats = _Stats()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._stopped = threading.Event()
+
+        if self.socket_path.exists():
+            if _is_listening(self.socket_path):
+                raise RuntimeError(f"A model server is running on {self.socket_path}")
+            self.socket_path.unlink()  # left over by a server that crashed
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(self.socket_path), _Handler)
+        os.chmod(self.socket_path, 0o600)
+
+        self._batcher = threading.Thread(target=self._run_batches, daemon=True)
+        self._batcher.start()
+
+    def submit(self, transactions: list[Transaction]) -> _Request:
+        """Queue transactions for the next batch."""
+        request = _Request(transactions)
+        self._queue.put(request)
+        return request
+
+    def server_close(self) -> None:
+        self._stopped.set()
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+        logger.info(f"Model server stats: {self.stats.summary()}")
+
+    def _run_batches(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            size = len(batch[0].transactions)
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    request = self._queue.get(
+                        timeout=max(deadline - time.perf_counter(), 0)
+                    )
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.transactions)
+            self._score(batch)
+
+    def _score(self, requests: list[_Request]) -> None:
+        transactions = [t for request in requests for t in request.transactions]
+        try:
+            proba = np.asarray(
+                self.model.predict_proba(
+                    TransactionBatch.from_transactions(transactions)
+                )
+            )
+        except Exception as exc:
+            logger.exception(f"Failed to score a batch of {len(transactions)}")
+            for request in requests:
+                request.error = str(exc)
+                request.done.set()
+            return
+
+        start = 0
+        now = time.perf_counter()
+        for request in requests:
+            end = start + len(request.transactions)
+            request.proba = proba[start:end]
+            request.done.set()
+            self.stats.add_request(now - request.received_at)
+            start = end
+        self.stats.add_batch(len(transactions))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer the JSON lines of one client connection."""
+
+    server: ModelServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self._answer(json.loads(line))
+            except (ValueError, KeyError, TypeError) as exc:
+                response = {"error": f"Bad request: {exc}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+    def _answer(self, message: dict[str, Any]) -> dict[str, Any]:
+        op = message.get("op")
+        if op == "stats":
+            return {
+                **self.server.stats.summary(),
+                "model_sha256": self.server.model_sha256,
+            }
+        if op != "predict_proba":
+            raise ValueError(f"unknown op {op!r}")
+
+        transactions = [Transaction.from_dict(t) for t in message["transactions"]]
+        if not transactions:
+            return {"proba": [], "classes": self._classes()}
+        request = self.server.submit(transactions)
+        request.done.wait()
+        if request.proba is None:  # _score set the error instead
+            return {"error": request.error}
+        return {"proba": request.proba.tolist(), "classes": self._classes()}
+
+    def _classes(self) -> list[Any]:
+        classes: list[Any] = np.asarray(self.server.model.classes).tolist()
+        return classes
+
+
+class _Stats:
+    """Counters of the requests and batches scored by the server."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.transactions = 0
+        self.max_batch_size = 0
+        # latencies (seconds) of the last requests, for percentiles
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def add_request(self, latency: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+
+    def add_batch(self, transactions: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.transactions += transactions
+            self.max_batch_size = max(self.max_batch_size, transactions)
+
+    def summary(self) -> dict[str, Any]:
+        """Totals, batch sizes and latency percentiles (in ms)."""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            summary: dict[str, Any] = {
+                "requests": self.requests,
+                "batches": self.batches,
+                "transactions": self.transactions,
+                "mean_batch_size": self.transactions / self.batches
+                if self.batches
+                else 0.0,
+                "max_batch_size": self.max_batch_size,
+            }
+        for q in (50, 95, 99):
+            value = np.percentile(latencies, q) if len(latencies) else 0.0
+            summary[f"latency_p{q}_ms"] = float(value)
+        return summary
+
+
+class ModelClient:
+    """Client of a ``ModelServer``, usable in place of ``ExpenseModel``."""
+
+    def __init__(self, socket_path: Path, timeout: Optional[float] = 30.0):
+        """Connect to the server.
+
+        Raises:
+            OSError: If no server is listening on the socket
+        """
+        self.socket_path = Path(socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(str(self.socket_path))
+        except OSError:
+            self._sock.close()
+            raise
+        self._file = self._sock.makefile("rwb")
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ModelClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _call(self, message: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            self._file.write(json.dumps(message).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError(f"Model server on {self.socket_path} hung up")
+        response: dict[str, Any] = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+        return response
+
+    def _score(self, X: Any) -> tuple[np.ndarray, np.ndarray]:
+        if isinstance(X, Transaction):
+            X = [X]
+        records = (
+            X.to_dicts()
+            if isinstance(X, TransactionBatch)
+            else [t.to_dict() for t in X]
+        )
+        response = self._call({"op": "predict_proba", "transactions": records})
+        classes = np.asarray(response["classes"])
+        proba = np.asarray(response["proba"], dtype="float64")
+        return proba.reshape(len(records), len(classes)), classes
+
+    def predict_proba(self, X: Transaction | Iterable[Transaction]) -> np.ndarray:
+        """Class probabilities of transactions, scored by the server."""
+        return self._score(X)[0]
+
+    def predict(self, X: Transaction | Iterable[Transaction]) -> np.ndarray:
+        """Predicted class of transactions, scored by the server."""
+        proba, classes = self._score(X)
+        return classes[np.argmax(proba, axis=1)]
+
+    def stats(self) -> dict[str, Any]:
+        """Latency and batch-size statistics of the server."""
+        return self._call({"op": "stats"})
+
+    def model_sha256(self) -> Optional[str]:
+        """``model_file_sha256`` of the model served, if the server knows it."""
+        return self.stats().get("model_sha256")
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+
+def model_file_sha256(model_path: Path) -> str:
+    """SHA-256 of the file a model is loaded from.
+
+    That is the pickle, or its NumPy export when there is no pickle.
+
+    Raises:
+        FileNotFoundError: If there is neither
+    """
+    model_path = Path(model_path)
+    if not model_path.exists():
+        model_path = model_path.with_suffix(EXPORT_SUFFIX)
+    return file_sha256(model_path)
+
+
+def _is_listening(socket_path: Path) -> bool:
+    """Whether a server accepts connections on a Unix socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
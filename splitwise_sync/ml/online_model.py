@@ -0,0 +1,221 @@
+"""Expense model learning online from the user's feedback.
+
+``ExpenseModel`` is a tree over a merchant vocabulary fitted on the whole
+history, so learning a new merchant means retraining on everything (see the
+"03 re-train with user feedack" notebook). ``OnlineExpenseModel`` hashes the
+merchant into a fixed number of columns (``HashingFeatureExtractor``), so
+there is no vocabulary to refit, and uses a linear classifier trained with
+``partial_fit``: each batch of feedback updates it in time proportional to
+the batch.
+
+The feedback is the state of the expenses created by the sync: those the
+user kept are shared, those deleted (by the sync when predicted as not
+shared, or later by the user) are not. An expense is learned once it has
+been left unchanged for ``FEEDBACK_DELAY_DAYS``, so the user had time to
+correct it, and again whenever it is updated after that.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterable, Optional, TypeAlias
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from numpy.typing import ArrayLike
+from sklearn.linear_model import SGDClassifier
+
+from splitwise_sync.config import FEEDBACK_DELAY_DAYS
+from splitwise_sync.core.models import Transaction, TransactionBatch
+
+from .feature_extractor import HashingFeatureExtractor
+
+logger = logging.getLogger(__name__)
+
+CLASSES = np.array([False, True])
+
+# inputs of the model: transactions or a frame of their prefixed columns
+ModelInput: TypeAlias = (
+    Transaction | TransactionBatch | list[Transaction] | pd.DataFrame
+)
+
+
+class OnlineExpenseModel:
+    """Hashed merchant features and a logistic regression fitted by SGD."""
+
+    def __init__(
+        self, n_features: int = 2**18, alpha: float = 1e-4, random_state: int = 42
+    ):
+        """Create an untrained model.
+
+        Args:
+            n_features: Columns the merchant tokens are hashed into
+            alpha: Regularization strength of the classifier
+            random_state: Seed of the order the samples are learned in
+        """
+        self.features = HashingFeatureExtractor(n_features=n_features)
+        self.classifier = SGDClassifier(
+            loss="log_loss", alpha=alpha, random_state=random_state
+        )
+        self.n_samples = 0
+
+    @property
+    def classes(self) -> np.ndarray:
+        """Labels of the columns of ``predict_proba``."""
+        return CLASSES
+
+    def partial_fit(self, X: ModelInput, y: ArrayLike) -> "OnlineExpenseModel":
+        """Update the model with one batch of labelled transactions.
+
+        Args:
+            X: Transactions, as a ``TransactionBatch``, a list or a DataFrame
+            y: Whether each transaction is shared
+        """
+        labels = np.asarray(y, dtype=bool)
+        self.classifier.partial_fit(self._features(X), labels, classes=CLASSES)
+        self.n_samples += len(labels)
+        return self
+
+    def fit(self, X: ModelInput, y: ArrayLike, epochs: int = 5) -> "OnlineExpenseModel":
+        """Learn a dataset in several passes, e.g. to start from the history."""
+        features = self._features(X)
+        labels = np.asarray(y, dtype=bool)
+        rng = np.random.default_rng(self.classifier.random_state)
+        for _ in range(epochs):
+            order = rng.permutation(len(labels))
+            self.classifier.partial_fit(features[order], labels[order], classes=CLASSES)
+        self.n_samples += len(labels)
+        return self
+
+    def predict_proba(self, X: ModelInput) -> np.ndarray:
+        return np.asarray(self.classifier.predict_proba(self._features(X)))
+
+    def predict(self, X: ModelInput) -> np.ndarray:
+        return np.asarray(self.classifier.predict(self._features(X)))
+
+    def _features(self, X: ModelInput) -> sp.csr_matrix:
+        if isinstance(X, Transaction):
+            X = X.to_dataframe()
+        elif isinstance(X, list):
+            X = TransactionBatch.from_transactions(X)
+        if isinstance(X, TransactionBatch):
+            X = X.to_dataframe(with_hash=False)
+        return self.features.transform(X)
+
+    def save(self, path: Path) -> None:
+        """Write the model to a joblib file atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "OnlineExpenseModel":
+        """Load a model written by ``save``.
+
+        Raises:
+            FileNotFoundError: If there is no model yet (see ``splitwise-sync
+                               learn``)
+            ValueError: If the file holds another kind of model
+        """
+        model = joblib.load(path)
+        if not isinstance(model, cls):
+            raise ValueError(f"{path} does not hold an {cls.__name__}")
+        return model
+
+
+def transaction_from_expense(expense: Any) -> Optional[Transaction]:
+    """The transaction an expense was created from, from its details footer.
+
+    Returns:
+        None for expenses not created by the sync
+    """
+    lines = (expense.getDetails() or "").splitlines()
+    if not lines:
+        return None
+    try:
+        return Transaction.from_dict(json.loads(lines[-1]))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def feedback_from_expenses(
+    expenses: Iterable[Any],
+) -> tuple[list[Transaction], list[bool]]:
+    """Transactions of the sync's expenses, shared if the expense was kept."""
+    transactions, labels = [], []
+    for expense in expenses:
+        transaction = transaction_from_expense(expense)
+        if transaction is not None:
+            transactions.append(transaction)
+            labels.append(expense.getDeletedAt() is None)
+    return transactions, labels
+
+
+def learn_from_feedback(
+    model: OnlineExpenseModel,
+    splitwise_client: Any,
+    model_path: Path,
+    state_path: Path,
+    delay: timedelta = timedelta(days=FEEDBACK_DELAY_DAYS),
+    now: Optional[datetime] = None,
+) -> int:
+    """Update the model with the expenses settled since the last update.
+
+    Expenses updated between the previous checkpoint and ``now - delay`` are
+    fetched in one request and learned in one ``partial_fit`` call. The model
+    is saved before the checkpoint is moved to ``now - delay``, so no
+    feedback is lost if saving fails.
+
+    Args:
+        model: The model to update
+        splitwise_client: ``SplitwiseClient`` to fetch the expenses with
+        model_path: File the updated model is saved to
+        state_path: JSON file keeping the checkpoint between runs
+        delay: Time the user has to correct an expense before it is learned
+        now: Current time, for tests
+
+    Returns:
+        The number of expenses learned
+    """
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    since = state.get("updated_before")
+    until = (now or datetime.now(timezone.utc)) - delay
+    if since is not None and datetime.fromisoformat(since) >= until:
+        return 0
+
+    expenses = splitwise_client.get_expenses(
+        limit=0,
+        return_deleted=True,
+        updated_after=since,
+        updated_before=until.isoformat(),
+    )
+    transactions, labels = feedback_from_expenses(expenses)
+    if transactions:
+        model.partial_fit(transactions, labels)
+        model.save(model_path)
+        logger.info(
+            f"Learned {len(labels)} expenses ({sum(labels)} shared) "
+            f"updated until {until:%Y-%m-%d %H:%M}"
+        )
+
+    state["updated_before"] = until.isoformat()
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=4))
+    tmp_path.replace(state_path)
+    return len(labels)
+
+
+def learn_dataset(
+    model: OnlineExpenseModel, path: Path, epochs: int = 5
+) -> OnlineExpenseModel:
+    """Learn a pickled training frame with an ``is_shared`` column."""
+    frame = pd.read_pickle(path)
+    logger.info(f"Learning {len(frame)} transactions from {path}")
+    return model.fit(frame, frame["is_shared"], epochs=epochs)
@@ -0,0 +1,329 @@
+"""Persistent cache of the model's predictions by merchant.
+
+Whether an expense is shared depends almost only on the merchant, and the
+same few hundred merchants come back every day. Predictions are stored in a
+SQLite database keyed by the model fingerprint (the hash of the model file),
+the merchant, an hour bucket, the weekday and a cost bucket, so most receipts
+are classified without loading the model at all.
+
+The hour and cost buckets are the intervals between the split thresholds the
+fitted tree uses on those features: all the values of a bucket take the same
+branches, so a cached prediction is the one the model would make. When the
+model cannot be compiled (see ``FastPredictor``) fixed buckets are used
+instead and predictions are approximate within a bucket. The buckets are
+stored with the fingerprint, and everything is dropped when the model file
+changes.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from splitwise_sync.config import DEFAULT_TIMEZONE, PREDICTION_CACHE_SIZE
+from splitwise_sync.core.models import Transaction, TransactionBatch
+
+from .fast_predictor import EXPORT_SUFFIX, MERCHANT_SLICE, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# buckets of costs when the tree thresholds are not available
+DEFAULT_COST_EDGES: list[float] = [1_000, 2_000, 5_000, 10_000, 20_000, 50_000, 100_000]
+
+
+class PredictionCache:
+    """Size-bounded LRU store of class probabilities for one model."""
+
+    def __init__(
+        self,
+        path: Path,
+        fingerprint: str,
+        max_entries: int = PREDICTION_CACHE_SIZE,
+    ) -> None:
+        """Open the cache, dropping the entries of any other model.
+
+        Args:
+            path: Path of the SQLite database file
+            fingerprint: Hash of the model file the predictions come from
+            max_entries: Number of predictions kept before evicting the least
+                         recently used ones
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, proba TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_used_at "
+                "ON predictions (used_at)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+            )
+        if self._get_meta("fingerprint") != fingerprint:
+            self.clear()
+        self._size = len(self)
+
+    def __enter__(self) -> "PredictionCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        count: int = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[
+            0
+        ]
+        return count
+
+    def clear(self) -> None:
+        """Drop every prediction and bucket, e.g. after the model changed."""
+        with self._conn:
+            self._conn.execute("DELETE FROM predictions")
+            self._conn.execute("DELETE FROM meta")
+            self._set_meta("fingerprint", self.fingerprint)
+        logger.info(f"Prediction cache {self.path} reset for model {self.fingerprint}")
+
+    @property
+    def model_info(self) -> Optional[dict[str, Any]]:
+        """Classes and bucket edges of the model, stored with its fingerprint."""
+        value = self._get_meta("model_info")
+        return None if value is None else json.loads(value)
+
+    @model_info.setter
+    def model_info(self, info: dict[str, Any]) -> None:
+        with self._conn:
+            self._set_meta("model_info", json.dumps(info))
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, list[float]]:
+        """Return the stored probabilities of some keys, marking them as used."""
+        found: dict[str, list[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):  # SQLite variable limit
+            chunk = unique[start : start + 500]
+            rows = self._conn.execute(
+                "SELECT key, proba FROM predictions WHERE key IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update((key, json.loads(proba)) for key, proba in rows)
+        if found:
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE predictions SET used_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def put_many(self, items: Iterable[tuple[str, Sequence[float]]]) -> None:
+        """Store probabilities, evicting the least recently used beyond the limit."""
+        now = time.time()
+        rows = [(key, json.dumps(list(proba)), now) for key, proba in items]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO predictions (key, proba, used_at) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+        self._size += len(rows)
+        if self._size > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        # evict down to 90% of the limit so this does not run on every put
+        excess = len(self) - int(self.max_entries * 0.9)
+        if excess > 0:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+            logger.debug(f"Evicted {excess} predictions from {self.path}")
+        self._size = len(self)
+
+    def _get_meta(self, name: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE name = ?", (name,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, name: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        )
+
+    def close(self) -> None:
+        """Log the hit rate and close the database."""
+        total = self.hits + self.misses
+        if total:
+            logger.info(
+                f"Prediction cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hits / total:.0%} hit rate)"
+            )
+        self._conn.close()
+
+
+class CachedModel:
+    """``ExpenseModel`` stand-in answering from a ``PredictionCache`` first.
+
+    The model is only loaded when a transaction misses the cache.
+    """
+
+    def __init__(
+        self,
+        cache: PredictionCache,
+        load_model: Callable[[], Any],
+        timezone: str = DEFAULT_TIMEZONE,
+    ):
+        """Wrap a model loader with a cache.
+
+        Args:
+            cache: Cache opened with the fingerprint of the model file
+            load_model: Returns the model (e.g. ``ExpenseModel(path)``)
+            timezone: Time zone of the hour and weekday in the keys
+        """
+        self.cache = cache
+        self._load_model = load_model
+        self._model: Optional[Any] = None
+        self._tz = ZoneInfo(timezone)
+
+    @classmethod
+    def open(
+        cls, cache_path: Path, model_path: Path, load_model: Callable[[Path], Any]
+    ) -> "CachedModel":
+        """Cache the predictions of a model file (or of its NumPy export)."""
+        model_path = Path(model_path)
+        source = model_path
+        if not source.exists():
+            source = model_path.with_suffix(EXPORT_SUFFIX)
+        cache = PredictionCache(cache_path, fingerprint=file_sha256(source))
+        return cls(cache, lambda: load_model(model_path))
+
+    @property
+    def model(self) -> Any:
+        """The wrapped model, loaded on first use."""
+        return self.load()
+
+    def load(self) -> Any:
+        """Load the model if needed, storing its classes and bucket edges."""
+        if self._model is None:
+            self._model = self._load_model()
+            logger.debug("Loaded the model for prediction cache misses")
+            if self.cache.model_info is None:
+                self.cache.model_info = {
+                    "classes": np.asarray(self._model.classes).tolist(),
+                    "edges": _tree_edges(self._model),
+                }
+        return self._model
+
+    @property
+    def model_info(self) -> dict[str, Any]:
+        """Classes and bucket edges, loading the model if they are not stored."""
+        info = self.cache.model_info
+        if info is None:
+            self.load()
+            info = self.cache.model_info
+            assert info is not None, "load() stores the model info"
+        return info
+
+    @property
+    def classes(self) -> np.ndarray:
+        return np.asarray(self.model_info["classes"])
+
+    def key(self, transaction: Transaction, edges: dict[str, Any]) -> str:
+        """Cache key: model, merchant, hour bucket, weekday and cost bucket."""
+        date = transaction.date
+        if date.tzinfo is not None:
+            date = date.astimezone(self._tz)
+        cost = float(np.float32(transaction.cost))  # as the tree compares it
+        return json.dumps(
+            [
+                self.cache.fingerprint[:16],
+                transaction.description[MERCHANT_SLICE].strip(),
+                _bucket(date.hour, edges.get("hour")),
+                date.weekday(),
+                _bucket(cost, edges.get("transaction_cost")),
+            ]
+        )
+
+    def predict_proba(self, X: Transaction | Iterable[Transaction]) -> np.ndarray:
+        """Class probabilities, from the cache or one model call for the misses."""
+        transactions = [X] if isinstance(X, Transaction) else list(X)
+        if not transactions:
+            return np.empty((0, len(self.classes)))
+        edges = self.model_info["edges"]
+        keys = [self.key(t, edges) for t in transactions]
+        found = self.cache.get_many(keys)
+
+        # first transaction of each key not in the cache, scored together
+        missing: dict[str, int] = {}
+        for i, key in enumerate(keys):
+            if key not in found:
+                missing.setdefault(key, i)
+        self.cache.hits += len(transactions) - len(missing)
+        self.cache.misses += len(missing)
+        if missing:
+            batch = TransactionBatch.from_transactions(
+                transactions[i] for i in missing.values()
+            )
+            proba = np.asarray(self.model.predict_proba(batch))
+            new = {key: row.tolist() for key, row in zip(missing, proba)}
+            self.cache.put_many(new.items())
+            found.update(new)
+        return np.array([found[key] for key in keys], dtype="float64")
+
+    def predict(self, X: Transaction | Iterable[Transaction]) -> np.ndarray:
+        """Predicted classes, from the cached probabilities."""
+        proba = self.predict_proba(X)
+        return np.asarray(self.classes)[np.argmax(proba, axis=1)]
+
+    def close(self) -> None:
+        self.cache.close()
+
+
+def _bucket(value: float, edges: Optional[list[float]]) -> float:
+    """Number of edges below a value, or the value itself without edges."""
+    return value if edges is None else bisect_left(edges, value)
+
+
+def _tree_edges(model: Any) -> dict[str, Optional[list[float]]]:
+    """Split thresholds of the compiled tree on the cost and the hour."""
+    predictor = getattr(model, "fast_predictor", None)
+    if predictor is None:
+        logger.warning("Model not compiled, caching predictions by cost ranges")
+        return {"transaction_cost": DEFAULT_COST_EDGES, "hour": None}
+
+    edges: dict[str, Optional[list[float]]] = {}
+    offset = len(predictor.vocabulary)
+    for name in ("transaction_cost", "hour"):
+        if name not in predictor.numeric_features:
+            edges[name] = None
+            continue
+        column = offset + predictor.numeric_features.index(name)
+        edges[name] = sorted(
+            {
+                t
+                for f, t, left in zip(
+                    predictor.feature, predictor.threshold, predictor.children_left
+                )
+                if f == column and left != -1
+            }
+        )
+    return edges
@@ -0,0 +1,206 @@
+"""Training of the expense model with cached features and parallel search.
+
+A ``GridSearchCV`` over the whole pipeline fits the features again for every
+candidate of every fold, although only the tree parameters change. Here the
+features are fitted once per fold, through a ``joblib.Memory`` keyed by a
+hash of the data and the rows of the fold, so a later run on the same data
+(e.g. trying other depths) loads them instead of fitting them. The trees of
+all the candidates and folds are then fitted in parallel on those matrices.
+
+The cache is keyed by one hash of the data per run: caching the steps of the
+pipeline instead (``Pipeline(memory=...)``) hashes the whole frame for each
+candidate of each fold, which costs more than fitting the features.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.pipeline import FeatureUnion, Pipeline, make_pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from .preprocessing import build_preprocess
+
+logger = logging.getLogger(__name__)
+
+INPUT_FEATURES = ["transaction_cost", "transaction_date", "transaction_description"]
+TARGET = "is_shared"
+
+# tree parameters tried by default, around those of the "02 expense
+# prediction" notebook
+DEFAULT_PARAM_GRID: dict[str, list[Any]] = {
+    "max_depth": [4, 6, 8, 10],
+    "min_samples_leaf": [1, 5, 10],
+    "min_samples_split": [5],
+}
+SCORING = ["accuracy", "precision", "recall", "f1", "roc_auc"]
+
+
+def train(
+    frame: pd.DataFrame,
+    param_grid: Optional[dict[str, list[Any]]] = None,
+    cv: int = 5,
+    scoring: str = "f1",
+    n_jobs: Optional[int] = None,
+    cache_dir: Optional[Path] = None,
+    random_state: int = 42,
+) -> tuple[Pipeline, dict[str, Any]]:
+    """Search the tree parameters by cross-validation and fit the best model.
+
+    Args:
+        frame: Matched transactions with the input features and ``is_shared``
+        param_grid: Values of the ``DecisionTreeClassifier`` parameters to try
+        cv: Number of stratified folds
+        scoring: Metric choosing the best parameters, one of ``SCORING``
+        n_jobs: Processes fitting folds and candidates, -1 for all the CPUs
+        cache_dir: Directory caching the fitted features, None to disable
+        random_state: Seed of the folds and of the trees
+
+    Returns:
+        The best pipeline, fitted on the whole frame, and its metrics
+    """
+    param_grid = DEFAULT_PARAM_GRID if param_grid is None else param_grid
+    candidates = list(ParameterGrid(param_grid))
+    X = frame[INPUT_FEATURES]
+    y = frame[TARGET].to_numpy(dtype=bool)
+    folds = list(
+        StratifiedKFold(cv, shuffle=True, random_state=random_state).split(X, y)
+    )
+    fit_features = joblib.Memory(cache_dir, verbose=0).cache(
+        _fit_features, ignore=["X", "y"]
+    )
+    data_hash = joblib.hash((X, y))
+    parallel = Parallel(n_jobs=n_jobs)
+
+    start = time.perf_counter()
+    # the folds, then all the rows for the final model
+    fitted = parallel(
+        delayed(fit_features)(build_preprocess(verbose=False), X, y, rows, data_hash)
+        for rows in [train_rows for train_rows, _ in folds] + [np.arange(len(y))]
+    )
+    features_seconds = time.perf_counter() - start
+
+    scores = parallel(
+        delayed(_score_tree)(params, matrix, y, train_rows, test_rows, random_state)
+        for params in candidates
+        for (_, matrix), (train_rows, test_rows) in zip(fitted, folds)
+    )
+    scores = {
+        name: np.array([s[name] for s in scores]).reshape(len(candidates), cv)
+        for name in SCORING
+    }
+    best = int(np.argmax(scores[scoring].mean(axis=1)))
+
+    preprocess, matrix = fitted[-1]
+    tree = DecisionTreeClassifier(random_state=random_state, **candidates[best])
+    pipeline = make_pipeline(preprocess, tree.fit(matrix, y))
+    seconds = time.perf_counter() - start
+
+    metrics = {
+        "n_samples": len(y),
+        "shared_rate": float(y.mean()),
+        "cv_folds": cv,
+        "scoring": scoring,
+        "random_state": random_state,
+        "param_grid": param_grid,
+        "best_params": candidates[best],
+        "cv_scores": {
+            name: {
+                "mean": float(scores[name][best].mean()),
+                "std": float(scores[name][best].std()),
+            }
+            for name in SCORING
+        },
+        "candidates": [
+            {
+                "params": params,
+                **{name: float(scores[name][i].mean()) for name in SCORING},
+            }
+            for i, params in enumerate(candidates)
+        ],
+        "features_seconds": features_seconds,
+        "search_seconds": seconds,
+        "sklearn_version": sklearn.__version__,
+    }
+    logger.info(
+        f"Best {scoring} {metrics['cv_scores'][scoring]['mean']:.4f} with "
+        f"{candidates[best]} ({len(candidates)} candidates, {seconds:.1f}s of "
+        f"which {features_seconds:.1f}s fitting features)"
+    )
+    return pipeline, metrics
+
+
+def save_model(
+    pipeline: Pipeline,
+    metrics: dict[str, Any],
+    output_dir: Path,
+    name: str = "decision_tree_model",
+    version: Optional[str] = None,
+) -> tuple[Path, Path]:
+    """Write a model and its metrics under a new version.
+
+    Args:
+        pipeline: The fitted pipeline
+        metrics: Metrics of the model, saved as JSON next to it
+        output_dir: Directory of the models
+        name: Name of the model files, before the version
+        version: Version of the model, the UTC time by default
+
+    Returns:
+        The paths of the model (``<name>-<version>.pkl``) and of its metrics
+        (``<name>-<version>.metrics.json``)
+    """
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / f"{name}-{version}.pkl"
+    metrics_path = output_dir / f"{name}-{version}.metrics.json"
+    joblib.dump(pipeline, model_path)
+    metrics_path.write_text(
+        json.dumps({"version": version, **metrics}, indent=4) + "\n"
+    )
+    return model_path, metrics_path
+
+
+def _fit_features(
+    preprocess: FeatureUnion,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    rows: np.ndarray,
+    data_hash: str,
+) -> tuple[FeatureUnion, sparse.csr_matrix]:
+    """Fit the features on some rows and build them for all the rows.
+
+    ``X`` and ``y`` are left out of the cache key, ``data_hash`` stands for
+    them.
+    """
+    preprocess = clone(preprocess).fit(X.iloc[rows], y[rows])
+    return preprocess, sparse.csr_matrix(preprocess.transform(X))
+
+
+def _score_tree(
+    params: dict[str, Any],
+    matrix: sparse.csr_matrix,
+    y: np.ndarray,
+    train_rows: np.ndarray,
+    test_rows: np.ndarray,
+    random_state: int,
+) -> dict[str, float]:
+    """Fit a tree on the rows of a fold and score it on the others."""
+    tree = DecisionTreeClassifier(random_state=random_state, **params)
+    tree.fit(matrix[train_rows], y[train_rows])
+    return {
+        name: get_scorer(name)(tree, matrix[test_rows], y[test_rows])
+        for name in SCORING
+    }
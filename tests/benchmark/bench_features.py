@@ -0,0 +1,108 @@
+"""Benchmark of the fused feature extraction against the per-column one.
+
+Run from the repository root:
+
+    python -m tests.benchmark.bench_features
+    python -m tests.benchmark.bench_features --data other_dataset.pkl
+
+The training set (``data/processed/matched_transactions_locs.pkl``) is used
+when present, otherwise a synthetic set of ``--size`` receipts. Both layouts
+of ``build_preprocess`` are fitted and applied (best of ``--repeat`` runs),
+and the run fails if they do not build the same feature matrix.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from splitwise_sync.config import PROCESSED_DIR
+from splitwise_sync.ml.preprocessing import build_preprocess
+
+from .corpus import generate_corpus
+
+DATA_PATH = PROCESSED_DIR / "matched_transactions_locs.pkl"
+
+
+def synthetic_frame(size: int, seed: int = 0) -> pd.DataFrame:
+    """Training columns of the receipts of the synthetic corpus."""
+    corpus = generate_corpus(size, seed=seed, html_ratio=1.0)  # bodies unused
+    return pd.DataFrame(
+        {
+            "transaction_description": [r.description for r in corpus],
+            "transaction_cost": [r.cost for r in corpus],
+            "transaction_date": pd.to_datetime([r.date for r in corpus]),
+        }
+    )
+
+
+def _time(func: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Best time of calling ``func``, and its last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(frame: pd.DataFrame, repeat: int = 3) -> dict[str, dict[str, float]]:
+    """Time fitting and applying both feature layouts on a frame.
+
+    Returns:
+        Seconds of ``fit_transform`` and ``transform`` of each layout, keyed
+        by "fused" and "per_column"
+
+    Raises:
+        AssertionError: If the layouts build different matrices
+    """
+    results: dict[str, dict[str, float]] = {}
+    matrices = {}
+    for name, fused in (("per_column", False), ("fused", True)):
+        preprocess = build_preprocess(verbose=False, fused=fused)
+        fit_seconds, _ = _time(lambda: preprocess.fit_transform(frame), repeat)
+        seconds, matrix = _time(lambda: preprocess.transform(frame), repeat)
+        results[name] = {"fit_transform": fit_seconds, "transform": seconds}
+        matrices[name] = matrix
+
+    fused, per_column = matrices["fused"], matrices["per_column"]
+    assert fused.shape == per_column.shape, "The layouts have different columns"
+    assert (fused != per_column).nnz == 0, "The layouts build different features"
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", type=Path, default=DATA_PATH, help="Pickled frame")
+    parser.add_argument(
+        "--size", type=int, default=5000, help="Synthetic set size without data"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per step")
+    args = parser.parse_args()
+
+    if args.data.exists():
+        frame = pd.read_pickle(args.data)
+        print(f"{len(frame)} transactions from {args.data}")
+    else:
+        frame = synthetic_frame(args.size)
+        print(f"{args.data} not found, using {len(frame)} synthetic transactions")
+
+    try:
+        results = run_benchmark(frame, repeat=args.repeat)
+    except AssertionError as exc:
+        print(f"MISMATCH {exc}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{'step':<15} {'per column':>12} {'fused':>12} {'speedup':>10}")
+    for step in ("fit_transform", "transform"):
+        before, after = results["per_column"][step], results["fused"][step]
+        speedup = before / after if after else np.inf
+        print(f"{step:<15} {before:>11.4f}s {after:>11.4f}s {speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
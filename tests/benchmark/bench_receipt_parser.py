@@ -0,0 +1,175 @@
+"""Benchmark of the receipt parser stages on a synthetic corpus.
+
+Run from the repository root:
+
+    python -m tests.benchmark.bench_receipt_parser
+    python -m tests.benchmark.bench_receipt_parser --save-baseline
+
+Every stage is timed over the whole corpus (best of ``--repeat`` runs) and
+compared with the stored baseline. The run fails when the throughput of any
+stage drops by more than ``--threshold`` (0.5 by default: half as fast).
+Timings depend on the machine, so save a new baseline when switching
+hardware.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+from .corpus import SyntheticReceipt, generate_corpus
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.5
+
+
+def _time(func: Callable[[Any], Any], items: list[Any], repeat: int) -> float:
+    """Best total time of calling ``func`` on every item."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(
+    corpus: list[SyntheticReceipt], repeat: int = 3
+) -> dict[str, dict[str, float]]:
+    """Time each stage of ``ReceiptParser`` on the corpus.
+
+    Returns:
+        Seconds and messages per second of each stage, keyed by stage name
+    """
+    parser = ReceiptParser()
+    messages = [receipt.message for receipt in corpus]
+    raw_bodies = [message.body for message in messages]
+    bodies = [parser._clean_body(body) for body in raw_bodies]
+
+    stages: dict[str, tuple[Callable[[Any], Any], list[Any]]] = {
+        "clean_body": (parser._clean_body, raw_bodies),
+        "extract_fast": (parser._extract_fast, bodies),
+        "extract_transaction_text": (parser._extract_transaction_text, bodies),
+        "extract_amount_and_currency": (parser._extract_amount_and_currency, bodies),
+        "extract_card_number": (parser._extract_card_number, bodies),
+        "extract_merchant": (parser._extract_merchant, bodies),
+        "extract_transaction_date": (parser._extract_transaction_date, bodies),
+        "parse_email": (parser.parse_email, messages),
+    }
+
+    results = {}
+    for name, (func, items) in stages.items():
+        seconds = _time(func, items, repeat)
+        results[name] = {
+            "seconds": seconds,
+            "msgs_per_sec": len(items) / seconds if seconds else float("inf"),
+        }
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> list[str]:
+    """List the stages whose throughput fell more than ``threshold``.
+
+    Args:
+        results: Output of ``run_benchmark``
+        baseline: Stored output of a previous run
+        threshold: Allowed relative drop of messages per second
+
+    Returns:
+        A description of each regressed stage
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]["msgs_per_sec"]
+        ratio = result["msgs_per_sec"] / expected
+        if ratio < 1 - threshold:
+            regressions.append(
+                f"{name}: {result['msgs_per_sec']:.0f} msgs/s is {ratio:.0%} "
+                f"of the baseline {expected:.0f} msgs/s"
+            )
+    return regressions
+
+
+def _print_report(
+    results: dict[str, dict[str, float]],
+    baseline: Optional[dict[str, dict[str, float]]],
+) -> None:
+    print(f"{'stage':<30} {'seconds':>10} {'msgs/s':>12} {'vs baseline':>12}")
+    for name, result in results.items():
+        change = ""
+        if baseline and name in baseline:
+            change = f"{result['msgs_per_sec'] / baseline[name]['msgs_per_sec']:.0%}"
+        print(
+            f"{name:<30} {result['seconds']:>10.4f} "
+            f"{result['msgs_per_sec']:>12.0f} {change:>12}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=500, help="Corpus size")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed relative throughput drop before failing "
+        f"(default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the new baseline",
+    )
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.size, seed=args.seed)
+    results = run_benchmark(corpus, repeat=args.repeat)
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    baseline = stored["stages"] if stored else None
+    _print_report(results, baseline)
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "size": args.size,
+                    "seed": args.seed,
+                    "stages": results,
+                },
+                indent=4,
+            )
+            + "\n"
+        )
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if baseline is None:
+        print("No baseline found, run with --save-baseline to create one")
+        return
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Reproducible synthetic corpus of Banco de Chile receipt emails.
+
+Receipts are generated from the ``tests/unit/email-body.txt`` template by
+replacing its purchase sentence with random amounts, currencies, cards,
+merchants and dates. Each receipt keeps the values it was generated from, so
+the corpus can also be used to check the parser output.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from html import escape
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from splitwise_sync.core.html_text import html_to_text
+from splitwise_sync.core.models import EmailMessage
+
+TEMPLATE_PATH = Path(__file__).parent.parent / "unit" / "email-body.txt"
+TEMPLATE_SENTENCE = (
+    "una compra por $1.190 con Tarjeta de Cr&eacute;dito ****7766 en "
+    "SPID MUT - O871        SANTIAGO      CHL el 19/04/2025 14:33"
+)
+
+MERCHANTS = [
+    "SPID MUT - O871        SANTIAGO      CHL",
+    "LIDER EXPRESS PROVIDENCIA  SANTIAGO      CHL",
+    "FARMACIA AHUMADA 123       LAS CONDES    CHL",
+    "COPEC APP                  SANTIAGO      CHL",
+    "MERPAGO*CAFE DEL MUNDO     SANTIAGO      CHL",
+    "JUMBO COSTANERA            SANTIAGO      CHL",
+    "PANADERÍA ÑUÑOA            ÑUÑOA         CHL",
+    "SUMUP *BOTILLERIA          VALPARAISO    CHL",
+    "UBER *TRIP",
+    "NETFLIX.COM",
+    "AMAZON MKTPL*2X4",
+    "Spotify P1C2",
+    "Uber Eats",
+]
+CARD_TYPES = ["Tarjeta de Crédito", "Tarjeta de Débito"]
+TIMEZONE = ZoneInfo("America/Santiago")
+
+
+@dataclass(frozen=True)
+class SyntheticReceipt:
+    """A generated receipt email and the transaction values it contains."""
+
+    message: EmailMessage
+    cost: float
+    currency_code: str
+    card_number: str
+    description: str
+    date: datetime
+
+
+def _format_clp(value: int) -> str:
+    return f"{value:,}".replace(",", ".")
+
+
+def _random_amount(rng: random.Random) -> tuple[str, float, str]:
+    """Return the amount text, its value and currency."""
+    if rng.random() < 0.2:
+        cents = rng.randint(100, 50_000)
+        text = f"US${_format_clp(cents // 100)},{cents % 100:02d}"
+        return text, cents / 100, "US"
+    value = rng.choice([rng.randint(100, 9_999), rng.randint(10_000, 999_999)])
+    return f"${_format_clp(value)}", float(value), "CLP"
+
+
+def generate_corpus(
+    size: int, seed: int = 0, html_ratio: float = 0.5
+) -> list[SyntheticReceipt]:
+    """Generate a reproducible list of receipts.
+
+    Args:
+        size: Number of receipts to generate
+        seed: Seed of the random generator, the same seed gives the same corpus
+        html_ratio: Fraction of receipts with an HTML body; the rest get the
+                    plain text version of the same email
+
+    Returns:
+        The generated receipts
+    """
+    rng = random.Random(seed)
+    template = TEMPLATE_PATH.read_text(encoding="utf-8")
+    start = datetime(2024, 1, 1, tzinfo=TIMEZONE)
+
+    receipts = []
+    for uid in range(size):
+        amount_text, cost, currency = _random_amount(rng)
+        card_number = f"{rng.randint(0, 9999):04d}"
+        merchant = rng.choice(MERCHANTS)
+        date = start + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))
+        sentence = (
+            f"una compra por {amount_text} con {escape(rng.choice(CARD_TYPES))} "
+            f"****{card_number} en {escape(merchant)} el "
+            f"{date:%d/%m/%Y %H:%M}"
+        )
+        body = template.replace(TEMPLATE_SENTENCE, sentence)
+        if rng.random() >= html_ratio:
+            body = html_to_text(body)
+
+        message = EmailMessage(
+            uid=str(uid),
+            subject="Compra con tu Tarjeta de Crédito Banco de Chile",
+            sender="enviodigital@bancoedwards.cl",
+            to="user@gmail.com",
+            date=date,
+            body=body,
+        )
+        receipts.append(
+            SyntheticReceipt(
+                message=message,
+                cost=cost,
+                currency_code=currency,
+                card_number=card_number,
+                description=merchant,
+                date=date,
+            )
+        )
+    return receipts
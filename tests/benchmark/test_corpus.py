@@ -0,0 +1,53 @@
+"""Tests for the benchmark corpus and regression check."""
+
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+from . import bench_features
+from .bench_receipt_parser import find_regressions, run_benchmark
+from .corpus import generate_corpus
+
+
+def test_corpus_is_reproducible():
+    """Test that the same seed gives the same corpus."""
+    assert generate_corpus(20, seed=3) == generate_corpus(20, seed=3)
+    assert generate_corpus(20, seed=3) != generate_corpus(20, seed=4)
+
+
+def test_parser_extracts_corpus_values():
+    """Test that the parser recovers the generated values of every receipt."""
+    parser = ReceiptParser()
+    corpus = generate_corpus(300, seed=1)
+
+    assert any("<html" in receipt.message.body for receipt in corpus)
+    assert any("<html" not in receipt.message.body for receipt in corpus)
+    for receipt in corpus:
+        transaction = parser.parse_email(receipt.message)
+        assert transaction.cost == receipt.cost
+        assert transaction.currency_code == receipt.currency_code
+        assert transaction.card_number == receipt.card_number
+        assert transaction.description == receipt.description
+        assert transaction.date == receipt.date
+
+
+def test_find_regressions():
+    """Test that only stages slower than the threshold are reported."""
+    results = run_benchmark(generate_corpus(5), repeat=1)
+    baseline = {
+        name: {"seconds": 0.0, "msgs_per_sec": result["msgs_per_sec"]}
+        for name, result in results.items()
+    }
+    baseline["parse_email"]["msgs_per_sec"] *= 3
+
+    regressions = find_regressions(results, baseline, threshold=0.5)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("parse_email:")
+
+
+def test_feature_benchmark():
+    """Test that the feature benchmark times both layouts of the features."""
+    frame = bench_features.synthetic_frame(50, seed=2)
+
+    results = bench_features.run_benchmark(frame, repeat=1)
+
+    assert set(results) == {"per_column", "fused"}
@@ -0,0 +1,213 @@
+"""Minimal in-process IMAP server used as a stand-in for Gmail in e2e tests.
+
+It implements just enough of IMAP4rev1 for ``ImapEmailClient``: LOGIN, SELECT,
+STATUS, NOOP, IDLE, UID SEARCH (UNSEEN, FROM, UID ranges), UID FETCH of whole
+messages, UID STORE, EXPUNGE and LOGOUT. Appending a message notifies every
+idling connection with an ``EXISTS`` response.
+"""
+
+import re
+import socket
+import socketserver
+import threading
+from dataclasses import dataclass, field
+from email import message_from_bytes
+
+UIDVALIDITY = 1
+
+
+@dataclass
+class StoredMessage:
+    uid: int
+    raw: bytes
+    flags: set[str] = field(default_factory=set)
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """Threaded IMAP server holding a single INBOX in memory."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _ImapHandler)
+        self.messages: list[StoredMessage] = []
+        self.lock = threading.Lock()
+        self.idlers: set["_ImapHandler"] = set()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self) -> "FakeImapServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def append(self, raw: bytes) -> int:
+        """Store a new message and notify idling clients. Returns its UID."""
+        with self.lock:
+            uid = self.messages[-1].uid + 1 if self.messages else 1
+            self.messages.append(StoredMessage(uid=uid, raw=raw))
+            exists = len(self.messages)
+            idlers = list(self.idlers)
+        for handler in idlers:
+            handler.send(f"* {exists} EXISTS")
+        return uid
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+    server: FakeImapServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.write_lock = threading.Lock()
+
+    def send(self, line: str, literal: bytes = b"") -> None:
+        with self.write_lock:
+            try:
+                self.wfile.write(line.encode() + b"\r\n" + literal)
+                self.wfile.flush()
+            except OSError:
+                pass
+
+    def handle(self) -> None:
+        self.send("* OK [CAPABILITY IMAP4rev1 IDLE] fake server ready")
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line:
+                return
+            tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if command == "UID":
+                command, _, args = args.partition(" ")
+                command = f"UID {command.upper()}"
+
+            handler = getattr(self, "do_" + command.replace(" ", "_"), None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {command}")
+                continue
+            if handler(tag, args) is False:
+                return
+
+    def do_CAPABILITY(self, tag: str, args: str) -> None:
+        self.send("* CAPABILITY IMAP4rev1 IDLE")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    def do_LOGIN(self, tag: str, args: str) -> None:
+        self.send(f"{tag} OK LOGIN completed")
+
+    def do_NOOP(self, tag: str, args: str) -> None:
+        self.send(f"{tag} OK NOOP completed")
+
+    def do_SELECT(self, tag: str, args: str) -> None:
+        with self.server.lock:
+            exists = len(self.server.messages)
+            uidnext = self._uidnext()
+        self.send(f"* {exists} EXISTS")
+        self.send(f"* OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {uidnext}] Predicted next UID")
+        self.send(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    def do_STATUS(self, tag: str, args: str) -> None:
+        folder = args.split(" ")[0]
+        with self.server.lock:
+            exists = len(self.server.messages)
+            uidnext = self._uidnext()
+        self.send(
+            f"* STATUS {folder} (MESSAGES {exists} "
+            f"UIDNEXT {uidnext} UIDVALIDITY {UIDVALIDITY})"
+        )
+        self.send(f"{tag} OK STATUS completed")
+
+    def do_IDLE(self, tag: str, args: str) -> None:
+        self.send("+ idling")
+        with self.server.lock:
+            self.server.idlers.add(self)
+        try:
+            self.rfile.readline()  # DONE
+        finally:
+            with self.server.lock:
+                self.server.idlers.discard(self)
+        self.send(f"{tag} OK IDLE terminated")
+
+    def do_UID_SEARCH(self, tag: str, args: str) -> None:
+        with self.server.lock:
+            uids = [str(msg.uid) for msg in self.server.messages if _matches(msg, args)]
+        self.send("* SEARCH " + " ".join(uids))
+        self.send(f"{tag} OK SEARCH completed")
+
+    def do_UID_FETCH(self, tag: str, args: str) -> None:
+        uid_set, _, items = args.partition(" ")
+        peek = "BODY.PEEK[]" in items.upper()
+        with self.server.lock:
+            wanted = [msg for msg in self.server.messages if _in_set(msg.uid, uid_set)]
+            for msg in wanted:
+                if not peek:
+                    msg.flags.add("\\Seen")
+        for seq, msg in enumerate(wanted, start=1):
+            flags = " ".join(sorted(msg.flags))
+            self.send(
+                f"* {seq} FETCH (UID {msg.uid} FLAGS ({flags}) "
+                f"RFC822.SIZE {len(msg.raw)} BODY[] {{{len(msg.raw)}}}",
+                msg.raw,
+            )
+            self.send(")")
+        self.send(f"{tag} OK FETCH completed")
+
+    def do_UID_STORE(self, tag: str, args: str) -> None:
+        uid_set, mode, flags = args.split(" ", 2)
+        flag_set = set(flags.strip("()").split())
+        with self.server.lock:
+            for msg in self.server.messages:
+                if _in_set(msg.uid, uid_set):
+                    if mode.startswith("+"):
+                        msg.flags |= flag_set
+                    else:
+                        msg.flags -= flag_set
+        self.send(f"{tag} OK STORE completed")
+
+    def do_EXPUNGE(self, tag: str, args: str) -> None:
+        self.send(f"{tag} OK EXPUNGE completed")
+
+    def do_LOGOUT(self, tag: str, args: str) -> bool:
+        self.send("* BYE logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        return False
+
+    def _uidnext(self) -> int:
+        return self.server.messages[-1].uid + 1 if self.server.messages else 1
+
+
+def _in_set(uid: int, uid_set: str) -> bool:
+    for chunk in uid_set.split(","):
+        start, _, end = chunk.partition(":")
+        high = uid if end == "*" else int(end or start)
+        if int(start) <= uid <= high:
+            return True
+    return False
+
+
+def _matches(msg: StoredMessage, criteria: str) -> bool:
+    criteria = re.sub(r"^CHARSET \S+ ", "", criteria, flags=re.I)
+    if "UNSEEN" in criteria.upper() and "\\Seen" in msg.flags:
+        return False
+    sender = re.search(r'FROM "([^"]*)"', criteria, re.I)
+    if sender and sender.group(1) not in str(message_from_bytes(msg.raw)["From"]):
+        return False
+    uid_range = re.search(r"UID (\S+?)\)?(?:\s|$)", criteria, re.I)
+    if uid_range and not _in_set(msg.uid, uid_range.group(1)):
+        return False
+    return True
@@ -0,0 +1,104 @@
+"""End-to-end test of the IDLE watch mode against a local IMAP server."""
+
+import logging
+import threading
+import time
+from email.message import EmailMessage as MimeMessage
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from splitwise_sync.cli.batch import SplitwiseSync
+from splitwise_sync.core.email_client import EmailCredentials, ImapEmailClient
+
+from .imap_server import FakeImapServer
+
+logger = logging.getLogger(__name__)
+
+SENDER = "enviodigital@bancoedwards.cl"
+
+
+def receipt(body: str) -> bytes:
+    msg = MimeMessage()
+    msg["From"] = f"Banco de Chile <{SENDER}>"
+    msg["To"] = "user@gmail.com"
+    msg["Subject"] = "Compra con tu Tarjeta de Crédito"
+    msg["Date"] = "Sat, 19 Apr 2025 14:40:00 -0400"
+    msg.set_content(body, subtype="html")
+    return msg.as_bytes()
+
+
+@pytest.fixture
+def email_body() -> str:
+    path = Path(__file__).parent.parent / "unit" / "email-body.txt"
+    return path.read_text(encoding="utf-8")
+
+
+@pytest.fixture
+def server():
+    with FakeImapServer() as server:
+        yield server
+
+
+@pytest.fixture
+def app(server: FakeImapServer):
+    client = ImapEmailClient(
+        EmailCredentials(username="user", password="secret"),
+        imap_server="127.0.0.1",
+        port=server.port,
+        use_ssl=False,
+    )
+    with (
+        patch("splitwise_sync.cli.batch.ImapEmailClient", return_value=client),
+        patch("splitwise_sync.cli.batch.SplitwiseClient"),
+        patch("splitwise_sync.cli.batch.ExpenseModel"),
+        patch("splitwise_sync.cli.batch.processed_logger"),
+    ):
+        app = SplitwiseSync()
+        app.model.predict.return_value = [1]
+        yield app
+        app.close()
+
+
+def test_watch_creates_expense_on_new_email(
+    app: SplitwiseSync, server: FakeImapServer, email_body: str
+):
+    """Test that an email pushed while idling becomes an expense quickly."""
+    created = threading.Event()
+    created_at: list[float] = []
+
+    def create_expense(transaction, split=None):
+        created_at.append(time.perf_counter())
+        created.set()
+        return app.splitwise_client.create_expense.return_value
+
+    app.splitwise_client.create_expense.side_effect = create_expense
+
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=app.watch, kwargs={"idle_timeout": 1, "stop": stop}, daemon=True
+    )
+    watcher.start()
+    # wait for the initial catch-up run to finish and IDLE to start
+    deadline = time.perf_counter() + 5
+    while not server.idlers and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert server.idlers, "watch mode never entered IDLE"
+
+    sent_at = time.perf_counter()
+    server.append(receipt(email_body))
+
+    assert created.wait(timeout=5), "no expense created for the new email"
+    latency = created_at[0] - sent_at
+    # shown with pytest --log-cli-level=INFO
+    logger.info(f"notification-to-expense latency: {latency * 1000:.1f} ms")
+    assert latency < 5
+
+    [call] = app.splitwise_client.create_expense.call_args_list
+    assert call.args[0].cost == 1190.0
+    assert "\\Seen" in server.messages[0].flags
+
+    stop.set()
+    watcher.join(timeout=10)
+    assert not watcher.is_alive()
@@ -0,0 +1,53 @@
+"""Fixtures shared by the unit tests of the expense model."""
+
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+from sklearn.pipeline import make_pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.preprocessing import build_preprocess
+
+MERCHANTS = [
+    "SPID MUT - O871        SANTIAGO      CHL",
+    "LIDER EXPRESS PROVIDENCIA  SANTIAGO      CHL",
+    "JUMBO COSTANERA            SANTIAGO      CHL",
+    "MERPAGO*CAFE DEL MUNDO     SANTIAGO      CHL",
+    "PANADERÍA ÑUÑOA            ÑUÑOA         CHL",
+    "UBER *TRIP",
+    "NETFLIX.COM",
+]
+
+
+@pytest.fixture(scope="session")
+def training_transactions() -> list[Transaction]:
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1, tzinfo=ZoneInfo("America/Santiago"))
+    return [
+        Transaction(
+            cost=rng.choice([rng.randint(500, 9_999), rng.randint(10_000, 99_999)])
+            + rng.choice([0.0, 0.49]),
+            currency_code="CLP",
+            date=start + timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            description=rng.choice(MERCHANTS),
+            card_number="7766",
+            details="",
+        )
+        for _ in range(400)
+    ]
+
+
+@pytest.fixture(scope="session")
+def fitted_pipeline(training_transactions: list[Transaction]):
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    y = frame["transaction_description"].str.contains("JUMBO|UBER") | (
+        (frame["transaction_cost"] > 20_000) & (frame["transaction_date"].dt.hour > 12)
+    )
+    pipeline = make_pipeline(
+        build_preprocess(verbose=False),
+        DecisionTreeClassifier(max_depth=8, min_samples_leaf=2, random_state=42),
+    )
+    return pipeline.fit(frame, y)
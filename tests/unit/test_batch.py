@@ -0,0 +1,333 @@
+"""Unit tests for the batch sync pipeline."""
+
+import json
+import subprocess
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from splitwise_sync import config
+from splitwise_sync.cli.batch import SplitwiseSync
+from splitwise_sync.core.email_client import (
+    EmailCredentials,
+    EmailSource,
+    ImapEmailClient,
+)
+from splitwise_sync.core.models import EmailMessage, TransactionBatch
+from splitwise_sync.core.sync_state import SyncState, UidCheckpoint
+from splitwise_sync.ml.model_server import ModelClient, ModelServer, model_file_sha256
+
+from .test_model_server import FakeModel
+
+BODY = (
+    "Te informamos que se ha realizado una compra por ${amount} con Tarjeta de "
+    "Crédito ****7766 en SPID MUT - O871 SANTIAGO CHL el 19/04/2025 14:33. "
+    "Revisa Saldos y Movimientos."
+)
+SOURCE = EmailSource("INBOX", "enviodigital@bancoedwards.cl", "auto")
+
+
+def create_email(uid: int, body: str) -> EmailMessage:
+    return EmailMessage(
+        uid=str(uid),
+        subject="Compra con tu Tarjeta de Crédito",
+        sender="enviodigital@bancoedwards.cl",
+        to="user@gmail.com",
+        date=datetime.fromisoformat("2025-04-19T14:40:00Z"),
+        body=body,
+    )
+
+
+@pytest.fixture
+def emails():
+    return [
+        create_email(1, BODY.format(amount="1.190")),
+        create_email(2, "sin monto"),
+        create_email(3, BODY.format(amount="2.500")),
+        create_email(4, BODY.format(amount="9.990")),
+    ]
+
+
+def create_app(emails: list[EmailMessage], **kwargs) -> SplitwiseSync:
+    with (
+        patch("splitwise_sync.cli.batch.ImapEmailClient"),
+        patch("splitwise_sync.cli.batch.SplitwiseClient"),
+        patch("splitwise_sync.cli.batch.ExpenseModel"),
+        patch("splitwise_sync.cli.batch.parse_email_sources", return_value=[SOURCE]),
+    ):
+        app = SplitwiseSync(**kwargs)
+    app.email_client.iter_from_sources.return_value = [
+        (SOURCE, email) for email in emails
+    ]
+    return app
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_transactions_are_scored_in_one_call(_, errored_logger, emails):
+    """Test that the parsed transactions of a run go through one predict call."""
+    app = create_app(emails)
+    app.model.predict.return_value = np.array([1, 0, 1])
+
+    app.process_emails()
+
+    [call] = app.model.predict.call_args_list
+    batch = call.args[0]
+    assert isinstance(batch, TransactionBatch)
+    assert batch.cost.tolist() == [1190.0, 2500.0, 9990.0]
+    assert app.splitwise_client.create_expense.call_count == 3
+    assert app.splitwise_client.delete_expense.call_count == 1
+    assert errored_logger.error.call_count == 1
+    app.email_client.mark_unread_many.assert_called_once_with(["2"], "INBOX")
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_threshold_uses_probabilities(_, __, emails):
+    """Test that a threshold decides from predict_proba instead of predict."""
+    app = create_app(emails, threshold=0.7)
+    app.model.predict_proba.return_value = np.array(
+        [[0.2, 0.8], [0.4, 0.6], [0.3, 0.7]]
+    )
+
+    app.process_emails()
+
+    app.model.predict.assert_not_called()
+    app.model.predict_proba.assert_called_once()
+    assert app.splitwise_client.delete_expense.call_count == 1
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_failed_prediction_fails_every_email(_, errored_logger, emails):
+    """Test that a model error marks all parsed emails as failed."""
+    app = create_app(emails)
+    app.model.predict.side_effect = RuntimeError("broken model")
+
+    assert app.process_emails() == []
+
+    app.splitwise_client.create_expense.assert_not_called()
+    assert errored_logger.error.call_count == 4
+    app.email_client.mark_unread_many.assert_called_once_with(
+        ["2", "1", "3", "4"], "INBOX"
+    )
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_parsed_emails_are_logged_without_their_body(_, errored_logger, emails):
+    """Test that an email failing after parsing is logged by its transaction."""
+    app = create_app(emails)
+    app.model.predict.return_value = np.array([1, 1, 1])
+    app.splitwise_client.create_expense.side_effect = [
+        MagicMock(),
+        RuntimeError("Splitwise down"),
+        MagicMock(),
+    ]
+
+    app.process_emails()
+
+    record = errored_logger.error.call_args.args[0]
+    assert record["email"] == {"uid": "3", "sender": SOURCE.sender}
+    assert record["transaction"]["cost"] == 2500.0
+    assert record["error"] == "Splitwise down"
+    app.email_client.mark_unread_many.assert_called_once_with(["2", "3"], "INBOX")
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_rules_are_applied_before_the_model(_, __, tmp_path: Path, emails):
+    """Test that only the transactions no rule decides go to the model."""
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(
+        json.dumps(
+            [
+                {"merchant": "SPID", "max_cost": 2000, "shared": False},
+                {"merchant": "SPID", "min_cost": 9000, "split": 0.3},
+                {"merchant": "SPID", "category_id": "12"},
+            ]
+        )
+    )
+    app = create_app(emails, rules_path=rules_path)
+    app.model.predict.return_value = np.array([1])
+
+    with patch.object(config, "RULE_STATS_PATH", tmp_path / "rule_stats.json"):
+        app.process_emails()
+
+    [call] = app.model.predict.call_args_list
+    assert call.args[0].cost.tolist() == [2500.0]
+    calls = app.splitwise_client.create_expense.call_args_list
+    assert [(c.args[0].cost, c.kwargs["split"]) for c in calls] == [
+        (1190.0, None),
+        (2500.0, None),
+        (9990.0, 0.3),
+    ]
+    assert calls[1].args[0].category_id == "12"
+    assert app.splitwise_client.delete_expense.call_count == 1
+    assert app.rules.stats()["fired"] == {"rule 1": 1, "rule 2": 1, "rule 3": 1}
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+@patch("splitwise_sync.ml.online_model.learn_from_feedback", return_value=2)
+@patch("splitwise_sync.ml.online_model.OnlineExpenseModel")
+def test_online_model_learns_before_the_run(online_model, learn, _, __, emails):
+    """Test that the online model is updated with feedback, then scores the run."""
+    app = create_app(emails, online=True)
+    app.model.predict.return_value = np.array([True, False, True])
+
+    app.process_emails()
+
+    assert app.model is online_model.load.return_value
+    learn.assert_called_once_with(
+        app.model,
+        app.splitwise_client,
+        config.ONLINE_MODEL_PATH,
+        config.FEEDBACK_STATE_PATH,
+    )
+    app.model.predict.assert_called_once()
+    assert app.splitwise_client.delete_expense.call_count == 1
+
+
+def test_import_leaves_sklearn_out():
+    """Test that a run without --online imports neither sklearn nor pandas."""
+    code = (
+        "import sys, splitwise_sync.cli.batch; "
+        "print([m for m in ['sklearn', 'pandas', 'joblib'] if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+def test_model_server_is_used_when_running(_, __, tmp_path: Path, emails):
+    """Test that the app scores through the model server when its socket exists."""
+    model = FakeModel()
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"model")
+    socket_path = tmp_path / "model.sock"
+    server = ModelServer(
+        model, socket_path, max_wait=0, model_sha256=model_file_sha256(model_path)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with patch.object(config, "MODEL_SOCKET_PATH", socket_path):
+            app = create_app(emails, dry_run=True, model_path=model_path)
+        try:
+            assert isinstance(app.model, ModelClient)
+            app.process_emails()
+        finally:
+            app.close()
+        assert model.batch_sizes == [3]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_model_server_of_another_model_is_not_used(tmp_path: Path):
+    """Test that a server started before the model changed is bypassed."""
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"old model")
+    socket_path = tmp_path / "model.sock"
+    server = ModelServer(
+        FakeModel(), socket_path, model_sha256=model_file_sha256(model_path)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    model_path.write_bytes(b"retrained model")
+    try:
+        with patch.object(config, "MODEL_SOCKET_PATH", socket_path):
+            app = create_app([], dry_run=True, model_path=model_path)
+        assert not isinstance(app.model, ModelClient)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def create_mail(email: EmailMessage) -> MagicMock:
+    """An imap_tools message holding ``email``."""
+    msg = MagicMock()
+    msg.uid, msg.text, msg.date = email.uid, email.body, email.date
+    msg.subject, msg.from_, msg.to = email.subject, email.sender, email.to
+    return msg
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+@patch("splitwise_sync.core.email_client.MailBox")
+def test_incremental_failures_are_fetched_again(
+    mailbox_class, _, __, tmp_path: Path, emails
+):
+    """Test that an email failing in incremental mode is retried on the next run."""
+    mailbox = mailbox_class.return_value
+    mailbox.client.noop.return_value = ("OK", [b""])
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 5}
+    state_path = tmp_path / "sync_state.json"
+    state = SyncState(state_path)
+    state.set(SOURCE.folder, SOURCE.sender, UidCheckpoint(7, 0))
+    state.save()
+
+    def run(fetched: list[EmailMessage], failing_cost: float = 0) -> SplitwiseSync:
+        with patch.object(config, "SYNC_STATE_PATH", state_path):
+            app = create_app([], incremental=True)
+        app.email_client = ImapEmailClient(EmailCredentials("user", "secret"))
+        app.model.predict.return_value = np.ones(len(fetched), dtype=bool)
+
+        def create_expense(transaction, split=None):
+            if transaction.cost == failing_cost:
+                raise RuntimeError("Splitwise is down")
+            return MagicMock()
+
+        app.splitwise_client.create_expense.side_effect = create_expense
+        mailbox.fetch.return_value = [create_mail(email) for email in fetched]
+        app.process_emails()
+        return app
+
+    run([emails[0], emails[2]], failing_cost=2500.0)
+
+    checkpoint = SyncState(state_path).get(SOURCE.folder, SOURCE.sender)
+    assert checkpoint == UidCheckpoint(7, 3, (3,))
+
+    app = run([emails[2], emails[3]])
+
+    assert "UID 3,4:*" in str(mailbox.fetch.call_args.args[0])
+    calls = app.splitwise_client.create_expense.call_args_list
+    assert [c.args[0].cost for c in calls] == [2500.0, 9990.0]
+    checkpoint = SyncState(state_path).get(SOURCE.folder, SOURCE.sender)
+    assert checkpoint == UidCheckpoint(7, 4)
+
+
+@patch("splitwise_sync.cli.batch.errored_logger")
+@patch("splitwise_sync.cli.batch.processed_logger")
+@patch("splitwise_sync.core.email_client.MailBox")
+def test_fetch_error_keeps_the_checkpoint(mailbox_class, _, __, tmp_path: Path, emails):
+    """Test that a fetch failing mid-run loses neither failed nor new emails."""
+    mailbox = mailbox_class.return_value
+    mailbox.client.noop.return_value = ("OK", [b""])
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 5}
+
+    def fetch(*args, **kwargs):
+        yield create_mail(emails[0])
+        yield create_mail(emails[3])
+        raise OSError("connection reset")
+
+    mailbox.fetch.side_effect = fetch
+    with patch.object(config, "SYNC_STATE_PATH", tmp_path / "sync_state.json"):
+        app = create_app([], incremental=True)
+    app.email_client = ImapEmailClient(EmailCredentials("user", "secret"))
+    app.sync_state.set(SOURCE.folder, SOURCE.sender, UidCheckpoint(7, 2, (1,)))
+
+    with pytest.raises(OSError):
+        app.process_emails()
+
+    # as kept in memory by watch for the next cycle
+    checkpoint = app.sync_state.get(SOURCE.folder, SOURCE.sender)
+    assert checkpoint == UidCheckpoint(7, 2, (1,))
@@ -0,0 +1,79 @@
+"""Unit tests for parallel bulk parsing."""
+
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from splitwise_sync.core.bulk_parse import parse_many
+from splitwise_sync.core.models import EmailMessage
+from splitwise_sync.core.parser_registry import ParserRegistry
+
+BODY = (
+    "Te informamos que se ha realizado una compra por ${amount} con Tarjeta de "
+    "Crédito ****7766 en SPID MUT - O871 SANTIAGO CHL el 19/04/2025 14:33. "
+    "Revisa Saldos y Movimientos."
+)
+
+
+def create_email(
+    uid: int, body: str, sender: str = "enviodigital@bancoedwards.cl"
+) -> EmailMessage:
+    return EmailMessage(
+        uid=str(uid),
+        subject="Compra con tu Tarjeta de Crédito",
+        sender=sender,
+        to="user@gmail.com",
+        date=datetime.fromisoformat("2025-04-19T14:40:00Z"),
+        body=body,
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many_keeps_order_and_reports_errors(workers: int):
+    """Test that results follow the input order with per-item errors."""
+    emails = [
+        create_email(i, "sin monto" if i % 5 == 0 else BODY.format(amount=i))
+        for i in range(1, 23)
+    ]
+
+    results = list(parse_many(iter(emails), workers=workers, chunksize=3))
+
+    assert [result.message.uid for result in results] == [e.uid for e in emails]
+    for i, result in enumerate(results, start=1):
+        if i % 5 == 0:
+            assert not result.ok
+            assert result.error == "No amount found in the email"
+        else:
+            assert result.ok
+            assert result.transaction.cost == float(i)
+
+
+def test_parse_many_with_named_parsers():
+    """Test that a parser name per message overrides the sender dispatch."""
+    body = (Path(__file__).parent / "email-body.txt").read_text(encoding="utf-8")
+    email = create_email(1, body, sender="unknown@example.com")
+
+    auto, named = parse_many([email, email], workers=1, parsers=["auto", "bancochile"])
+
+    assert auto.error is not None and "No receipt parser" in auto.error
+    assert named.transaction is not None
+    assert named.transaction.card_number == "7766"
+
+
+def test_workers_do_not_inherit_the_parent_state(monkeypatch, tmp_path: Path):
+    """Test that the workers start fresh instead of forking the caller.
+
+    Forking a process that runs threads (the IMAP prefetch) can deadlock the
+    children; a fresh worker also ignores a patch made in the parent.
+    """
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("inherited from the parent")
+
+    monkeypatch.setattr(ParserRegistry, "parse_email", broken)
+    emails = [create_email(i, BODY.format(amount=i)) for i in range(1, 5)]
+
+    results = list(parse_many(emails, workers=2, cache_path=tmp_path / "cache.db"))
+
+    assert [result.error for result in results] == [None] * 4
@@ -0,0 +1,361 @@
+"""Unit tests for the IMAP email client."""
+
+import imaplib
+from datetime import datetime, timezone
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from splitwise_sync.core.email_client import (
+    EmailCredentials,
+    EmailSource,
+    ImapEmailClient,
+    parse_email_sources,
+)
+from splitwise_sync.core.email_store import EmailStore
+from splitwise_sync.core.sync_state import SyncState, UidCheckpoint
+
+
+@pytest.fixture
+def mailbox_class():
+    """Patch the MailBox class so no real connection is opened."""
+
+    def new_mailbox(*args, **kwargs) -> MagicMock:
+        mailbox = MagicMock()
+        mailbox.client.noop.return_value = ("OK", [b""])
+        return mailbox
+
+    with patch("splitwise_sync.core.email_client.MailBox") as mock_class:
+        mock_class.side_effect = new_mailbox
+        yield mock_class
+
+
+@pytest.fixture
+def client() -> ImapEmailClient:
+    return ImapEmailClient(EmailCredentials(username="user", password="secret"))
+
+
+def test_session_is_reused(mailbox_class, client: ImapEmailClient):
+    """Test that consecutive calls share a single login."""
+    first = client._connect()
+
+    client.mark_unread("1")
+    client.mark_unread("2")
+
+    assert mailbox_class.call_count == 1
+    first.login.assert_called_once_with("user", "secret", "INBOX")
+    assert first.client.noop.call_count == 2
+
+
+def test_reconnects_when_session_is_dead(mailbox_class, client: ImapEmailClient):
+    """Test that a failing NOOP triggers a transparent reconnect."""
+    first = client._connect()
+    first.client.noop.side_effect = imaplib.IMAP4.abort("socket error: EOF")
+
+    first.logout.side_effect = imaplib.IMAP4.abort("socket error: EOF")
+
+    second = client._connect()
+
+    assert second is not first
+    assert mailbox_class.call_count == 2
+    second.login.assert_called_once()
+    first.logout.assert_called_once()
+
+
+def test_close_logs_out(mailbox_class, client: ImapEmailClient):
+    """Test that close logs out and forgets the session."""
+    with client:
+        mailbox = client._connect()
+
+    mailbox.logout.assert_called_once()
+    assert client._mailboxes == {}
+
+
+def test_mark_unread_many_issues_one_store(mailbox_class, client: ImapEmailClient):
+    """Test that several UIDs are flagged with a single command."""
+    client.mark_unread_many(["3", "5", "8"])
+
+    mailbox = client._connect()
+    mailbox.flag.assert_called_once_with(["3", "5", "8"], "\\Seen", False)
+
+
+def test_mark_unread_many_empty_is_noop(mailbox_class, client: ImapEmailClient):
+    """Test that no connection is opened when there is nothing to flag."""
+    client.mark_unread_many([])
+
+    mailbox_class.assert_not_called()
+
+
+def _mail(uid: str, date: Optional[datetime] = None) -> MagicMock:
+    msg = MagicMock()
+    msg.uid = uid
+    msg.text = "body"
+    msg.date = date or datetime(2025, 4, 19, tzinfo=timezone.utc)
+    return msg
+
+
+def test_fetch_new_without_checkpoint_resyncs(
+    mailbox_class, client: ImapEmailClient, tmp_path
+):
+    """Test that a missing checkpoint falls back to the unread search."""
+    state = SyncState(tmp_path / "state.json")
+    mailbox = client._connect()
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 101}
+    mailbox.uids.return_value = ["95"]
+    mailbox.fetch.return_value = [_mail("95")]
+
+    messages = client.fetch_new_from_sender("bank@example.com", state)
+
+    assert [m.uid for m in messages] == ["95"]
+    criteria = str(mailbox.fetch.call_args.args[0])
+    assert "UNSEEN" in criteria
+    assert mailbox.fetch.call_args.kwargs["mark_seen"] is False
+    # the unread message stays pending until it is processed
+    assert state.get("INBOX", "bank@example.com") == UidCheckpoint(7, 100, (95,))
+
+
+def test_fetch_new_uses_uid_range(mailbox_class, client: ImapEmailClient, tmp_path):
+    """Test that a valid checkpoint only searches UIDs after it."""
+    state = SyncState(tmp_path / "state.json")
+    state.set("INBOX", "bank@example.com", UidCheckpoint(7, 100))
+    mailbox = client._connect()
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 104}
+    # the server always returns the newest message for "n:*"
+    mailbox.fetch.return_value = [_mail("100"), _mail("101"), _mail("103")]
+
+    messages = client.fetch_new_from_sender("bank@example.com", state)
+
+    assert [m.uid for m in messages] == ["101", "103"]
+    assert "UID 101:*" in str(mailbox.fetch.call_args.args[0])
+
+
+def test_fetch_new_retries_failed_uids(
+    mailbox_class, client: ImapEmailClient, tmp_path
+):
+    """Test that the failed messages are searched again with the new ones."""
+    state = SyncState(tmp_path / "state.json")
+    state.set("INBOX", "bank@example.com", UidCheckpoint(7, 100, (96, 98)))
+    mailbox = client._connect()
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 102}
+    mailbox.fetch.return_value = [_mail("98"), _mail("100"), _mail("101")]
+
+    messages = client.fetch_new_from_sender("bank@example.com", state)
+
+    assert [m.uid for m in messages] == ["98", "101"]
+    assert "UID 96,98,101:*" in str(mailbox.fetch.call_args.args[0])
+
+
+def test_fetch_new_leaves_the_checkpoint_to_the_consumer(
+    mailbox_class, client: ImapEmailClient, tmp_path
+):
+    """Test that only processed messages move the checkpoint."""
+    state = SyncState(tmp_path / "state.json")
+    state.set("INBOX", "bank@example.com", UidCheckpoint(7, 100, (96, 98)))
+    mailbox = client._connect()
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 7, "UIDNEXT": 104}
+    mailbox.fetch.return_value = [_mail("98"), _mail("101"), _mail("103")]
+
+    client.fetch_new_from_sender("bank@example.com", state)
+
+    assert state.get("INBOX", "bank@example.com") == UidCheckpoint(7, 100, (96, 98))
+    state.mark_processed("INBOX", "bank@example.com", 98)
+    state.add_failed("INBOX", "bank@example.com", 101)
+    # 103 was fetched but never processed: "101:*" finds it again
+    assert state.get("INBOX", "bank@example.com") == UidCheckpoint(7, 101, (96, 101))
+
+
+def test_fetch_new_resyncs_on_uidvalidity_change(
+    mailbox_class, client: ImapEmailClient, tmp_path
+):
+    """Test that a changed UIDVALIDITY invalidates the checkpoint."""
+    state = SyncState(tmp_path / "state.json")
+    state.set("INBOX", "bank@example.com", UidCheckpoint(7, 100))
+    mailbox = client._connect()
+    mailbox.folder.status.return_value = {"UIDVALIDITY": 8, "UIDNEXT": 5}
+    mailbox.fetch.return_value = []
+
+    client.fetch_new_from_sender("bank@example.com", state)
+
+    assert "UNSEEN" in str(mailbox.fetch.call_args.args[0])
+    assert state.get("INBOX", "bank@example.com") == UidCheckpoint(8, 4)
+
+
+def test_sync_state_roundtrip(tmp_path):
+    """Test that checkpoints survive a save/load cycle."""
+    path = tmp_path / "state" / "sync_state.json"
+    state = SyncState(path)
+    state.set("Recibos", "bank@example.com", UidCheckpoint(3, 42))
+    state.add_failed("Recibos", "bank@example.com", 40)
+    state.save()
+
+    assert SyncState(path).get("Recibos", "bank@example.com") == UidCheckpoint(
+        3, 42, (40,)
+    )
+    assert SyncState(path).get("INBOX", "bank@example.com") is None
+
+
+def test_iter_unread_streams_in_chunks(mailbox_class, client: ImapEmailClient):
+    """Test that messages are yielded lazily and fetched in bulk chunks."""
+    mailbox = client._connect()
+    mailbox.fetch.return_value = iter([_mail("1"), _mail("2")])
+
+    emails = client.iter_unread_from_sender("bank@example.com", bulk=10, limit=5)
+    mailbox.fetch.assert_not_called()
+
+    assert next(emails).uid == "1"
+    assert mailbox.fetch.call_args.kwargs["bulk"] == 10
+    assert mailbox.fetch.call_args.kwargs["limit"] == 5
+    assert [email.uid for email in emails] == ["2"]
+
+
+def test_iter_unread_fetches_one_by_one_for_small_bulk(
+    mailbox_class, client: ImapEmailClient
+):
+    """Test that a chunk size below 2 disables bulk fetching."""
+    mailbox = client._connect()
+    mailbox.fetch.return_value = iter([])
+
+    list(client.iter_unread_from_sender("bank@example.com", bulk=1))
+
+    assert mailbox.fetch.call_args.kwargs["bulk"] is False
+
+
+def test_text_only_fetches_just_the_text_part(mailbox_class):
+    """Test that text-only mode downloads headers, structure and one section."""
+    client = ImapEmailClient(
+        EmailCredentials(username="user", password="secret"), text_only=True
+    )
+    mailbox = client._connect()
+    mailbox.uids.return_value = ["5"]
+    header = b"Subject: Compra\r\nFrom: bank@example.com\r\nTo: me@example.com\r\n\r\n"
+    mailbox.client.uid.side_effect = [
+        (
+            "OK",
+            [
+                (
+                    b'1 (UID 5 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "utf-8") '
+                    b'NIL NIL "7BIT" 11 1 NIL NIL NIL) BODY[HEADER] {%d}' % len(header),
+                    header,
+                ),
+                b")",
+            ],
+        ),
+        ("OK", [(b"1 (UID 5 BODY[1] {11}", b"una compra."), b")"]),
+    ]
+
+    [email] = client.iter_unread_from_sender("bank@example.com", mark_as_read=False)
+
+    assert email.uid == "5"
+    assert email.subject == "Compra"
+    assert email.sender == "bank@example.com"
+    assert email.body == "una compra."
+    fetched_parts = [call.args[2] for call in mailbox.client.uid.call_args_list]
+    assert fetched_parts == [
+        "(UID BODYSTRUCTURE BODY.PEEK[HEADER])",
+        "(UID BODY.PEEK[1])",
+    ]
+    mailbox.fetch.assert_not_called()
+    mailbox.flag.assert_not_called()
+
+
+def test_fetched_messages_are_stored(mailbox_class, tmp_path):
+    """Test that the raw bytes of fetched messages are saved in the store."""
+    store = EmailStore(tmp_path)
+    client = ImapEmailClient(
+        EmailCredentials(username="user", password="secret"), store=store
+    )
+    mailbox = client._connect("Recibos")
+    msg = _mail("7")
+    msg.obj.as_bytes.return_value = b"Message-ID: <7@bank>\r\n\r\nuna compra"
+    mailbox.fetch.return_value = [msg]
+
+    list(client.iter_unread_from_sender("bank@example.com", folder="Recibos"))
+
+    [entry] = store.entries()
+    assert (entry.folder, entry.uid) == ("Recibos", "7")
+    assert store.get(entry.key) == b"Message-ID: <7@bank>\r\n\r\nuna compra"
+
+
+def test_parse_email_sources():
+    """Test parsing of the EMAIL_SOURCES setting."""
+    sources = parse_email_sources("INBOX,a@bank.cl,bancochile; Recibos , b@bank.cl ;")
+
+    assert sources == [
+        EmailSource("INBOX", "a@bank.cl", "bancochile"),
+        EmailSource("Recibos", "b@bank.cl", "auto"),
+    ]
+    with pytest.raises(ValueError, match="Invalid email source"):
+        parse_email_sources("INBOX")
+
+
+def day(d: int) -> datetime:
+    return datetime(2025, 4, d, tzinfo=timezone.utc)
+
+
+def test_iter_from_sources_merges_folders_by_date(
+    mailbox_class, client: ImapEmailClient
+):
+    """Test that folders use their own session and are merged in date order."""
+    inbox = client._connect("INBOX")
+    inbox.fetch.return_value = iter([_mail("1", day(1)), _mail("2", day(4))])
+    receipts = client._connect("Recibos")
+    receipts.fetch.return_value = iter([_mail("7", day(2)), _mail("8", day(3))])
+    sources = [EmailSource("INBOX", "a@bank.cl"), EmailSource("Recibos", "b@bank.cl")]
+
+    merged = [
+        (source.folder, email.uid)
+        for source, email in client.iter_from_sources(sources)
+    ]
+
+    assert merged == [
+        ("INBOX", "1"),
+        ("Recibos", "7"),
+        ("Recibos", "8"),
+        ("INBOX", "2"),
+    ]
+    assert mailbox_class.call_count == 2
+    receipts.login.assert_called_once_with("user", "secret", "Recibos")
+
+
+def test_iter_from_sources_merges_senders_of_a_folder_by_date(
+    mailbox_class, client: ImapEmailClient
+):
+    """Test that two senders sharing a folder are merged in date order."""
+    mails = {
+        "a@bank.cl": [_mail("1", day(1)), _mail("4", day(4))],
+        "b@bank.cl": [_mail("2", day(2)), _mail("3", day(3))],
+    }
+    inbox = client._connect("INBOX")
+    inbox.fetch.side_effect = lambda criteria, **kwargs: iter(
+        mails["a@bank.cl" if "a@bank.cl" in str(criteria) else "b@bank.cl"]
+    )
+    sources = [EmailSource("INBOX", "a@bank.cl"), EmailSource("INBOX", "b@bank.cl")]
+
+    merged = [
+        (source.sender, email.uid)
+        for source, email in client.iter_from_sources(sources)
+    ]
+
+    assert merged == [
+        ("a@bank.cl", "1"),
+        ("b@bank.cl", "2"),
+        ("b@bank.cl", "3"),
+        ("a@bank.cl", "4"),
+    ]
+    assert mailbox_class.call_count == 1
+
+
+def test_iter_from_sources_keeps_the_arrival_order_of_a_sender(
+    mailbox_class, client: ImapEmailClient
+):
+    """Test that a sender's messages are not reordered by their dates."""
+    mails = [_mail("1", day(3)), _mail("2", day(1)), _mail("3", day(2))]
+    client._connect("INBOX").fetch.return_value = mails
+
+    merged = [
+        email.uid
+        for _, email in client.iter_from_sources([EmailSource("INBOX", "a@bank.cl")])
+    ]
+
+    assert merged == ["1", "2", "3"]
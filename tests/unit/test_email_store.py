@@ -0,0 +1,92 @@
+"""Unit tests for the local raw email store."""
+
+from pathlib import Path
+
+from splitwise_sync.core.email_store import EmailStore
+from splitwise_sync.core.imap_parts import TextPart, build_text_message
+
+RAW = (
+    b"From: enviodigital@bancoedwards.cl\r\n"
+    b"To: user@example.com\r\n"
+    b"Subject: Compra con tarjeta\r\n"
+    b"Date: Mon, 15 Jan 2024 14:30:00 -0300\r\n"
+    b"Message-ID: <%d@bancoedwards.cl>\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"\r\n"
+    b"Te informamos que se ha realizado una compra por $1.000.\r\n"
+)
+
+
+def test_put_get_roundtrip(tmp_path: Path):
+    """Test that raw bytes come back unchanged after reopening the store."""
+    with EmailStore(tmp_path) as store:
+        key = store.put(RAW % 1, "INBOX", "10")
+
+    with EmailStore(tmp_path) as store:
+        assert key in store
+        assert store.get(key) == RAW % 1
+
+
+def test_put_deduplicates_by_message_id(tmp_path: Path):
+    """Test that the same message fetched twice is stored once."""
+    with EmailStore(tmp_path) as store:
+        first = store.put(RAW % 1, "INBOX", "10")
+        second = store.put(RAW % 1, "Recibos", "99")
+        store.put(RAW % 2, "INBOX", "11")
+
+        assert first == second
+        assert len(store) == 2
+
+
+def test_get_after_put_remaps(tmp_path: Path):
+    """Test that messages added after the first read are readable."""
+    with EmailStore(tmp_path) as store:
+        first = store.put(RAW % 1, "INBOX", "10")
+        store.get(first)
+        second = store.put(RAW % 2, "INBOX", "11")
+
+        assert store.get(second) == RAW % 2
+
+
+def test_truncated_pack_is_ignored(tmp_path: Path):
+    """Test that an index entry pointing past the pack end is skipped."""
+    with EmailStore(tmp_path) as store:
+        store.put(RAW % 1, "INBOX", "10")
+        store.put(RAW % 2, "INBOX", "11")
+    pack = tmp_path / EmailStore.PACK_NAME
+    pack.write_bytes(pack.read_bytes()[:-5])
+
+    assert len(EmailStore(tmp_path)) == 1
+
+
+def test_iter_emails(tmp_path: Path):
+    """Test that stored messages are parsed back into EmailMessage objects."""
+    with EmailStore(tmp_path) as store:
+        store.put(RAW % 1, "INBOX", "10")
+        store.put(RAW % 2, "Recibos", "11")
+
+        [(entry, email)] = list(store.iter_emails(folder="Recibos"))
+
+    assert entry.uid == "11"
+    assert email.uid == "11"
+    assert email.sender == "enviodigital@bancoedwards.cl"
+    assert email.subject == "Compra con tarjeta"
+    assert "una compra por $1.000" in email.body
+
+
+def test_build_text_message(tmp_path: Path):
+    """Test that a text-only copy parses to the decoded text part."""
+    header = (
+        b"From: enviodigital@bancoedwards.cl\r\n"
+        b"Subject: Compra\r\n"
+        b'Content-Type: multipart/related; boundary="b0"\r\n'
+        b"\r\n"
+    )
+    part = TextPart("1.1", "plain", "utf-8", "QUOTED-PRINTABLE")
+
+    raw = build_text_message(header, b"Cr=C3=A9dito", part)
+
+    with EmailStore(tmp_path) as store:
+        store.put(raw, "INBOX", "1")
+        [(_, email)] = list(store.iter_emails())
+    assert email.body == "Crédito"
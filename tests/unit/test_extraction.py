@@ -0,0 +1,102 @@
+"""Unit tests for the vectorized transaction extraction."""
+
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from splitwise_sync.core.bank_parsers import BciParser
+from splitwise_sync.core.models import EmailMessage
+from splitwise_sync.core.receipt_parser import ReceiptParser
+from splitwise_sync.ml.extraction import extract_transactions
+
+BODIES = [
+    "Te informamos que se ha realizado una compra por $1.190 con Tarjeta de "
+    "Crédito ****7766 en SPID MUT - O871 SANTIAGO CHL el 19/04/2025 14:33. Revisa",
+    "una compra por US$25,99 con Tarjeta de Crédito ****1234 en Uber Eats el "
+    "01/12/2024 09:05. Revisa Saldos",
+    "This email does not contain any transaction amount details",
+    "una compra por $5.000 con Tarjeta de Crédito en CAFE el 02/03/2025 08:15",
+    # Chile's DST ended at 24:00 on 2025-04-05, so 23:30 happened twice
+    "una compra por $990 con Tarjeta ****0001 en METRO el 05/04/2025 23:30. Revisa",
+    # fields before the purchase sentence, found first by the per-field patterns
+    "Saldo disponible $5.000. Te informamos que se ha realizado una compra por "
+    "$1.190 con Tarjeta de Crédito ****7766 en SPID el 19/04/2025 14:33. Revisa",
+]
+
+
+def _parse(body: str) -> ReceiptParser:
+    email = EmailMessage("1", "Compra", "a@bancochile.cl", "b", datetime.now(), body)
+    return ReceiptParser().parse_email(email)
+
+
+def test_extract_transactions_matches_receipt_parser():
+    """Test that every row agrees with ReceiptParser, errors included."""
+    bodies = pd.Series(BODIES, index=[10, 11, 12, 13, 14, 15])
+
+    frame = extract_transactions(bodies)
+
+    assert list(frame.index) == [10, 11, 12, 13, 14, 15]
+    assert isinstance(frame["transaction_date"].dtype, pd.DatetimeTZDtype)
+    assert str(frame["transaction_date"].dt.tz) == "America/Santiago"
+    assert frame["transaction_cost"].dtype == "float64"
+    for body, (_, row) in zip(BODIES, frame.iterrows()):
+        try:
+            expected = _parse(body)
+        except ValueError as exc:
+            assert row["transaction_error"] == str(exc)
+            assert pd.isna(row["transaction_cost"])
+            continue
+        assert pd.isna(row["transaction_error"])
+        assert row["transaction_cost"] == expected.cost
+        assert row["transaction_currency_code"] == expected.currency_code
+        assert row["transaction_date"] == expected.date
+        assert row["transaction_date"].utcoffset() == expected.date.utcoffset()
+        assert row["transaction_description"] == expected.description
+        assert row["transaction_card_number"] == expected.card_number
+        assert row["transaction_details"] == expected.details
+
+
+def test_extract_transactions_tries_the_receipt_pattern_first():
+    """Test that the purchase sentence wins over amounts found before it."""
+    bodies = pd.Series([BODIES[5], BODIES[3], BODIES[5]], index=["a", "b", "a"])
+
+    frame = extract_transactions(bodies)
+
+    assert frame["transaction_cost"].tolist()[::2] == [1190.0, 1190.0]
+    assert frame["transaction_error"].iloc[1] == "No card number found in the email"
+    assert list(frame.index) == ["a", "b", "a"]
+
+
+def test_extract_transactions_with_bank_patterns():
+    """Test extraction with the patterns of another bank's parser."""
+    body = (
+        "Se ha realizado una compra por $12.345 en FARMACIA con tu Tarjeta de "
+        "Crédito terminada en 1234 el día 01/02/2025 a las 12:34 hrs."
+    )
+
+    [row] = extract_transactions(pd.Series([body]), parser=BciParser).to_dict("records")
+
+    assert row["transaction_cost"] == 12345.0
+    assert row["transaction_description"] == "FARMACIA"
+    assert row["transaction_card_number"] == "1234"
+    assert row["transaction_date"] == pd.Timestamp(
+        "2025-02-01 12:34", tz="America/Santiago"
+    )
+
+
+@pytest.mark.parametrize("html", [False, True])
+def test_extract_transactions_on_fixture(html: bool):
+    """Test the email fixture, once converted to text."""
+    body = (Path(__file__).parent / "email-body.txt").read_text(encoding="utf-8")
+    parser = ReceiptParser()
+    text = parser._clean_body(body) if html else "sin datos"
+
+    [row] = extract_transactions(pd.Series([text])).to_dict("records")
+
+    if html:
+        assert row["transaction_card_number"] == "7766"
+        assert row["transaction_cost"] == 1190.0
+    else:
+        assert row["transaction_error"] == "No amount found in the email"
@@ -0,0 +1,196 @@
+"""Unit tests for the single-row predictor compiled from the pipeline."""
+
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.pipeline import make_pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.expense_model import ExpenseModel
+from splitwise_sync.ml.fast_predictor import FastPredictor, export_model
+from splitwise_sync.ml.preprocessing import build_preprocess
+from splitwise_sync.ml.training import INPUT_FEATURES
+
+
+def test_matches_pipeline_on_training_set(fitted_pipeline, training_transactions):
+    """Test that predictions are identical to the sklearn pipeline."""
+    predictor = FastPredictor.from_pipeline(fitted_pipeline)
+    predictor.check(fitted_pipeline, training_transactions)
+
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    expected = fitted_pipeline.predict(frame)
+    assert [predictor.predict(t) for t in training_transactions] == expected.tolist()
+
+
+def test_matches_per_column_pipeline(fitted_pipeline, training_transactions):
+    """Test that pipelines trained before the fused extractor still compile."""
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    pipeline = make_pipeline(
+        build_preprocess(verbose=False, fused=False),
+        DecisionTreeClassifier(max_depth=8, min_samples_leaf=2, random_state=42),
+    ).fit(frame, fitted_pipeline.predict(frame))
+
+    FastPredictor.from_pipeline(pipeline).check(pipeline, training_transactions, frame)
+
+
+def test_unknown_merchant_has_no_token_features(fitted_pipeline):
+    """Test that merchants outside the vocabulary only get numeric features."""
+    predictor = FastPredictor.from_pipeline(fitted_pipeline)
+    transaction = Transaction(
+        cost=0.0,
+        currency_code="CLP",
+        date=datetime(2025, 4, 21, 0, 30, tzinfo=ZoneInfo("America/Santiago")),
+        description="UNSEEN SHOP",
+        card_number="7766",
+        details="",
+    )
+    # a Monday at 00:30 with no cost: only the monday flag is set
+    assert predictor.features(transaction) == {
+        len(predictor.vocabulary) + predictor.numeric_features.index("monday"): 1.0
+    }
+
+
+def test_unsupported_pipeline():
+    """Test that other models are refused."""
+    with pytest.raises(ValueError):
+        FastPredictor.from_pipeline(DecisionTreeClassifier())
+
+
+def test_expense_model_uses_fast_path(
+    tmp_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that single transactions skip the pipeline in ExpenseModel."""
+    path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, path)
+    model = ExpenseModel(path)
+    assert model.fast_predictor is not None
+
+    transaction = training_transactions[0]
+    frame = transaction.to_dataframe()
+    assert (
+        model.predict(transaction).tolist() == fitted_pipeline.predict(frame).tolist()
+    )
+    np.testing.assert_array_equal(
+        model.predict_proba(TransactionBatch.from_transactions([transaction])),
+        fitted_pipeline.predict_proba(frame),
+    )
+    batch = TransactionBatch.from_transactions(training_transactions[:10])
+    assert model.predict(batch).tolist() == [
+        model.predict_one(t) for t in training_transactions[:10]
+    ]
+
+
+def test_export_roundtrip(tmp_path: Path, fitted_pipeline, training_transactions):
+    """Test that the exported predictor scores like the pipeline."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+
+    export_path = export_model(model_path)
+
+    assert export_path == tmp_path / "model.npz"
+    predictor = FastPredictor.load(export_path)
+    predictor.check(fitted_pipeline, training_transactions)
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    np.testing.assert_array_equal(
+        predictor.predict_many(training_transactions), fitted_pipeline.predict(frame)
+    )
+
+
+def test_export_checks_the_training_frame(
+    tmp_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that the export is checked on a frame of the input features."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    frame = frame[INPUT_FEATURES]
+
+    export_path = export_model(model_path, frame=frame)
+
+    assert export_path.exists()
+
+
+def test_export_refuses_a_mismatch(
+    tmp_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that nothing is exported when the predictor differs."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+
+    with patch.object(
+        FastPredictor, "predict_proba", return_value=np.array([0.5, 0.5])
+    ):
+        with pytest.raises(ValueError, match="differs"):
+            export_model(model_path, frame=frame)
+
+    assert not (tmp_path / "model.npz").exists()
+
+
+def test_expense_model_prefers_export(
+    tmp_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that an up-to-date export is used instead of unpickling."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    export_model(model_path)
+
+    with patch("joblib.load") as load:
+        model = ExpenseModel(model_path)
+    load.assert_not_called()
+    assert model.model is None
+
+    batch = TransactionBatch.from_transactions(training_transactions)
+    np.testing.assert_array_equal(
+        model.predict_proba(batch), fitted_pipeline.predict_proba(batch.to_dataframe())
+    )
+
+
+def test_expense_model_loads_pickle_for_dataframes(
+    tmp_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that DataFrames and dump use the pickle when the export is loaded."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    export_model(model_path)
+    model = ExpenseModel(model_path)
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+
+    np.testing.assert_array_equal(model.predict(frame), fitted_pipeline.predict(frame))
+    assert model.model is not None
+
+    model.dump(str(tmp_path / "copy" / "model.pkl"))
+    copy = joblib.load(tmp_path / "copy" / "model.pkl")
+    np.testing.assert_array_equal(copy.predict(frame), fitted_pipeline.predict(frame))
+
+
+def test_expense_model_without_pickle_refuses_dump(tmp_path: Path, fitted_pipeline):
+    """Test that an export without its pickle cannot be dumped."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    export_model(model_path)
+    model_path.unlink()
+    model = ExpenseModel(model_path)
+
+    with pytest.raises(FileNotFoundError):
+        model.dump(str(tmp_path / "copy.pkl"))
+    assert not (tmp_path / "copy.pkl").exists()
+
+
+def test_stale_export_is_ignored(tmp_path: Path, fitted_pipeline):
+    """Test that an export of another model version falls back to joblib."""
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, model_path)
+    export_model(model_path)
+    joblib.dump(fitted_pipeline[-1], model_path)  # retrained without re-exporting
+
+    model = ExpenseModel(model_path)
+
+    assert model.model is not None
+    assert model.fast_predictor is None
@@ -0,0 +1,89 @@
+"""Unit tests for the fused transaction feature extractor."""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.pipeline import make_pipeline
+from sklearn.tree import DecisionTreeClassifier
+
+from splitwise_sync.core.models import TransactionBatch
+from splitwise_sync.ml.feature_extractor import (
+    TransactionFeatureExtractor,
+    joined_words,
+)
+from splitwise_sync.ml.preprocessing import build_preprocess
+
+
+def test_same_features_as_per_column_transformers(training_transactions):
+    """Test that the fused extractor builds the matrix of the original layout."""
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    fused = build_preprocess(verbose=False)
+    legacy = build_preprocess(verbose=False, fused=False)
+
+    X = fused.fit_transform(frame)
+    expected = legacy.fit_transform(frame)
+
+    assert sp.issparse(X) and X.format == "csr"
+    np.testing.assert_array_equal(X.toarray(), expected.toarray())
+    np.testing.assert_array_equal(fused.transform(frame).toarray(), X.toarray())
+    names = [name.split("__")[-1] for name in fused.get_feature_names_out()]
+    assert names == [name.split("__")[-1] for name in legacy.get_feature_names_out()]
+
+
+def test_same_predictions_as_per_column_transformers(training_transactions):
+    """Test that a tree trained on the fused features predicts the same."""
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    y = frame["transaction_cost"] > 20_000
+
+    predictions = [
+        make_pipeline(
+            build_preprocess(verbose=False, fused=fused),
+            DecisionTreeClassifier(max_depth=6, random_state=42),
+        )
+        .fit(frame, y)
+        .predict_proba(frame)
+        for fused in (True, False)
+    ]
+
+    np.testing.assert_array_equal(*predictions)
+
+
+def test_date_features():
+    """Test the hour and weekday of naive and time zone aware dates."""
+    dates = pd.Series(pd.to_datetime(["2025-04-19 23:30", "2025-04-21 00:05"]))
+    frame = pd.DataFrame(
+        {
+            "transaction_description": ["LIDER", None],
+            "transaction_cost": [0.0, 1190.0],
+            "transaction_date": dates.dt.tz_localize("America/Santiago"),
+        }
+    )
+    extractor = TransactionFeatureExtractor().fit(frame)
+
+    for date_column in (dates, frame["transaction_date"]):
+        X = extractor.transform(frame.assign(transaction_date=date_column))
+        # Saturday 23:30 without cost, then Monday 00:05
+        np.testing.assert_array_equal(
+            X.toarray(),
+            [
+                [1, 0, 23, 5, 0, 0, 0, 0, 0, 1, 0],
+                [0, 1190, 0, 0, 1, 0, 0, 0, 0, 0, 0],
+            ],
+        )
+
+
+def test_vocabulary_limit_counts_every_row(training_transactions):
+    """Test that the most frequent merchants are kept, counting repeats."""
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    merchants = frame["transaction_description"].str[0:23].str.strip()
+    vectorizer = CountVectorizer(max_features=3, binary=True, preprocessor=joined_words)
+    vectorizer.fit(merchants)
+
+    extractor = TransactionFeatureExtractor(max_features=3)
+    X = extractor.fit_transform(frame)
+
+    assert extractor.vectorizer_.vocabulary_ == vectorizer.vocabulary_
+    np.testing.assert_array_equal(
+        X[:, :3].toarray(), vectorizer.transform(merchants).toarray()
+    )
@@ -0,0 +1,36 @@
+"""Unit tests for the HTML text extractors."""
+
+from pathlib import Path
+
+import pytest
+
+from splitwise_sync.core.html_text import html_to_text, soup_to_text
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+
+def test_stream_extractor_matches_beautifulsoup():
+    """Test that the streaming extractor reproduces the BeautifulSoup text."""
+    html = (Path(__file__).parent / "email-body.txt").read_text(encoding="utf-8")
+
+    assert html_to_text(html) == soup_to_text(html)
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        "<p>una &amp; otra<!-- comentario -->compra</p>",
+        "<div>  a<br/>b </div><script>var x = '<p>no</p>';</script>c",
+        "<head><title>Banco</title><style>p {}</style></head><body>x</body>",
+        "<template><p>oculto</p></template>&nbsp;visible &#150; fin",
+        "<![CDATA[datos]]>texto",
+    ],
+)
+def test_stream_extractor_edge_cases(html: str):
+    """Test comments, skipped elements, entities and CDATA sections."""
+    assert html_to_text(html) == soup_to_text(html)
+
+
+def test_parser_html_extractor_is_selectable():
+    """Test that each parser can choose its HTML extractor."""
+    assert ReceiptParser().html_to_text is html_to_text
+    assert ReceiptParser(html_extractor="bs4").html_to_text is soup_to_text
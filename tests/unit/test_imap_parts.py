@@ -0,0 +1,79 @@
+"""Unit tests for the IMAP partial fetch helpers."""
+
+from splitwise_sync.core.imap_parts import (
+    TextPart,
+    decode_part,
+    find_text_part,
+    parse_fetch_response,
+)
+
+MULTIPART_STRUCTURE = (
+    b'1 (UID 42 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL '
+    b'"QUOTED-PRINTABLE" 120 4 NIL NIL NIL)("TEXT" "HTML" ("CHARSET" "utf-8") '
+    b'NIL NIL "BASE64" 3000 40 NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "b1") '
+    b'NIL NIL)("IMAGE" "PNG" ("NAME" "logo.png") "<logo>" NIL "BASE64" 90000 '
+    b'NIL ("INLINE" ("FILENAME" "logo.png")) NIL) "RELATED" ("BOUNDARY" "b0") '
+    b"NIL NIL) BODY[HEADER] {24}"
+)
+
+
+def test_parse_fetch_response_with_literal():
+    """Test that literals and nested lists are parsed per message."""
+    data = [(MULTIPART_STRUCTURE, b"Subject: Compra\r\n\r\n"), b")"]
+
+    [item] = parse_fetch_response(data)
+
+    assert item["UID"] == "42"
+    assert item["BODY[HEADER]"] == b"Subject: Compra\r\n\r\n"
+    assert isinstance(item["BODYSTRUCTURE"], list)
+
+
+def test_find_text_part_prefers_plain():
+    """Test that the plain text alternative is chosen over HTML."""
+    [item] = parse_fetch_response([(MULTIPART_STRUCTURE, b""), b")"])
+
+    part = find_text_part(item["BODYSTRUCTURE"])
+
+    assert part == TextPart("1.1", "plain", "utf-8", "QUOTED-PRINTABLE")
+
+
+def test_find_text_part_html_fallback():
+    """Test that HTML is used when there is no plain text part."""
+    [item] = parse_fetch_response([(MULTIPART_STRUCTURE, b""), b")"])
+
+    part = find_text_part(item["BODYSTRUCTURE"], preferred=("html",))
+
+    assert part == TextPart("1.2", "html", "utf-8", "BASE64")
+
+
+def test_find_text_part_single_part_message():
+    """Test that a non-multipart message uses section 1."""
+    data = [
+        b'3 (UID 7 BODYSTRUCTURE ("TEXT" "HTML" ("CHARSET" "iso-8859-1") NIL NIL '
+        b'"7BIT" 512 10 NIL NIL NIL))'
+    ]
+    [item] = parse_fetch_response(data)
+
+    part = find_text_part(item["BODYSTRUCTURE"])
+
+    assert part == TextPart("1", "html", "iso-8859-1", "7BIT")
+
+
+def test_find_text_part_skips_attachments():
+    """Test that text attachments are not picked as the body."""
+    data = [
+        b'1 (UID 9 BODYSTRUCTURE (("TEXT" "PLAIN" ("NAME" "a.txt") NIL NIL "7BIT" '
+        b'10 1 NIL ("ATTACHMENT" ("FILENAME" "a.txt")) NIL) "MIXED"))'
+    ]
+    [item] = parse_fetch_response(data)
+
+    assert find_text_part(item["BODYSTRUCTURE"]) is None
+
+
+def test_decode_part():
+    """Test that transfer encodings and charsets are decoded."""
+    qp = TextPart("1", "plain", "utf-8", "QUOTED-PRINTABLE")
+    b64 = TextPart("1", "plain", "iso-8859-1", "BASE64")
+
+    assert decode_part(b"Cr=C3=A9dito", qp) == "Crédito"
+    assert decode_part(b"Q3LpZGl0bw==", b64) == "Crédito"
@@ -0,0 +1,135 @@
+"""Unit tests for the micro-batching model server."""
+
+import socket
+import threading
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.fast_predictor import file_sha256
+from splitwise_sync.ml.model_server import ModelClient, ModelServer, model_file_sha256
+
+
+class FakeModel:
+    """Model whose shared probability is the cost divided by 100."""
+
+    classes = np.array([False, True])
+
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+
+    def predict_proba(self, batch: TransactionBatch) -> np.ndarray:
+        self.batch_sizes.append(len(batch))
+        if (batch.cost < 0).any():
+            raise ValueError("negative cost")
+        shared = batch.cost / 100
+        return np.column_stack([1 - shared, shared])
+
+
+def create_transaction(cost: float) -> Transaction:
+    return Transaction(
+        cost=cost,
+        currency_code="CLP",
+        date=datetime(2025, 4, 19, 14, 33, tzinfo=ZoneInfo("America/Santiago")),
+        description="SPID MUT - O871",
+        card_number="7766",
+        details="",
+    )
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path) -> Path:
+    return tmp_path / "model.sock"
+
+
+def serve(model: FakeModel, socket_path: Path, **kwargs) -> ModelServer:
+    server = ModelServer(model, socket_path, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_concurrent_requests_share_a_batch(socket_path: Path):
+    """Test that concurrent clients are scored together and get their rows."""
+    model = FakeModel()
+    server = serve(model, socket_path, max_batch=100, max_wait=0.2)
+    results: dict[int, np.ndarray] = {}
+
+    def client(i: int) -> None:
+        with ModelClient(socket_path) as model_client:
+            results[i] = model_client.predict_proba([create_transaction(i)])
+
+    try:
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert sum(model.batch_sizes) == 8
+        assert len(model.batch_sizes) < 8
+        for i, proba in results.items():
+            np.testing.assert_allclose(proba, [[1 - i / 100, i / 100]])
+
+        with ModelClient(socket_path) as model_client:
+            stats = model_client.stats()
+        assert stats["requests"] == 8
+        assert stats["transactions"] == 8
+        assert stats["max_batch_size"] == max(model.batch_sizes)
+        assert stats["latency_p95_ms"] > 0
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not socket_path.exists()
+
+
+def test_client_predicts_batches(socket_path: Path):
+    """Test that a whole batch is answered in order, with predicted classes."""
+    server = serve(FakeModel(), socket_path, max_wait=0)
+    batch = TransactionBatch.from_transactions(
+        [create_transaction(cost) for cost in (10, 90, 60)]
+    )
+    try:
+        with ModelClient(socket_path) as client:
+            assert client.predict(batch).tolist() == [False, True, True]
+            assert client.predict_proba([]).shape == (0, 2)
+            with pytest.raises(RuntimeError, match="negative cost"):
+                client.predict([create_transaction(-1)])
+            # the connection is still usable after an error
+            assert client.predict(create_transaction(99)).tolist() == [True]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stale_socket_is_replaced(socket_path: Path):
+    """Test that a socket left by a dead server is reused, a live one is not."""
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+
+    server = ModelServer(FakeModel(), socket_path)
+    try:
+        with pytest.raises(RuntimeError):
+            ModelServer(FakeModel(), socket_path)
+    finally:
+        server.server_close()
+
+
+def test_client_without_server(socket_path: Path):
+    """Test that connecting to a missing server raises OSError."""
+    with pytest.raises(OSError):
+        ModelClient(socket_path)
+
+
+def test_model_file_sha256_falls_back_to_export(tmp_path: Path):
+    """Test that the export is hashed when there is no pickle to load."""
+    export_path = tmp_path / "model.npz"
+    export_path.write_bytes(b"exported")
+
+    assert model_file_sha256(tmp_path / "model.pkl") == file_sha256(export_path)
+    (tmp_path / "model.pkl").write_bytes(b"pickled")
+    assert model_file_sha256(tmp_path / "model.pkl") != file_sha256(export_path)
@@ -1,9 +1,12 @@
+import pickle
 from datetime import datetime
 from hashlib import sha256
+from zoneinfo import ZoneInfo
 
+import pandas as pd
 import pytest
 
-from splitwise_sync.core.models import Transaction
+from splitwise_sync.core.models import Transaction, TransactionBatch
 
 
 @pytest.fixture
@@ -76,3 +79,96 @@ def test_immutability(sample_transaction: Transaction):
     """Test that the transaction is immutable (frozen)."""
     with pytest.raises(Exception):
         sample_transaction.cost = 100.0
+
+
+def test_from_dict_roundtrip(sample_transaction: Transaction):
+    """Test that from_dict rebuilds the transaction written by to_dict."""
+    assert Transaction.from_dict(sample_transaction.to_dict()) == sample_transaction
+
+
+def test_slots_transaction_pickles(sample_transaction: Transaction):
+    """Test that the slotted transaction has no __dict__ and survives pickling."""
+    assert not hasattr(sample_transaction, "__dict__")
+    restored = pickle.loads(pickle.dumps(sample_transaction))
+    assert restored == sample_transaction
+    assert restored.hash == sample_transaction.hash
+
+
+@pytest.fixture
+def transactions():
+    return [
+        Transaction(
+            cost=1190.0 * i,
+            currency_code="USD" if i % 3 == 0 else "CLP",
+            date=datetime(2025, 4, i, 14, 33, tzinfo=ZoneInfo("America/Santiago")),
+            description=f"MERCHANT {i}",
+            card_number="7766" if i % 2 else "1234",
+            details="",
+        )
+        for i in range(1, 8)
+    ]
+
+
+def test_batch_matches_transactions(transactions: list[Transaction]):
+    """Test that a batch gives back the transactions, dicts and hashes."""
+    batch = TransactionBatch.from_transactions(transactions)
+
+    assert len(batch) == len(transactions)
+    assert list(batch) == transactions
+    assert batch.to_dicts() == [t.to_dict() for t in transactions]
+    assert batch.currency_code.categories.tolist() == ["CLP", "USD"]
+
+
+def test_batch_computes_hashes_lazily(transactions: list[Transaction]):
+    """Test that hashes computed in bulk match Transaction.hash."""
+    batch = TransactionBatch.from_transactions(transactions)
+    columns = TransactionBatch(
+        batch.cost,
+        batch.currency_code,
+        batch.date,
+        batch.description,
+        batch.card_number,
+        batch.details,
+    )
+
+    assert columns._hashes is None
+    assert columns.hashes.tolist() == [t.hash for t in transactions]
+
+
+def test_batch_hashes_survive_a_dataframe_round_trip():
+    """Test that hashes of dates in another zone match after from_dataframe."""
+    transaction = Transaction(
+        cost=1190.0,
+        currency_code="CLP",
+        date=datetime(2025, 4, 21, 18, 33, tzinfo=ZoneInfo("UTC")),
+        description="MERCHANT",
+        card_number="7766",
+        details="",
+    )
+    batch = TransactionBatch.from_transactions([transaction])
+
+    restored = TransactionBatch.from_dataframe(batch.to_dataframe(with_hash=False))
+
+    assert restored.hashes[0] == transaction.hash
+    assert restored[0].hash == transaction.hash
+    assert batch.to_dataframe()["transaction_hash"][0] == transaction.hash
+
+
+def test_batch_to_dataframe(transactions: list[Transaction]):
+    """Test that the batch frame has the values of the per-row frames."""
+    expected = pd.concat([t.to_dataframe() for t in transactions], ignore_index=True)
+
+    frame = TransactionBatch.from_transactions(transactions).to_dataframe()
+
+    assert frame.columns.tolist() == expected.columns.tolist()
+    assert frame["transaction_card_number"].dtype == "category"
+    assert frame.astype(object).equals(expected.astype(object))
+    assert TransactionBatch.from_dataframe(frame).to_dicts() == [
+        t.to_dict() for t in transactions
+    ]
+
+
+def test_batch_rejects_ragged_columns():
+    """Test that columns of different lengths are refused."""
+    with pytest.raises(ValueError):
+        TransactionBatch([1.0], ["CLP"], [], ["A"], ["1234"], [""])
@@ -0,0 +1,119 @@
+"""Unit tests for the expense model learning online from feedback."""
+
+import json
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.online_model import (
+    OnlineExpenseModel,
+    feedback_from_expenses,
+    learn_from_feedback,
+)
+
+NOW = datetime(2025, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def shared_labels(transactions: list[Transaction]) -> list[bool]:
+    return ["JUMBO" in t.description or "UBER" in t.description for t in transactions]
+
+
+def create_expense(transaction: Transaction, deleted: bool) -> MagicMock:
+    expense = MagicMock()
+    expense.getDetails.return_value = transaction.details_with_metadata
+    expense.getDeletedAt.return_value = "2025-04-20T10:00:00Z" if deleted else None
+    return expense
+
+
+def test_learns_merchants(training_transactions):
+    """Test that the model learns the shared merchants of a dataset."""
+    model = OnlineExpenseModel().fit(
+        training_transactions, shared_labels(training_transactions)
+    )
+
+    batch = TransactionBatch.from_transactions(training_transactions)
+    assert (model.predict(batch) == shared_labels(training_transactions)).mean() > 0.95
+    assert model.predict_proba(batch).shape == (len(training_transactions), 2)
+    assert model.n_samples == len(training_transactions)
+
+
+def test_new_merchant_learned_from_one_batch(training_transactions):
+    """Test that a merchant unseen in training is learned by partial_fit."""
+    model = OnlineExpenseModel().fit(
+        training_transactions, shared_labels(training_transactions)
+    )
+    gym = [
+        replace(t, description="SMARTFIT LAS CONDES       SANTIAGO      CHL")
+        for t in training_transactions[:20]
+    ]
+    supermarket = [replace(t, description="UNIMARC ÑUÑOA") for t in gym]
+
+    model.partial_fit(gym + supermarket, [False] * 20 + [True] * 20)
+
+    assert not model.predict(gym).any()
+    assert model.predict(supermarket).mean() >= 0.9
+
+
+def test_save_and_load(tmp_path: Path, training_transactions):
+    """Test that a saved model predicts the same once loaded."""
+    model = OnlineExpenseModel(n_features=2**10).fit(
+        training_transactions, shared_labels(training_transactions)
+    )
+    path = tmp_path / "models" / "online.joblib"
+    model.save(path)
+
+    loaded = OnlineExpenseModel.load(path)
+
+    np.testing.assert_array_equal(
+        loaded.predict_proba(training_transactions),
+        model.predict_proba(training_transactions),
+    )
+
+
+def test_feedback_labels(training_transactions):
+    """Test that kept expenses are shared and manual expenses are skipped."""
+    manual = MagicMock()
+    manual.getDetails.return_value = "Dinner with friends"
+    expenses = [
+        create_expense(training_transactions[0], deleted=False),
+        manual,
+        create_expense(training_transactions[1], deleted=True),
+    ]
+
+    transactions, labels = feedback_from_expenses(expenses)
+
+    assert [t.hash for t in transactions] == [t.hash for t in training_transactions[:2]]
+    assert labels == [True, False]
+
+
+def test_learn_from_feedback_moves_checkpoint(tmp_path: Path, training_transactions):
+    """Test that feedback is fetched from the last checkpoint and learned once."""
+    model = OnlineExpenseModel(n_features=2**10).fit(
+        training_transactions, shared_labels(training_transactions)
+    )
+    client = MagicMock()
+    client.get_expenses.return_value = [
+        create_expense(t, deleted=i % 2 == 0)
+        for i, t in enumerate(training_transactions[:6])
+    ]
+    model_path = tmp_path / "online.joblib"
+    state_path = tmp_path / "feedback_state.json"
+    delay = timedelta(days=3)
+
+    assert learn_from_feedback(model, client, model_path, state_path, delay, NOW) == 6
+    assert learn_from_feedback(model, client, model_path, state_path, delay, NOW) == 0
+    later = NOW + timedelta(days=1)
+    learn_from_feedback(model, client, model_path, state_path, delay, later)
+
+    first, second = client.get_expenses.call_args_list
+    assert first.kwargs["updated_after"] is None
+    assert first.kwargs["updated_before"] == (NOW - delay).isoformat()
+    assert second.kwargs["updated_after"] == (NOW - delay).isoformat()
+    assert json.loads(state_path.read_text()) == {
+        "updated_before": (later - delay).isoformat()
+    }
+    assert OnlineExpenseModel.load(model_path).n_samples == model.n_samples
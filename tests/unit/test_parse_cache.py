@@ -0,0 +1,117 @@
+"""Unit tests for the persistent cache of parsing results."""
+
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from splitwise_sync.core.models import EmailMessage
+from splitwise_sync.core.parse_cache import ParseCache
+from splitwise_sync.core.parser_registry import ParserRegistry
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+BODY = (
+    "Te informamos que se ha realizado una compra por ${amount} con Tarjeta de "
+    "Crédito ****7766 en SPID MUT - O871 SANTIAGO CHL el 19/04/2025 14:33. "
+    "Revisa Saldos y Movimientos."
+)
+
+
+def create_email(body: str) -> EmailMessage:
+    return EmailMessage(
+        uid="1",
+        subject="Compra con tu Tarjeta de Crédito",
+        sender="enviodigital@bancoedwards.cl",
+        to="user@gmail.com",
+        date=datetime.fromisoformat("2025-04-19T14:40:00Z"),
+        body=body,
+    )
+
+
+class CountingParser(ReceiptParser):
+    """Receipt parser counting the emails it actually parses."""
+
+    calls = 0
+
+    def parse_email(self, message: EmailMessage):
+        type(self).calls += 1
+        return super().parse_email(message)
+
+
+@pytest.fixture
+def parser():
+    CountingParser.calls = 0
+    return CountingParser()
+
+
+def test_hit_returns_same_transaction(tmp_path: Path, parser: CountingParser):
+    """Test that a cached body is returned without parsing it again."""
+    email = create_email(BODY.format(amount="1.190"))
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        first = cache.parse_email(parser, email)
+        second = cache.parse_email(parser, email)
+
+        assert second == first
+        assert second.hash == first.hash
+        assert second.date.tzinfo is not None
+        assert parser.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_persists_across_instances(tmp_path: Path, parser: CountingParser):
+    """Test that results are kept in the database between runs."""
+    email = create_email(BODY.format(amount="2.500"))
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        expected = cache.parse_email(parser, email)
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        assert cache.parse_email(parser, email) == expected
+        assert cache.hits == 1
+    assert parser.calls == 1
+
+
+def test_errors_are_cached(tmp_path: Path, parser: CountingParser):
+    """Test that a body that failed to parse fails again from the cache."""
+    email = create_email("sin monto")
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        with pytest.raises(ValueError) as first:
+            cache.parse_email(parser, email)
+        with pytest.raises(ValueError) as second:
+            cache.parse_email(parser, email)
+
+    assert str(second.value) == str(first.value)
+    assert parser.calls == 1
+
+
+def test_key_depends_on_parser_version(parser: CountingParser, monkeypatch):
+    """Test that a new parser version does not reuse older results."""
+    key = ParseCache.make_key(parser, BODY)
+    assert ParseCache.make_key(parser, BODY) == key
+
+    monkeypatch.setattr(CountingParser, "version", "changed")
+    assert ParseCache.make_key(parser, BODY) != key
+
+
+def test_least_recently_used_are_evicted(tmp_path: Path, parser: CountingParser):
+    """Test that the cache stays bounded and keeps recently used results."""
+    emails = [create_email(BODY.format(amount=i)) for i in range(100, 111)]
+    with ParseCache(tmp_path / "cache.sqlite3", max_entries=10) as cache:
+        for email in emails[:10]:
+            cache.parse_email(parser, email)
+        cache.parse_email(parser, emails[0])  # refresh the oldest entry
+        cache.parse_email(parser, emails[10])
+
+        assert len(cache) <= 10
+        calls = parser.calls
+        cache.parse_email(parser, emails[0])
+        assert parser.calls == calls
+        cache.parse_email(parser, emails[1])
+        assert parser.calls == calls + 1
+
+
+def test_registry_uses_cache(tmp_path: Path):
+    """Test that the registry serves repeated emails from its cache."""
+    email = create_email(BODY.format(amount="3.000"))
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        registry = ParserRegistry(cache=cache)
+        assert registry.parse_email(email) == registry.parse_email(email)
+        assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,126 @@
+"""Unit tests for the receipt parser registry and the bank parsers."""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from splitwise_sync.core.bank_parsers import (
+    BancoEstadoParser,
+    BciParser,
+    SantanderParser,
+)
+from splitwise_sync.core.models import EmailMessage
+from splitwise_sync.core.parser_registry import AUTO, ParserRegistry
+from splitwise_sync.core.receipt_parser import ReceiptParser
+
+SANTIAGO = ZoneInfo("America/Santiago")
+
+
+def create_email(sender: str, subject: str, body: str = "") -> EmailMessage:
+    return EmailMessage(
+        uid="1",
+        subject=subject,
+        sender=sender,
+        to="user@gmail.com",
+        date=datetime(2025, 2, 1, 12, 40, tzinfo=SANTIAGO),
+        body=body,
+    )
+
+
+@pytest.fixture
+def registry() -> ParserRegistry:
+    return ParserRegistry()
+
+
+@pytest.mark.parametrize(
+    "sender, parser_class",
+    [
+        ("enviodigital@bancoedwards.cl", ReceiptParser),
+        ("Banco de Chile <notificaciones@bancochile.cl>", ReceiptParser),
+        ("contacto@bci.cl", BciParser),
+        ("avisos@mail.santander.cl", SantanderParser),
+        ("notificaciones@bancoestado.cl", BancoEstadoParser),
+    ],
+)
+def test_dispatch_by_sender(registry: ParserRegistry, sender: str, parser_class):
+    """Test that emails go to the parser of their sender's domain."""
+    parser = registry.dispatch(create_email(sender, "Compra con tarjeta"))
+
+    assert type(parser) is parser_class
+
+
+def test_dispatch_checks_subject_signature(registry: ParserRegistry):
+    """Test that a known sender with an unknown subject is rejected."""
+    with pytest.raises(ValueError, match="No receipt parser"):
+        registry.dispatch(create_email("contacto@bci.cl", "Tu estado de cuenta"))
+    with pytest.raises(ValueError, match="No receipt parser"):
+        registry.dispatch(create_email("someone@example.com", "Compra"))
+
+
+def test_resolve_named_parser(registry: ParserRegistry):
+    """Test that a source naming its parser skips the dispatch."""
+    email = create_email("someone@example.com", "Compra")
+
+    assert type(registry.resolve("bci", email)) is BciParser
+    with pytest.raises(ValueError, match="Unknown receipt parser"):
+        registry.resolve("nobank", email)
+
+
+def test_mime_parts(registry: ParserRegistry):
+    """Test the text parts declared for a source."""
+    assert registry.mime_parts(AUTO, "avisos@santander.cl") == ("html",)
+    assert registry.mime_parts("bancochile", "x@example.com") == ("plain", "html")
+    assert registry.mime_parts(AUTO, "x@example.com") == ("plain", "html")
+
+
+@pytest.mark.parametrize(
+    "sender, body, details",
+    [
+        (
+            "contacto@bci.cl",
+            "Estimado cliente: Se ha realizado una compra por $12.345 en "
+            "FARMACIA AHUMADA con tu Tarjeta de Crédito terminada en 1234 el "
+            "día 01/02/2025 a las 12:34 hrs.",
+            "compra por $12.345 en FARMACIA AHUMADA con tu Tarjeta de Crédito "
+            "terminada en 1234 el día 01/02/2025 a las 12:34",
+        ),
+        (
+            "avisos@santander.cl",
+            "<html><body><table><tr><td>Monto</td><td>$12.345</td></tr>"
+            "<tr><td>Comercio</td><td>FARMACIA AHUMADA</td></tr>"
+            "<tr><td>Fecha</td><td>01/02/2025</td></tr>"
+            "<tr><td>Hora</td><td>12:34</td></tr>"
+            "<tr><td>Tarjeta</td><td>terminada en ****1234</td></tr>"
+            "</table></body></html>",
+            "Monto $12.345 Comercio FARMACIA AHUMADA Fecha 01/02/2025 Hora 12:34",
+        ),
+        (
+            "notificaciones@bancoestado.cl",
+            "Se realizó una compra por $12.345 con tu tarjeta CuentaRUT "
+            "terminada en 1234 en FARMACIA AHUMADA el 01/02/2025 12:34.",
+            "compra por $12.345 con tu tarjeta CuentaRUT terminada en 1234 en "
+            "FARMACIA AHUMADA el 01/02/2025 12:34",
+        ),
+    ],
+)
+def test_bank_parsers(registry: ParserRegistry, sender: str, body: str, details: str):
+    """Test that every bank parser extracts the same purchase."""
+    email = create_email(sender, "Aviso de compra", body)
+    parser = registry.dispatch(email)
+
+    transaction = registry.parse_email(email)
+
+    assert transaction.cost == 12345.0
+    assert transaction.currency_code == "CLP"
+    assert transaction.card_number == "1234"
+    assert transaction.description == "FARMACIA AHUMADA"
+    assert transaction.date == datetime(2025, 2, 1, 12, 34, tzinfo=SANTIAGO)
+    assert transaction.details == details
+    # the single-pass and per-field extractions agree
+    fields = parser._clean_body(body)
+    assert parser._extract_fast(fields) == transaction
+    assert parser._extract_merchant(fields) == "FARMACIA AHUMADA"
+    assert parser._extract_card_number(fields) == "1234"
+    assert parser._extract_transaction_date(fields) == transaction.date
+    assert parser._extract_transaction_text(fields) == details
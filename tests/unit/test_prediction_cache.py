@@ -0,0 +1,129 @@
+"""Unit tests for the merchant-keyed prediction cache."""
+
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.expense_model import ExpenseModel
+from splitwise_sync.ml.prediction_cache import CachedModel, PredictionCache
+
+
+class CountingLoader:
+    """Model loader counting how many times the model is loaded."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def __call__(self, model_path: Path) -> ExpenseModel:
+        self.loads += 1
+        return ExpenseModel(model_path)
+
+
+@pytest.fixture
+def model_path(tmp_path: Path, fitted_pipeline) -> Path:
+    path = tmp_path / "model.pkl"
+    joblib.dump(fitted_pipeline, path)
+    return path
+
+
+def test_cached_predictions_match_model(
+    tmp_path: Path, model_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that predictions, cached or not, are the pipeline's."""
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    expected = fitted_pipeline.predict_proba(frame)
+    loader = CountingLoader()
+
+    model = CachedModel.open(tmp_path / "cache.sqlite3", model_path, loader)
+    np.testing.assert_array_equal(model.predict_proba(training_transactions), expected)
+    misses = model.cache.misses
+    assert 0 < misses < len(training_transactions)  # merchants repeat
+    np.testing.assert_array_equal(model.predict_proba(training_transactions), expected)
+    assert model.cache.misses == misses
+    assert model.predict(training_transactions).tolist() == (
+        fitted_pipeline.predict(frame).tolist()
+    )
+    model.close()
+    assert loader.loads == 1
+
+
+def test_hits_do_not_load_the_model(
+    tmp_path: Path, model_path: Path, training_transactions
+):
+    """Test that a later run answers seen merchants without loading the model."""
+    cache_path = tmp_path / "cache.sqlite3"
+    first = CachedModel.open(cache_path, model_path, CountingLoader())
+    expected = first.predict(training_transactions[:50])
+    first.close()
+
+    loader = CountingLoader()
+    second = CachedModel.open(cache_path, model_path, loader)
+    assert second.predict(training_transactions[:50]).tolist() == expected.tolist()
+    assert second.cache.hits == 50
+    assert loader.loads == 0
+    second.close()
+
+
+def test_model_change_invalidates(
+    tmp_path: Path, model_path: Path, fitted_pipeline, training_transactions
+):
+    """Test that a new model file resets the cache."""
+    cache_path = tmp_path / "cache.sqlite3"
+    model = CachedModel.open(cache_path, model_path, CountingLoader())
+    model.predict(training_transactions[:20])
+    assert len(model.cache) > 0
+    fingerprint = model.cache.fingerprint
+    model.close()
+
+    fitted_pipeline[-1].set_params(max_depth=2)
+    joblib.dump(fitted_pipeline, model_path)  # the file (and its hash) changes
+    try:
+        model = CachedModel.open(cache_path, model_path, CountingLoader())
+        assert model.cache.fingerprint != fingerprint
+        assert len(model.cache) == 0
+        assert model.cache.model_info is None
+        model.close()
+    finally:
+        fitted_pipeline[-1].set_params(max_depth=8)
+
+
+def test_least_recently_used_are_evicted(tmp_path: Path):
+    """Test that the cache stays bounded and keeps recently used entries."""
+    with PredictionCache(tmp_path / "cache.sqlite3", "model", max_entries=10) as cache:
+        cache.put_many((f"key{i}", [0.5, 0.5]) for i in range(10))
+        cache.get_many(["key0"])
+        cache.put_many([("key10", [1.0, 0.0])])
+
+        assert len(cache) <= 10
+        assert "key0" in cache.get_many(["key0"])
+        assert "key1" not in cache.get_many(["key1"])
+
+
+def test_keys_follow_tree_buckets(
+    tmp_path: Path, model_path: Path, training_transactions
+):
+    """Test that costs between the same thresholds share a key."""
+    model = CachedModel.open(tmp_path / "cache.sqlite3", model_path, CountingLoader())
+    edges = model.model_info["edges"]
+    assert edges["transaction_cost"]
+
+    transaction = training_transactions[0]
+    cost_edges = [float("-inf"), *edges["transaction_cost"], float("inf")]
+    bucket = next(
+        i for i in range(len(cost_edges) - 1) if transaction.cost <= cost_edges[i + 1]
+    )
+    low, high = cost_edges[bucket], cost_edges[bucket + 1]
+    same = Transaction(
+        cost=min(high, transaction.cost + 0.01) if high != float("inf") else 1e9,
+        currency_code=transaction.currency_code,
+        date=transaction.date,
+        description=transaction.description,
+        card_number=transaction.card_number,
+        details="",
+    )
+    assert low < same.cost <= high
+    assert model.key(same, edges) == model.key(transaction, edges)
+    model.close()
@@ -68,7 +68,7 @@ def test_no_transaction_when_no_amount(parser: ReceiptParser) -> None:
 
 
 def test_parse_html_email(parser: ReceiptParser, email_content: str) -> None:
-    """Test parsing an HTML email using BeautifulSoup."""
+    """Test parsing an HTML email."""
 
     # Create a mock email message with the HTML content
     message = create_email(email_content)
@@ -91,3 +91,60 @@ def test_parse_html_email(parser: ReceiptParser, email_content: str) -> None:
     # Verify date format
     assert transaction.date is not None
     assert isinstance(transaction.date, datetime)
+
+
+def _parse_per_field(parser: ReceiptParser, body: str) -> Transaction:
+    """Parse a body with the per-field extraction only."""
+    amount, currency = parser._extract_amount_and_currency(body)
+    return Transaction(
+        cost=amount,
+        currency_code=currency,
+        date=parser._extract_transaction_date(body),
+        description=parser._extract_merchant(body),
+        card_number=parser._extract_card_number(body),
+        details=parser._extract_transaction_text(body),
+    )
+
+
+@pytest.mark.parametrize(
+    "sentence",
+    [
+        "una compra por $1.190 con Tarjeta de Crédito ****7766 en SPID MUT - O871"
+        "        SANTIAGO      CHL el 19/04/2025 14:33",
+        "una compra por US$25,99 con Tarjeta de Crédito ****1234 en AMAZON.COM"
+        " el 01/12/2024 09:05",
+        "una compra por $ 15.000 con Tarjeta de Débito ****0001 en LIDER EXPRESS"
+        " el 31/01/2025 23:59",
+    ],
+)
+def test_fast_extraction_matches_per_field(parser: ReceiptParser, sentence: str):
+    """Test that the single-pass extraction agrees with the per-field one."""
+    body = f"Te informamos que se ha realizado {sentence}. Revisa Saldos."
+
+    fast = parser._extract_fast(body)
+
+    assert fast is not None
+    assert fast == _parse_per_field(parser, body)
+
+
+def test_fast_extraction_matches_per_field_on_html(
+    parser: ReceiptParser, email_content: str
+):
+    """Test both extraction paths on the HTML email fixture."""
+    body = parser._clean_body(email_content)
+
+    assert parser._extract_fast(body) == _parse_per_field(parser, body)
+
+
+def test_per_field_fallback(parser: ReceiptParser):
+    """Test that bodies in another layout still go through per-field parsing."""
+    body = "Compra por $5.000 con tarjeta ****4321 en CAFE el 02/03/2025 08:15"
+
+    assert parser._extract_fast(body) is None
+    transaction = parser.parse_email(create_email(body))
+
+    assert transaction.cost == 5000.0
+    assert transaction.card_number == "4321"
+    assert transaction.date == datetime(
+        2025, 3, 2, 8, 15, tzinfo=parser.default_timezone
+    )
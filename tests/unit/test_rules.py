@@ -0,0 +1,175 @@
+"""Unit tests for the user rules applied before the model."""
+
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from splitwise_sync.core.models import Transaction
+from splitwise_sync.core.rules import Rule, RuleSet, load_stats
+
+TZ = ZoneInfo("America/Santiago")
+SATURDAY = datetime(2025, 4, 19, 14, 33, tzinfo=TZ)
+
+
+def create_transaction(
+    description: str = "SPID MUT - O871        SANTIAGO      CHL",
+    cost: float = 1190.0,
+    card_number: str = "7766",
+    date: datetime = SATURDAY,
+) -> Transaction:
+    return Transaction(
+        cost=cost,
+        currency_code="CLP",
+        date=date,
+        description=description,
+        card_number=card_number,
+        details="",
+    )
+
+
+def test_first_matching_rule_applies():
+    """Test that rules are tried in file order."""
+    rules = RuleSet(
+        [
+            Rule("gym", merchant="SMARTFIT", shared=False),
+            Rule("mall", merchant="MUT", shared=True),
+            Rule("santiago", merchant="SANTIAGO", shared=False),
+        ]
+    )
+
+    assert rules.match(create_transaction()).name == "mall"
+    assert rules.match(create_transaction("SMARTFIT MUT")).name == "gym"
+    assert rules.match(create_transaction("LIDER EXPRESS")) is None
+
+
+def test_merchant_patterns():
+    """Test substring and prefix patterns, overlapping and case-insensitive."""
+    rules = RuleSet(
+        [
+            Rule("prefix", merchant_prefix="lider", shared=True),
+            Rule("overlap", merchant="ABCD", shared=True),
+            Rule("suffix", merchant="BC", shared=True),
+        ]
+    )
+
+    assert rules.match(create_transaction("Lider Express")).name == "prefix"
+    assert rules.match(create_transaction("EXPRESS LIDER")) is None
+    assert rules.match(create_transaction("xxABCDxx")).name == "overlap"
+    # "ABC" goes down the "ABCD" branch before falling back to "BC"
+    assert rules.match(create_transaction("xxABCxx")).name == "suffix"
+
+
+def test_card_cost_and_weekday_conditions():
+    """Test the conditions indexed outside the automaton."""
+    rule = Rule(
+        "weekend on card",
+        card_number="7766",
+        min_cost=1000,
+        max_cost=5000,
+        weekdays=frozenset({5, 6}),
+        split=0.3,
+    )
+    rules = RuleSet([rule])
+
+    assert rules.match(create_transaction()) == rule
+    assert rules.match(create_transaction(cost=1000)) == rule
+    assert rules.match(create_transaction(cost=999)) is None
+    assert rules.match(create_transaction(cost=5000)) is None
+    assert rules.match(create_transaction(card_number="1234")) is None
+    assert rules.match(create_transaction(date=SATURDAY - timedelta(days=1))) is None
+    # the weekday is local: 02:00 UTC on Sunday is still Saturday in Santiago
+    utc = datetime(2025, 4, 20, 2, 0, tzinfo=ZoneInfo("UTC"))
+    assert rules.match(create_transaction(date=utc)) == rule
+    assert rule.is_shared is True
+
+
+def test_matches_checking_each_rule():
+    """Test that the compiled rules agree with checking them one by one."""
+    rng = random.Random(0)
+    merchants = ["LIDER", "JUMBO", "UNIMARC", "SMARTFIT", "COPEC", "SHELL", "UBER"]
+
+    def maybe(value):
+        return value if rng.random() < 0.5 else None
+
+    rules = []
+    for i in range(2000):
+        low = maybe(rng.randrange(0, 50_000, 500))
+        name = rng.choice(merchants)[: rng.randint(2, 5)] + str(rng.randrange(10))
+        rules.append(
+            Rule(
+                f"rule {i}",
+                merchant=maybe(name),
+                card_number=maybe(rng.choice(["7766", "1234"])),
+                min_cost=low,
+                max_cost=maybe((low or 0) + rng.randrange(500, 50_000, 500)),
+                weekdays=maybe(frozenset(rng.sample(range(7), 3))),
+                shared=rng.random() < 0.5,
+            )
+        )
+    ruleset = RuleSet(rules)
+
+    for _ in range(300):
+        transaction = create_transaction(
+            description=f"{rng.choice(merchants)}{rng.randrange(10)} SANTIAGO",
+            cost=float(rng.randrange(0, 100_000, 250)),
+            card_number=rng.choice(["7766", "1234"]),
+            date=SATURDAY + timedelta(days=rng.randrange(7)),
+        )
+        weekday = transaction.date.weekday()
+        expected = next((r for r in rules if r.matches(transaction, weekday)), None)
+        assert ruleset.match(transaction) == expected
+
+
+def test_load_and_stats(tmp_path: Path):
+    """Test loading a rules file and accumulating the fires over runs."""
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(
+        json.dumps(
+            [
+                {"name": "mall", "merchant": "MUT", "shared": True},
+                {"merchant_prefix": "SMARTFIT", "weekdays": ["Monday"], "shared": 0},
+            ]
+        )
+    )
+    stats_path = tmp_path / "state" / "rule_stats.json"
+
+    rules = RuleSet.load(rules_path)
+    assert rules.rules[1] == Rule(
+        "rule 2", merchant_prefix="SMARTFIT", weekdays=frozenset({0}), shared=False
+    )
+    rules.match_many([create_transaction(), create_transaction("LIDER")])
+    rules.save_stats(stats_path)
+    rules.match(create_transaction())
+    rules.save_stats(stats_path)
+
+    assert rules.stats() == {
+        "evaluated": 3,
+        "hits": 2,
+        "misses": 1,
+        "fired": {"mall": 2, "rule 2": 0},
+    }
+    assert load_stats(stats_path) == {"evaluated": 3, "fired": {"mall": 2}}
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        {"merchant": "MUT"},
+        {"merchant": "MUT", "merchant_prefix": "MUT", "shared": True},
+        {"min_cost": 10, "max_cost": 5, "shared": True},
+        {"weekdays": ["someday"], "shared": True},
+        {"split": 1.5},
+        {"merchnat": "MUT", "shared": True},
+    ],
+)
+def test_invalid_rules(tmp_path: Path, entry):
+    """Test that invalid rules are reported with their position."""
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps([{"merchant": "LIDER", "shared": True}, entry]))
+
+    with pytest.raises(ValueError, match="Invalid rule 2"):
+        RuleSet.load(rules_path)
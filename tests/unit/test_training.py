@@ -0,0 +1,94 @@
+"""Unit tests for the training of the expense model."""
+
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import joblib
+import pandas as pd
+import pytest
+
+from splitwise_sync.cli import train as train_cli
+from splitwise_sync.core.models import Transaction, TransactionBatch
+from splitwise_sync.ml.fast_predictor import FastPredictor
+from splitwise_sync.ml.training import SCORING, save_model, train
+
+
+@pytest.fixture
+def frame(training_transactions: list[Transaction]) -> pd.DataFrame:
+    frame = TransactionBatch.from_transactions(training_transactions).to_dataframe()
+    frame["is_shared"] = frame["transaction_description"].str.contains("JUMBO|UBER")
+    return frame
+
+
+def cached_fits(cache_dir: Path) -> int:
+    return len(list(cache_dir.glob("**/_fit_features/*/output.pkl")))
+
+
+def test_features_fitted_once_per_fold(tmp_path: Path, frame: pd.DataFrame):
+    """Test that the features are fitted once per fold, whatever the grid."""
+    param_grid = {"max_depth": [2, 4, 8], "min_samples_leaf": [1, 5]}
+
+    pipeline, metrics = train(
+        frame, param_grid, cv=3, n_jobs=1, cache_dir=tmp_path / "cache"
+    )
+
+    assert cached_fits(tmp_path / "cache") == 3 + 1  # folds and the final refit
+    assert len(metrics["candidates"]) == 6
+    assert set(metrics["cv_scores"]) == set(SCORING)
+    assert metrics["cv_scores"]["f1"]["mean"] > 0.95
+    assert pipeline.memory is None
+    assert (pipeline.predict(frame) == frame["is_shared"]).mean() > 0.95
+
+
+def test_training_is_reproducible(tmp_path: Path, frame: pd.DataFrame):
+    """Test that a cached run picks the same model with the same scores."""
+    param_grid = {"max_depth": [2, 6]}
+
+    _, first = train(frame, param_grid, cv=3, n_jobs=1, cache_dir=tmp_path)
+    _, second = train(frame, param_grid, cv=3, n_jobs=1, cache_dir=tmp_path)
+
+    assert cached_fits(tmp_path) == 3 + 1
+    assert first["best_params"] == second["best_params"]
+    assert first["cv_scores"] == second["cv_scores"]
+
+
+def test_cli_writes_versioned_model(tmp_path: Path, frame: pd.DataFrame):
+    """Test that splitwise-train writes a model and its metrics."""
+    data_path = tmp_path / "matched.pkl"
+    frame.to_pickle(data_path)
+    argv = [
+        "splitwise-train",
+        "--data", str(data_path),
+        "--output-dir", str(tmp_path / "models"),
+        "--cache-dir", str(tmp_path / "cache"),
+        "--max-depth", "2", "4",
+        "--cv", "3",
+        "--n-jobs", "1",
+    ]  # fmt: skip
+
+    with patch.object(sys, "argv", argv):
+        train_cli.main()
+
+    (model_path,) = (tmp_path / "models").glob("decision_tree_model-*.pkl")
+    metrics = json.loads(model_path.with_suffix(".metrics.json").read_text())
+    assert model_path.stem.endswith(metrics["version"])
+    assert metrics["data"]["path"] == str(data_path)
+    assert len(metrics["data"]["sha256"]) == 64
+    assert metrics["param_grid"]["max_depth"] == [2, 4]
+    FastPredictor.from_pipeline(joblib.load(model_path))
+
+
+def test_save_model_versions(tmp_path: Path, fitted_pipeline):
+    """Test that each version gets its own model and metrics files."""
+    paths = [
+        save_model(fitted_pipeline, {}, tmp_path, version=version)
+        for version in ("1", "2")
+    ]
+
+    assert [p.name for p, _ in paths] == [
+        "decision_tree_model-1.pkl",
+        "decision_tree_model-2.pkl",
+    ]
+    assert json.loads(paths[1][1].read_text()) == {"version": "2"}